@@ -1,10 +1,15 @@
 from pathlib import Path
 import os
 import sys
+import tempfile
 from datetime import timedelta
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Where the SQLite database and var/ (blobs, staged uploads, profiles) live.
+# `manage.py benchmark --serve` points its server at a throwaway directory.
+DATA_DIR = Path(os.environ.get("DJANGO_DATA_DIR") or BASE_DIR)
+
 if os.path.exists(BASE_DIR / "env.py"):
     import env
 
@@ -32,14 +37,36 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'multipitch.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.AllowAny',
     ),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'multipitch.throttling.ScopedTokenBucketThrottle',
+    ),
+    # Token buckets: 'N/period' allows bursts of N and refills N per period.
+    'DEFAULT_THROTTLE_RATES': {
+        'login': '10/min',
+        'signup': '5/min',
+        'backup_upload': '60/hour',
+        'backup_upload_chunk': '2000/hour',
+        'backup_download': '120/hour',
+        'sync': '600/hour',
+        'backup_changes': '600/hour',
+    },
+}
+
+# Where throttle buckets live: LocalBucketStore (per process) or
+# CacheBucketStore (a Django cache shared by every process).
+THROTTLE_STORE = {
+    'BACKEND': 'multipitch.throttling.LocalBucketStore',
+    'OPTIONS': {},
 }
 
 MIDDLEWARE = [
+    'multipitch.middleware.MetricsMiddleware',
+    'multipitch.middleware.ProfilerMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -70,7 +97,9 @@ TEMPLATES = [
 WSGI_APPLICATION = 'config.wsgi.application'
 
 
-if 'test' in sys.argv or 'pytest' in sys.modules:
+TESTING = 'test' in sys.argv or 'pytest' in sys.modules
+
+if TESTING:
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
@@ -95,7 +124,14 @@ else:
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': BASE_DIR / 'db.sqlite3',
+            'NAME': DATA_DIR / 'db.sqlite3',
+            # Writers take the lock when their transaction starts and wait
+            # for it, rather than failing with "database is locked" when two
+            # backups are saved at once.
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+            },
         }
     }
 
@@ -157,4 +193,175 @@ SIMPLE_JWT = {
     "BLACKLIST_AFTER_ROTATION": False,
 
     "UPDATE_LAST_LOGIN": True,
-}
\ No newline at end of file
+}
+
+# /me/ hands back a new access token only once the current one expires within
+# this window; earlier calls return the token they were made with.
+ACCESS_TOKEN_RENEWAL_THRESHOLD = timedelta(days=7)
+
+# Expired outstanding/blacklisted tokens are deleted this many rows at a time
+# by `manage.py prune_tokens`. Setting TOKEN_PRUNE_INTERVAL (seconds) also
+# prunes that often as a job of `manage.py run_jobs`.
+TOKEN_PRUNE_BATCH_SIZE = 1000
+TOKEN_PRUNE_INTERVAL = None
+
+# In-process cache of users resolved from access tokens. Entries are evicted
+# when the user is saved or deleted in this process; TTL (seconds) bounds how
+# long other processes can serve a stale user.
+JWT_USER_CACHE = {
+    'MAX_SIZE': 1024,
+    'TTL': 60,
+}
+
+# Password hashing runs on its own pool of WORKERS threads. Up to MAX_QUEUE
+# further logins/signups may wait; beyond that they get a 503 with a
+# Retry-After of RETRY_AFTER seconds.
+PASSWORD_HASHING = {
+    'WORKERS': 2,
+    'MAX_QUEUE': 32,
+    'RETRY_AFTER': 2,
+}
+
+# Request metrics served at /metrics. Set MULTIPROCESS_DIR to a directory
+# shared by all worker processes of one host so each scrape reports all of
+# them; processes write their totals there at most every FLUSH_INTERVAL
+# seconds. Scrapes must send AUTH_TOKEN as a bearer token; without one,
+# /metrics only answers when DEBUG is on.
+METRICS = {
+    'MULTIPROCESS_DIR': os.environ.get("DJANGO_METRICS_MULTIPROCESS_DIR") or None,
+    'FLUSH_INTERVAL': 5,
+    'AUTH_TOKEN': os.environ.get("DJANGO_METRICS_AUTH_TOKEN") or None,
+}
+
+# Request profiler. When ENABLED, a SAMPLE_RATE fraction of requests, and
+# requests from staff users carrying HEADER, are profiled with cProfile and
+# their SQL (without parameters) recorded under DIR (newest MAX_PROFILES
+# kept); one request at a time, others are served unprofiled. Browse them with
+# `manage.py profiles`.
+PROFILER = {
+    'ENABLED': os.environ.get("DJANGO_PROFILER_ENABLED", "False") == "True",
+    'SAMPLE_RATE': 0.0,
+    'HEADER': 'X-Profile',
+    'DIR': DATA_DIR / 'var' / 'profiles',
+    'MAX_PROFILES': 200,
+}
+
+# `manage.py benchmark --serve` starts its server with DJANGO_BENCHMARK=True,
+# which lifts the throttles so they do not cap the measured throughput.
+BENCHMARK = os.environ.get("DJANGO_BENCHMARK", "False") == "True"
+
+# Threads in the executor that async views use for CPU-bound work.
+ASYNC_CPU_WORKERS = 4
+
+# Backups
+
+# Size of the reads used when copying a raw upload body to disk.
+BACKUP_UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Size of the slices read from storage when streaming a backup download.
+BACKUP_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Resumable upload sessions: chunk size handed to clients, the most bytes a
+# session may stage, the sessions a user may have open at once, how long an
+# idle session is kept, and where received chunks are staged until commit.
+# Expired sessions are purged every BACKUP_SESSION_PURGE_INTERVAL seconds by
+# a job of `manage.py run_jobs`, and when their user opens a new session.
+BACKUP_SESSION_CHUNK_SIZE = 4 * 1024 * 1024
+BACKUP_MAX_SIZE = 1024 * 1024 * 1024
+BACKUP_MAX_OPEN_SESSIONS = 4
+BACKUP_SESSION_LIFETIME = timedelta(days=1)
+BACKUP_SESSION_PURGE_INTERVAL = 3600
+BACKUP_STAGING_DIR = DATA_DIR / 'var' / 'upload-sessions'
+
+# Codec applied to stored backups ('gzip' or 'identity'). Blobs that do not
+# shrink under the codec are stored uncompressed.
+BACKUP_STORAGE_CODEC = 'gzip'
+
+# Where backup blobs are stored. The backend must implement
+# multipitch.storage.base.BlobStore.
+BACKUP_BLOB_STORE = {
+    'BACKEND': 'multipitch.storage.filesystem.FileSystemBlobStore',
+    'OPTIONS': {
+        'root': DATA_DIR / 'var' / 'blobs',
+    },
+}
+
+# Number of previous backups kept per user; 0 disables version history.
+BACKUP_VERSION_RETENTION = 10
+
+# Changeset sync. SYNC_TABLES maps each synced device table to its primary
+# key column. Pushes and pulls carry at most SYNC_MAX_CHANGES changes;
+# device clocks may run up to SYNC_MAX_CLOCK_SKEW ahead. Compaction drops
+# deletions once they are SYNC_TOMBSTONE_RETENTION old and included in the
+# latest backup (`manage.py compact_sync`).
+SYNC_TABLES = {
+    'routes': 'id',
+    'pitches': 'id',
+    'climbs': 'id',
+    'logs': 'id',
+}
+SYNC_MAX_CHANGES = 1000
+SYNC_MAX_CLOCK_SKEW = timedelta(minutes=5)
+SYNC_TOMBSTONE_RETENTION = timedelta(days=30)
+
+# Saved backups are processed after the upload returns, as a background
+# job when BACKUP_PROCESS_IN_BACKGROUND is set: the decoded copy is
+# checked with PRAGMA quick_check, replaced by a VACUUM INTO copy when that
+# saves at least BACKUP_COMPACT_MIN_SAVING of its size, and indexed into
+# the Indexed* tables for the /backup/index/ endpoints. Processing writes
+# up to four copies of the backup to BACKUP_PROCESS_TEMP_DIR (None is the
+# system temp dir); backups that would need more than
+# BACKUP_PROCESS_MAX_TEMP_BYTES, or more than the free space, are skipped.
+# SQLite maps up to BACKUP_INDEX_MMAP_SIZE bytes of the copy while reading it.
+BACKUP_PROCESS_IN_BACKGROUND = True
+BACKUP_PROCESS_TEMP_DIR = None
+BACKUP_PROCESS_MAX_TEMP_BYTES = 4 * 1024 * 1024 * 1024
+BACKUP_COMPACT_MIN_SAVING = 0.1
+BACKUP_INDEX_MMAP_SIZE = 256 * 1024 * 1024
+
+# Change notifications (async/backup/changes/). Long-poll requests wait up
+# to BACKUP_CHANGES_TIMEOUT seconds; event streams send a comment every
+# BACKUP_CHANGES_KEEPALIVE seconds so proxies keep them open. The broker
+# carries changes between server processes: DatabasePollingBroker queries
+# for saved backups every `interval` seconds while anyone is waiting;
+# LocalBroker is enough when a single process serves every request.
+BACKUP_CHANGES_TIMEOUT = 30
+BACKUP_CHANGES_KEEPALIVE = 15
+BACKUP_CHANGE_BROKER = {
+    'BACKEND': 'multipitch.notifications.DatabasePollingBroker',
+    'OPTIONS': {
+        'interval': 1.0,
+    },
+}
+
+# Background jobs, run by `manage.py run_jobs`. A job that fails is retried
+# JOB_RETRY_BACKOFF later, twice as long after each further failure up to
+# JOB_MAX_RETRY_BACKOFF, until it has had JOB_MAX_ATTEMPTS attempts. A job
+# still running JOB_VISIBILITY_TIMEOUT after it was claimed is taken to
+# have lost its worker and is claimed again. JOB_CONCURRENCY caps the jobs
+# of each kind running at once across all workers (1 when not listed).
+# Idle workers poll every JOB_POLL_INTERVAL seconds; finished jobs are
+# deleted after JOB_RETENTION.
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BACKOFF = timedelta(seconds=30)
+JOB_MAX_RETRY_BACKOFF = timedelta(hours=1)
+JOB_VISIBILITY_TIMEOUT = timedelta(minutes=10)
+JOB_CONCURRENCY = {
+    'process_backup': 2,
+}
+JOB_POLL_INTERVAL = 1.0
+JOB_RETENTION = timedelta(days=7)
+
+if TESTING:
+    BACKUP_STAGING_DIR = Path(tempfile.gettempdir()) / 'multipitch-test' / 'upload-sessions'
+    BACKUP_BLOB_STORE['OPTIONS']['root'] = Path(tempfile.gettempdir()) / 'multipitch-test' / 'blobs'
+    PROFILER['DIR'] = Path(tempfile.gettempdir()) / 'multipitch-test' / 'profiles'
+    # Deliberately weak and fast; only tests that exercise hashing cost pay for PBKDF2.
+    PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+    BACKUP_PROCESS_IN_BACKGROUND = False
+    BACKUP_CHANGE_BROKER = {'BACKEND': 'multipitch.notifications.LocalBroker'}
+
+if TESTING or BENCHMARK:
+    REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] = {
+        scope: '10000/min' for scope in REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']
+    }
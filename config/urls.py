@@ -1,8 +1,22 @@
 from django.contrib import admin
 from django.urls import path
 from multipitch.views.auth_views import SignupView, LoginView, MeView
-from multipitch.views.backup_views import BackupUploadView, BackupRetrieveView
+from multipitch.views.async_views import (
+    AsyncLoginView, AsyncMeView, AsyncBackupUploadView, AsyncBackupRetrieveView, AsyncBackupStreamView,
+    AsyncBackupChangesView,
+)
+from multipitch.views.backup_views import BackupUploadView, BackupRetrieveView, BackupStreamView
+from multipitch.views.metrics_views import metrics_view
+from multipitch.views.sync_views import SyncChangesView
+from multipitch.views.index_views import (
+    BackupIndexStatusView, IndexedClimbListView, IndexedLogListView, IndexedPitchListView, IndexedRouteListView
+)
+from multipitch.views.delta_views import DeltaCompareView, DeltaPagesView, DeltaApplyView
 from multipitch.views.token_view import TokenRefreshView
+from multipitch.views.version_views import BackupVersionListView, BackupVersionRestoreView
+from multipitch.views.upload_session_views import (
+    UploadSessionCreateView, UploadSessionDetailView, UploadSessionChunkView, UploadSessionCommitView
+)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -11,5 +25,28 @@ urlpatterns = [
     path('me/', MeView.as_view(), name='me'),
     path("backup/upload/", BackupUploadView.as_view(), name="backup-upload"),
     path("backup/download/", BackupRetrieveView.as_view(), name="backup-download"),
+    path("backup/download/raw/", BackupStreamView.as_view(), name="backup-download-raw"),
+    path("backup/sessions/", UploadSessionCreateView.as_view(), name="upload-session-create"),
+    path("backup/sessions/<uuid:session_id>/", UploadSessionDetailView.as_view(), name="upload-session-detail"),
+    path("backup/sessions/<uuid:session_id>/chunks/<int:index>/", UploadSessionChunkView.as_view(), name="upload-session-chunk"),
+    path("backup/sessions/<uuid:session_id>/commit/", UploadSessionCommitView.as_view(), name="upload-session-commit"),
+    path("backup/delta/compare/", DeltaCompareView.as_view(), name="backup-delta-compare"),
+    path("backup/delta/pages/", DeltaPagesView.as_view(), name="backup-delta-pages"),
+    path("backup/delta/apply/", DeltaApplyView.as_view(), name="backup-delta-apply"),
+    path("backup/versions/", BackupVersionListView.as_view(), name="backup-versions"),
+    path("backup/versions/<int:number>/restore/", BackupVersionRestoreView.as_view(), name="backup-version-restore"),
+    path("backup/index/", BackupIndexStatusView.as_view(), name="backup-index"),
+    path("backup/index/routes/", IndexedRouteListView.as_view(), name="backup-index-routes"),
+    path("backup/index/routes/<int:route_id>/pitches/", IndexedPitchListView.as_view(), name="backup-index-pitches"),
+    path("backup/index/climbs/", IndexedClimbListView.as_view(), name="backup-index-climbs"),
+    path("backup/index/logs/", IndexedLogListView.as_view(), name="backup-index-logs"),
+    path("sync/changes/", SyncChangesView.as_view(), name="sync-changes"),
     path("token/refresh/", TokenRefreshView.as_view(), name="token-refresh"),
+    path("metrics", metrics_view, name="metrics"),
+    path("async/login/", AsyncLoginView.as_view(), name="async-login"),
+    path("async/me/", AsyncMeView.as_view(), name="async-me"),
+    path("async/backup/upload/", AsyncBackupUploadView.as_view(), name="async-backup-upload"),
+    path("async/backup/download/", AsyncBackupRetrieveView.as_view(), name="async-backup-download"),
+    path("async/backup/download/raw/", AsyncBackupStreamView.as_view(), name="async-backup-download-raw"),
+    path("async/backup/changes/", AsyncBackupChangesView.as_view(), name="async-backup-changes"),
 ]
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import UserAuth, UserBackup
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .models import UserAuth, UserBackup, BackupUploadSession, BackupVersion, BackupIndex, SyncChange, Job
 
 @admin.register(UserAuth)
 class UserAuthAdmin(admin.ModelAdmin):
@@ -9,5 +11,52 @@ class UserAuthAdmin(admin.ModelAdmin):
 
 @admin.register(UserBackup)
 class UserBackupAdmin(admin.ModelAdmin):
-    list_display = ("user", "last_sync")
+    list_display = ("user", "last_sync", "original_size", "stored_size", "codec", "integrity")
+    list_filter = ("integrity",)
     search_fields = ("user__username",)
+
+
+@admin.register(BackupUploadSession)
+class BackupUploadSessionAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "created_at", "expires_at")
+    search_fields = ("user__username",)
+
+
+@admin.register(BackupVersion)
+class BackupVersionAdmin(admin.ModelAdmin):
+    list_display = ("user", "number", "is_delta", "original_size", "stored_size", "created_at")
+    search_fields = ("user__username",)
+
+
+@admin.register(BackupIndex)
+class BackupIndexAdmin(admin.ModelAdmin):
+    list_display = ("user", "version", "indexed_at", "error")
+    search_fields = ("user__username",)
+
+
+@admin.register(SyncChange)
+class SyncChangeAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "table", "row_id", "deleted", "device", "created_at")
+    search_fields = ("user__username", "row_id")
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "key", "state", "attempts", "run_after", "worker", "finished_at")
+    list_filter = ("state", "kind")
+    search_fields = ("key", "worker")
+    actions = ("retry_now",)
+
+    @admin.action(description="Retry selected jobs now")
+    def retry_now(self, request, queryset):
+        count = 0
+        for job in queryset.exclude(state='running'):
+            try:
+                with transaction.atomic():
+                    count += Job.objects.filter(pk=job.pk).exclude(state='running').update(
+                        state='queued', attempts=0, run_after=timezone.now(), finished_at=None
+                    )
+            except IntegrityError:
+                # A job with the same key is queued already and will run instead.
+                pass
+        self.message_user(request, f"{count} jobs queued.")
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class MultipitchConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'multipitch'
+
+    def ready(self):
+        from multipitch import signals  # noqa: F401
+        # Register the prune_tokens and purge_upload_sessions job kinds.
+        from multipitch.services import token_prune_service, upload_session_service  # noqa: F401
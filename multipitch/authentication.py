@@ -0,0 +1,57 @@
+import copy
+from asgiref.sync import sync_to_async
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from multipitch.tokens import TOKEN_VERSION_CLAIM
+from multipitch.user_cache import get_user_cache
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves users through the in-process user cache,
+    so authenticated requests usually need no database lookup. Tokens whose
+    version claim no longer matches the user's token_version are rejected.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        token_version = validated_token.get(TOKEN_VERSION_CLAIM, 0)
+
+        cache = get_user_cache()
+        user = cache.get(user_id, token_version)
+        if user is None:
+            user = super().get_user(validated_token)
+            if user.token_version != token_version:
+                raise AuthenticationFailed(_("Token has been revoked."), code="token_revoked")
+            cache.set(user_id, token_version, user)
+        # Requests get their own copy so one cannot mutate another's user.
+        return copy.copy(user)
+
+
+async def authenticate_async(request):
+    """
+    CachedJWTAuthentication for plain Django async views. Returns
+    (user, validated_token), or None when the request carries no token.
+    Cache hits never leave the event loop; misses load the user through a
+    sync_to_async call.
+    """
+    auth = CachedJWTAuthentication()
+    header = auth.get_header(request)
+    if header is None:
+        return None
+    raw_token = auth.get_raw_token(header)
+    if raw_token is None:
+        return None
+    validated_token = auth.get_validated_token(raw_token)
+
+    token_version = validated_token.get(TOKEN_VERSION_CLAIM, 0)
+    user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+    user = get_user_cache().get(user_id, token_version) if user_id is not None else None
+    if user is not None:
+        return copy.copy(user), validated_token
+    return await sync_to_async(auth.get_user)(validated_token), validated_token
@@ -0,0 +1,286 @@
+"""
+HTTP benchmark for the API, driven by `manage.py benchmark`.
+
+Scenarios run against a live server with a thread pool of clients and
+report latency percentiles, throughput, errors and, via the server's
+/metrics endpoint, ORM queries per request.
+"""
+import http.client
+import json
+import math
+import random
+import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from multipitch import dataset
+
+SIZE_UNITS = {'': 1, 'B': 1, 'KB': 1000, 'MB': 1000 ** 2, 'GB': 1000 ** 3,
+              'KIB': 1024, 'MIB': 1024 ** 2, 'GIB': 1024 ** 3}
+DEFAULT_SIZES = ('100KB', '1MB', '10MB', '50MB', '200MB')
+PASSWORD = 'BenchPass123!'
+
+
+def parse_size(text):
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([a-zA-Z]*)\s*', text)
+    if not match or match.group(2).upper() not in SIZE_UNITS:
+        raise ValueError(f"Invalid size: {text!r}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(fraction * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def make_payload(size, seed=0):
+    """
+    Deterministic payload of `size` bytes, half random and half repetitive
+    text, so compression has roughly the work it has on real backups.
+    """
+    rng = random.Random(seed)
+    text = b'pitch,grade,length_m,protection,belay\n'
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        block = rng.randbytes(2048) + text * 55
+        chunks.append(block[:remaining])
+        remaining -= len(block)
+    return b''.join(chunks)
+
+
+class Client:
+    """Minimal keep-alive HTTP client; one per worker thread."""
+
+    def __init__(self, base_url, timeout=300):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(parts.hostname, parts.port, timeout=timeout)
+        self.prefix = parts.path.rstrip('/')
+
+    def request(self, method, path, body=None, headers=None, content_type='application/json'):
+        headers = dict(headers or {})
+        if body is not None and not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        if body is not None:
+            headers['Content-Type'] = content_type
+        try:
+            self.connection.request(method, self.prefix + path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            raise
+        return response.status, data
+
+    def close(self):
+        self.connection.close()
+
+
+class Benchmark:
+    def __init__(self, base_url, requests=50, blob_requests=3, concurrency=4,
+                 sizes=DEFAULT_SIZES, payload='random', metrics_token=None, server_pid=None, out=None):
+        self.base_url = base_url
+        self.requests = requests
+        self.blob_requests = blob_requests
+        self.concurrency = concurrency
+        self.sizes = list(sizes)
+        self.payload = payload
+        self.metrics_token = metrics_token
+        self.server_pid = server_pid
+        self.out = out
+        self.run_id = uuid.uuid4().hex[:8]
+        self._users = 0
+
+    def log(self, message):
+        if self.out is not None:
+            self.out.write(message)
+
+    # Setup helpers
+
+    def signup(self, client):
+        self._users += 1
+        email = f"bench-{self.run_id}-{self._users}-{uuid.uuid4().hex[:6]}@example.com"
+        status, data = client.request('POST', '/signup/', {
+            'username': email.split('@')[0], 'email': email, 'password': PASSWORD,
+        })
+        if status != 201:
+            raise RuntimeError(f"Signup failed with {status}: {data[:200]!r}")
+        return email, json.loads(data)
+
+    def scrape_queries(self, client):
+        """Total ORM queries per view name from /metrics, or None without metrics."""
+        headers = {'Authorization': f"Bearer {self.metrics_token}"} if self.metrics_token else {}
+        try:
+            status, data = client.request('GET', '/metrics', headers=headers)
+        except OSError:
+            return None
+        if status != 200:
+            return None
+        totals = {}
+        for match in re.finditer(r'^multipitch_db_queries_total\{view="([^"]*)"\} (\S+)$', data.decode(), re.M):
+            totals[match.group(1)] = float(match.group(2))
+        return totals
+
+    # Running
+
+    def run_scenario(self, name, view, count, make_request):
+        """
+        Run `make_request(client, i)` `count` times across the worker pool.
+        It returns the HTTP status; 2xx counts as success.
+        """
+        clients = [Client(self.base_url) for _ in range(self.concurrency)]
+        control = Client(self.base_url)
+        try:
+            before = self.scrape_queries(control)
+            latencies, errors = [], 0
+
+            def task(i):
+                client = clients[i % self.concurrency]
+                started = time.perf_counter()
+                try:
+                    status = make_request(client, i)
+                except (OSError, http.client.HTTPException):
+                    status = None
+                return time.perf_counter() - started, status
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                # Each worker owns a client: split the indices by worker.
+                futures = [pool.submit(lambda w=w: [task(i) for i in range(w, count, self.concurrency)])
+                           for w in range(self.concurrency)]
+                for future in futures:
+                    for latency, status in future.result():
+                        latencies.append(latency)
+                        if status is None or not 200 <= status < 300:
+                            errors += 1
+            elapsed = time.perf_counter() - started
+            after = self.scrape_queries(control)
+        finally:
+            for client in clients + [control]:
+                client.close()
+
+        latencies.sort()
+        queries = None
+        if before is not None and after is not None:
+            queries = (after.get(view, 0) - before.get(view, 0)) / count if count else 0
+        result = {
+            'count': count,
+            'errors': errors,
+            'rps': count / elapsed if elapsed else None,
+            'mean_ms': sum(latencies) / len(latencies) * 1000 if latencies else None,
+            'p50_ms': _ms(percentile(latencies, 0.50)),
+            'p95_ms': _ms(percentile(latencies, 0.95)),
+            'p99_ms': _ms(percentile(latencies, 0.99)),
+            'db_queries_per_request': queries,
+            # VmHWM only grows, so this is the server's peak up to the end of this scenario.
+            'peak_rss_bytes': peak_rss(self.server_pid) if self.server_pid else None,
+        }
+        self.log(f"{name:28} {count:5} req  {result['rps'] or 0:8.1f} req/s  "
+                 f"p50 {result['p50_ms'] or 0:8.1f}ms  p95 {result['p95_ms'] or 0:8.1f}ms  "
+                 f"p99 {result['p99_ms'] or 0:8.1f}ms  errors {errors}\n")
+        return result
+
+    def run(self, scenarios=None):
+        setup = Client(self.base_url)
+        try:
+            email, tokens = self.signup(setup)
+        finally:
+            setup.close()
+        auth = {'Authorization': f"Bearer {tokens['access']}"}
+        results = {}
+
+        def wanted(name):
+            return scenarios is None or name.split(':')[0] in scenarios
+
+        if wanted('signup'):
+            def signup(client, i):
+                address = f"bench-{self.run_id}-s{i}-{uuid.uuid4().hex[:6]}@example.com"
+                return client.request('POST', '/signup/', {
+                    'username': address.split('@')[0], 'email': address, 'password': PASSWORD,
+                })[0]
+            results['signup'] = self.run_scenario('signup', 'signup', self.requests, signup)
+
+        if wanted('login'):
+            results['login'] = self.run_scenario('login', 'login', self.requests, lambda client, i: client.request(
+                'POST', '/login/', {'email': email, 'password': PASSWORD})[0])
+
+        if wanted('refresh'):
+            results['refresh'] = self.run_scenario(
+                'refresh', 'token-refresh', self.requests, lambda client, i: client.request(
+                    'POST', '/token/refresh/', {'refresh': tokens['refresh']})[0])
+
+        if wanted('me'):
+            results['me'] = self.run_scenario('me', 'me', self.requests, lambda client, i: client.request(
+                'GET', '/me/', headers=auth)[0])
+
+        for size_text in self.sizes:
+            size = parse_size(size_text)
+            if self.payload == 'sqlite':
+                # A device database and the same database after a round of use.
+                payloads = list(dataset.generate_versions(size, 2))
+            else:
+                payloads = [make_payload(size, seed) for seed in range(2)]
+            if wanted('upload'):
+                # Alternate payloads so every upload really replaces the backup.
+                results[f'upload:{size_text}'] = self.run_scenario(
+                    f'upload:{size_text}', 'backup-upload', self.blob_requests,
+                    lambda client, i: client.request(
+                        'POST', '/backup/upload/', payloads[i % 2], headers=auth,
+                        content_type='application/octet-stream')[0])
+            if wanted('download'):
+                status, _ = _single(self.base_url, 'POST', '/backup/upload/', payloads[0], auth)
+                if not 200 <= status < 300:
+                    raise RuntimeError(f"Could not store a {size_text} backup: {status}")
+                results[f'download:{size_text}'] = self.run_scenario(
+                    f'download:{size_text}', 'backup-download-raw', self.blob_requests,
+                    lambda client, i: client.request('GET', '/backup/download/raw/', headers=auth)[0])
+        return results
+
+
+def _single(base_url, method, path, body, headers):
+    client = Client(base_url)
+    try:
+        return client.request(method, path, body, headers, content_type='application/octet-stream')
+    finally:
+        client.close()
+
+
+def _ms(seconds):
+    return None if seconds is None else seconds * 1000
+
+
+def peak_rss(pid):
+    """Peak resident set size of process `pid` in bytes (Linux), or None."""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def compare(baseline, current, threshold):
+    """
+    Compare two benchmark reports. A scenario regresses when its p95
+    latency grows, or its throughput drops, by more than `threshold`
+    (a fraction). Returns a list of (scenario, metric, old, new) regressions.
+    """
+    regressions = []
+    for name, new in current['results'].items():
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        if old.get('p95_ms') and new.get('p95_ms') and new['p95_ms'] > old['p95_ms'] * (1 + threshold):
+            regressions.append((name, 'p95_ms', old['p95_ms'], new['p95_ms']))
+        if old.get('rps') and new.get('rps') and new['rps'] < old['rps'] * (1 - threshold):
+            regressions.append((name, 'rps', old['rps'], new['rps']))
+        if new.get('errors', 0) > old.get('errors', 0):
+            regressions.append((name, 'errors', old.get('errors', 0), new['errors']))
+    return regressions
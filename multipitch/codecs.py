@@ -0,0 +1,79 @@
+"""
+Storage codecs for backup blobs.
+
+Each codec encodes and decodes streams of byte chunks, so blobs of any
+size can be compressed on write and decompressed on read without holding
+them in memory. `content_encoding` is the HTTP Content-Encoding token under
+which the stored bytes can be served as-is, or None.
+"""
+import zlib
+
+IDENTITY = 'identity'
+GZIP = 'gzip'
+
+# Upper bound on the size of each decoded piece yielded by decode().
+DECODE_PIECE_SIZE = 256 * 1024
+
+
+class IdentityCodec:
+    name = IDENTITY
+    content_encoding = None
+
+    def encode(self, chunks):
+        yield from chunks
+
+    def decode(self, chunks):
+        yield from chunks
+
+
+class GzipCodec:
+    name = GZIP
+    content_encoding = 'gzip'
+
+    def __init__(self, level=6):
+        self.level = level
+
+    def encode(self, chunks):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    def decode(self, chunks):
+        decompressor = zlib.decompressobj(31)
+        for chunk in chunks:
+            data = decompressor.decompress(chunk, DECODE_PIECE_SIZE)
+            while data:
+                yield data
+                data = decompressor.decompress(decompressor.unconsumed_tail, DECODE_PIECE_SIZE)
+        data = decompressor.flush()
+        if data:
+            yield data
+
+
+CODECS = {
+    IDENTITY: IdentityCodec(),
+    GZIP: GzipCodec(),
+}
+
+
+def get_codec(name):
+    return CODECS[name]
+
+
+def accepts_encoding(accept_encoding, content_encoding):
+    """Whether an Accept-Encoding header value allows `content_encoding`."""
+    for item in (accept_encoding or '').split(','):
+        token, _, params = item.strip().partition(';')
+        if token.strip().lower() not in (content_encoding, '*'):
+            continue
+        params = params.replace(' ', '')
+        if params.startswith('q='):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
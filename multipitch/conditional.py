@@ -0,0 +1,17 @@
+def _normalize(tag):
+    tag = tag.strip()
+    if tag.startswith('W/'):
+        tag = tag[2:]
+    return tag
+
+
+def etag_matches(header, etag):
+    """
+    Whether an If-Match / If-None-Match header value matches `etag`.
+    Weak and strong tags compare equal; `*` matches any current resource.
+    """
+    if not header or not etag:
+        return False
+    if header.strip() == '*':
+        return True
+    return _normalize(etag) in {_normalize(tag) for tag in header.split(',')}
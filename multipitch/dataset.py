@@ -0,0 +1,238 @@
+"""
+Synthetic device databases shaped like the mobile app's SQLite store
+(routes, pitches, climbs and their logs), for benchmarks and scaling
+work. Generation is seeded, so the same arguments give the same file.
+"""
+import os
+import random
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+
+SCHEMA = """
+CREATE TABLE routes (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    crag TEXT NOT NULL,
+    country TEXT NOT NULL,
+    grade TEXT NOT NULL,
+    length_m INTEGER NOT NULL,
+    latitude REAL,
+    longitude REAL,
+    description TEXT,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE pitches (
+    id INTEGER PRIMARY KEY,
+    route_id INTEGER NOT NULL REFERENCES routes(id),
+    number INTEGER NOT NULL,
+    grade TEXT NOT NULL,
+    length_m INTEGER NOT NULL,
+    protection TEXT,
+    belay TEXT,
+    notes TEXT,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE climbs (
+    id INTEGER PRIMARY KEY,
+    route_id INTEGER NOT NULL REFERENCES routes(id),
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    partner TEXT,
+    style TEXT NOT NULL,
+    status TEXT NOT NULL,
+    notes TEXT,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE logs (
+    id INTEGER PRIMARY KEY,
+    climb_id INTEGER NOT NULL REFERENCES climbs(id),
+    pitch_id INTEGER REFERENCES pitches(id),
+    recorded_at TEXT NOT NULL,
+    event TEXT NOT NULL,
+    duration_s INTEGER,
+    latitude REAL,
+    longitude REAL,
+    altitude_m REAL,
+    note TEXT
+);
+CREATE INDEX pitches_route ON pitches(route_id, number);
+CREATE INDEX climbs_route ON climbs(route_id);
+CREATE INDEX logs_climb ON logs(climb_id, recorded_at);
+"""
+
+WORDS = (
+    "crack corner slab arete chimney roof dihedral ledge belay bolt piton cam nut sling "
+    "runout traverse chossy solid clean wet polished exposed airy sustained crux rappel "
+    "anchor gear rack rope approach descent summit ridge gully flake jug crimp sloper "
+    "pinch undercling layback stem jam offwidth squeeze pillar buttress wall face dike "
+    "good bad loose fixed left right up over under past above below easy hard steep"
+).split()
+GRADES = ('4', '5a', '5b', '5c', '6a', '6a+', '6b', '6b+', '6c', '6c+', '7a', '7a+', '7b')
+STYLES = ('lead', 'second', 'alternate', 'solo')
+STATUSES = ('planned', 'in_progress', 'finished', 'bailed')
+EVENTS = ('start', 'pitch_start', 'pitch_end', 'belay', 'rest', 'rappel', 'finish', 'note')
+CRAGS = ('Bicaz', 'Piatra Craiului', 'Bucegi', 'Dolomites', 'Verdon', 'Wenden', 'Paklenica')
+COUNTRIES = ('RO', 'IT', 'FR', 'CH', 'HR')
+EPOCH = datetime(2020, 1, 1)
+
+LOGS_PER_CLIMB = 40
+CLIMBS_PER_ROUTE = 3
+
+
+def _text(rng, low, high):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+
+def _timestamp(rng):
+    return (EPOCH + timedelta(seconds=rng.randrange(5 * 365 * 86400))).isoformat(timespec='seconds')
+
+
+class DeviceDatabase:
+    """
+    Writes rows into a device database at `path`. Row ids continue from
+    what is already in the file, so a database can be reopened and grown.
+    """
+
+    def __init__(self, path, seed=0, page_size=4096):
+        self.path = path
+        self.rng = random.Random(seed)
+        self.conn = sqlite3.connect(path)
+        if not self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'routes'").fetchone():
+            self.conn.execute(f"PRAGMA page_size = {page_size}")
+            self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def size(self):
+        page_count = self.conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size = self.conn.execute("PRAGMA page_size").fetchone()[0]
+        return page_count * page_size
+
+    def _next_id(self, table):
+        return self.conn.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}").fetchone()[0]
+
+    def add_routes(self, count):
+        """Add `count` routes with their pitches, climbs and logs."""
+        rng = self.rng
+        route_id, pitch_id = self._next_id('routes'), self._next_id('pitches')
+        climb_id, log_id = self._next_id('climbs'), self._next_id('logs')
+        routes, pitches, climbs, logs = [], [], [], []
+        for _ in range(count):
+            latitude, longitude = rng.uniform(43, 47), rng.uniform(6, 26)
+            pitch_ids = []
+            for number in range(1, rng.randint(2, 12) + 1):
+                pitches.append((
+                    pitch_id, route_id, number, rng.choice(GRADES), rng.randint(15, 55),
+                    _text(rng, 2, 6), _text(rng, 1, 4), _text(rng, 0, 25), _timestamp(rng),
+                ))
+                pitch_ids.append(pitch_id)
+                pitch_id += 1
+            routes.append((
+                route_id, _text(rng, 1, 3).title(), rng.choice(CRAGS), rng.choice(COUNTRIES),
+                rng.choice(GRADES), len(pitch_ids) * rng.randint(25, 45), latitude, longitude,
+                _text(rng, 20, 80), _timestamp(rng),
+            ))
+            for _ in range(rng.randint(1, 2 * CLIMBS_PER_ROUTE - 1)):
+                started = EPOCH + timedelta(seconds=rng.randrange(5 * 365 * 86400))
+                climbs.append((
+                    climb_id, route_id, started.isoformat(timespec='seconds'),
+                    (started + timedelta(hours=rng.uniform(2, 12))).isoformat(timespec='seconds'),
+                    _text(rng, 1, 2).title(), rng.choice(STYLES), rng.choice(STATUSES),
+                    _text(rng, 0, 40), _timestamp(rng),
+                ))
+                moment = started
+                altitude = rng.uniform(600, 2500)
+                for _ in range(rng.randint(LOGS_PER_CLIMB // 2, LOGS_PER_CLIMB * 3 // 2)):
+                    moment += timedelta(seconds=rng.randint(30, 900))
+                    altitude += rng.uniform(-2, 8)
+                    logs.append((
+                        log_id, climb_id, rng.choice(pitch_ids), moment.isoformat(timespec='seconds'),
+                        rng.choice(EVENTS), rng.randint(10, 3600),
+                        latitude + rng.gauss(0, 1e-4), longitude + rng.gauss(0, 1e-4), round(altitude, 1),
+                        _text(rng, 0, 12) or None,
+                    ))
+                    log_id += 1
+                climb_id += 1
+            route_id += 1
+
+        self.conn.executemany("INSERT INTO routes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", routes)
+        self.conn.executemany("INSERT INTO pitches VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", pitches)
+        self.conn.executemany("INSERT INTO climbs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", climbs)
+        self.conn.executemany("INSERT INTO logs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", logs)
+        self.conn.commit()
+
+    def fill(self, target_size):
+        """Add routes until the file reaches `target_size` bytes."""
+        while self.size() < target_size:
+            # About 25KB of rows per route; stay in small steps near the target.
+            missing = target_size - self.size()
+            self.add_routes(max(1, min(200, missing // 50_000)))
+
+    def churn(self, fraction):
+        """
+        Simulate device use between two backups. Edits land on the most
+        recent climbs and logs, as they do on a phone: about `fraction` of
+        the rows are rewritten or deleted, and new climbs grow the file by
+        about `fraction` / 2, so roughly `fraction` of the pages change.
+        """
+        rng = self.rng
+        now = _timestamp(rng)
+        for table, statement, values in (
+            ('climbs', "UPDATE climbs SET notes = ?, status = ?, updated_at = ? WHERE id = ?",
+             lambda: (_text(rng, 0, 40), rng.choice(STATUSES), now)),
+            ('logs', "UPDATE logs SET note = ?, duration_s = ? WHERE id = ?",
+             lambda: (_text(rng, 0, 12) or None, rng.randint(10, 3600))),
+        ):
+            next_id = self._next_id(table)
+            recent = max(1, int((next_id - 1) * fraction))
+            ids = rng.sample(range(max(1, next_id - recent), next_id), k=recent // 2 or 1)
+            self.conn.executemany(statement, [(*values(), row_id) for row_id in ids[len(ids) // 10:]])
+            if table == 'logs':
+                self.conn.executemany("DELETE FROM logs WHERE id = ?", [(row_id,) for row_id in ids[:len(ids) // 10]])
+        self.conn.commit()
+
+        target = self.size() * (1 + fraction / 2)
+        while self.size() < target:
+            self.add_routes(1)
+
+
+def generate(path, size, seed=0, page_size=4096):
+    """Create a device database at `path` of at least `size` bytes."""
+    db = DeviceDatabase(path, seed, page_size)
+    try:
+        db.fill(size)
+    finally:
+        db.close()
+
+
+def churn(path, fraction, seed=0):
+    """Apply one round of `DeviceDatabase.churn` to the database at `path`."""
+    db = DeviceDatabase(path, seed)
+    try:
+        db.churn(fraction)
+    finally:
+        db.close()
+
+
+def generate_versions(size, versions, fraction=0.05, seed=0, page_size=4096):
+    """
+    Yield the contents of `versions` successive states of one device
+    database: a fresh database of about `size` bytes, then one churn round
+    of `fraction` per further version.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'device.sqlite3')
+        generate(path, size, seed, page_size)
+        for version in range(versions):
+            if version:
+                churn(path, fraction, f"{seed}-{version}")
+            with open(path, 'rb') as f:
+                yield f.read()
+
+
+def generate_bytes(size, seed=0, page_size=4096):
+    """The contents of a freshly generated device database."""
+    return next(generate_versions(size, 1, seed=seed, page_size=page_size))
@@ -0,0 +1,146 @@
+"""
+Page-level helpers for delta sync of SQLite backups.
+
+A delta is a stream of frames, each an 8-byte big-endian header holding the
+page index and payload length, followed by the page bytes. Frames are sent
+in ascending page order so both sides can merge them in a single pass.
+"""
+import hashlib
+import struct
+
+SQLITE_MAGIC = b'SQLite format 3\x00'
+DEFAULT_PAGE_SIZE = 4096
+FRAME_HEADER = struct.Struct('>II')
+
+
+class DeltaError(Exception):
+    pass
+
+
+def read_page_size(header):
+    """
+    Return the page size stored in a SQLite header (bytes 16-17), or
+    DEFAULT_PAGE_SIZE when `header` is not a SQLite database.
+    """
+    if len(header) < 18 or not header.startswith(SQLITE_MAGIC):
+        return DEFAULT_PAGE_SIZE
+    page_size = int.from_bytes(header[16:18], 'big')
+    if page_size == 1:
+        return 65536
+    if page_size < 512 or page_size > 32768 or page_size & (page_size - 1):
+        return DEFAULT_PAGE_SIZE
+    return page_size
+
+
+def iter_pages(chunks, page_size):
+    """Regroup an iterable of byte chunks into pages; the last page may be short."""
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        while len(buffer) >= page_size:
+            yield bytes(buffer[:page_size])
+            del buffer[:page_size]
+    if buffer:
+        yield bytes(buffer)
+
+
+def page_hash(page):
+    return hashlib.sha256(page).hexdigest()
+
+
+def changed_pages(server_hashes, client_hashes):
+    """Indices of pages that differ between the two hash lists, including pages only one side has."""
+    return [
+        index for index in range(max(len(server_hashes), len(client_hashes)))
+        if index >= len(server_hashes)
+        or index >= len(client_hashes)
+        or server_hashes[index] != client_hashes[index].lower()
+    ]
+
+
+def encode_frame(index, page):
+    return FRAME_HEADER.pack(index, len(page)) + page
+
+
+def iter_frames(stream, page_size):
+    """
+    Decode frames from a readable stream, checking that indices strictly
+    increase and no payload is larger than a page.
+    """
+    previous = -1
+    while True:
+        header = _read_exactly(stream, FRAME_HEADER.size, allow_eof=True)
+        if header is None:
+            return
+        index, length = FRAME_HEADER.unpack(header)
+        if index <= previous:
+            raise DeltaError("Pages must be sent in ascending order.")
+        if length > page_size:
+            raise DeltaError(f"Page {index} is larger than the page size.")
+        previous = index
+        yield index, _read_exactly(stream, length)
+
+
+def _read_exactly(stream, size, allow_eof=False):
+    data = bytearray()
+    while len(data) < size:
+        chunk = stream.read(size - len(data)) if stream is not None else b''
+        if not chunk:
+            if allow_eof and not data:
+                return None
+            raise DeltaError("Truncated delta frame.")
+        data += chunk
+    return bytes(data)
+
+
+class ChunkStream:
+    """Minimal file-like reader over an iterable of byte chunks, for iter_frames."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b''
+
+    def read(self, size):
+        while len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def diff_pages(old_chunks, new_chunks, page_size):
+    """
+    Yield frames for the pages of the old content that differ from the new
+    content. Patching the new content with them gives back the old content.
+    """
+    new_pages = iter_pages(new_chunks, page_size)
+    for index, old_page in enumerate(iter_pages(old_chunks, page_size)):
+        if next(new_pages, None) != old_page:
+            yield encode_frame(index, old_page)
+
+
+def patch_pages(base_chunks, frames, page_size, size):
+    """
+    Yield the pages of a `size`-byte file made of the base content with the
+    given (index, page) frames applied on top.
+    """
+    base_pages = iter_pages(base_chunks, page_size)
+    frames = iter(frames)
+    pending = next(frames, None)
+    for index in range(-(-size // page_size)):
+        base_page = next(base_pages, None)
+        expected = min(page_size, size - index * page_size)
+        if pending is not None and pending[0] == index:
+            page = pending[1]
+            pending = next(frames, None)
+        elif base_page is not None:
+            page = base_page[:expected]
+        else:
+            raise DeltaError(f"Page {index} is missing.")
+        if len(page) != expected:
+            raise DeltaError(f"Page {index} has the wrong length.")
+        yield page
+    if pending is not None:
+        raise DeltaError(f"Page {pending[0]} is beyond the declared size.")
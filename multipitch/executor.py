@@ -0,0 +1,41 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from django.conf import settings
+from django.core.signals import setting_changed
+
+
+@lru_cache(maxsize=None)
+def get_cpu_executor():
+    """
+    Thread pool for CPU-bound work (password hashing, Base64, checksums,
+    compression) and blocking blob reads from async views. Its size bounds
+    how many such jobs run at once, however many connections are open.
+    """
+    return ThreadPoolExecutor(
+        max_workers=settings.ASYNC_CPU_WORKERS,
+        thread_name_prefix='multipitch-cpu',
+    )
+
+
+def _reset_cpu_executor(setting, **kwargs):
+    if setting == 'ASYNC_CPU_WORKERS':
+        get_cpu_executor().shutdown(wait=False)
+        get_cpu_executor.cache_clear()
+
+
+setting_changed.connect(_reset_cpu_executor)
+
+
+async def run_cpu(func, *args, **kwargs):
+    """Run `func` on the CPU executor without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_cpu_executor(), functools.partial(func, *args, **kwargs))
+
+
+async def aiter_cpu(iterator):
+    """Drive a blocking iterator on the CPU executor, one item at a time."""
+    done = object()
+    while (item := await run_cpu(next, iterator, done)) is not done:
+        yield item
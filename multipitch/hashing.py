@@ -0,0 +1,138 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.signals import setting_changed
+from multipitch import metrics
+
+
+class HashingBusy(Exception):
+    """The hashing pool already holds as many jobs as it may queue."""
+
+
+class HashingPool:
+    """
+    Runs password hashing on a dedicated thread pool of `workers` threads.
+    At most `max_queue` further jobs may wait; beyond that, submit() raises
+    HashingBusy at once instead of queueing, so a burst of logins cannot
+    tie up every request thread. Tracks hash latency and queue wait.
+    """
+
+    def __init__(self, workers, max_queue):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='multipitch-hash')
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats = {
+            'completed': 0,
+            'rejected': 0,
+            'hash_seconds_total': 0.0,
+            'hash_seconds_max': 0.0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+        }
+
+    def submit(self, func, *args):
+        """Schedule func(*args); returns a concurrent.futures.Future."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['rejected'] += 1
+            metrics.password_hash_rejected.inc()
+            raise HashingBusy()
+        with self._lock:
+            self._in_flight += 1
+        queued_at = time.monotonic()
+
+        def job():
+            started = time.monotonic()
+            try:
+                return func(*args)
+            finally:
+                self._record(started - queued_at, time.monotonic() - started)
+
+        try:
+            return self._executor.submit(job)
+        except BaseException:
+            self._release()
+            raise
+
+    def run(self, func, *args):
+        """Run func(*args) on the pool and wait for the result."""
+        return self.submit(func, *args).result()
+
+    async def arun(self, func, *args):
+        return await asyncio.wrap_future(self.submit(func, *args))
+
+    def _record(self, wait, duration):
+        metrics.password_hash_seconds.observe(duration)
+        metrics.password_hash_wait_seconds.observe(wait)
+        with self._lock:
+            stats = self._stats
+            stats['completed'] += 1
+            stats['hash_seconds_total'] += duration
+            stats['hash_seconds_max'] = max(stats['hash_seconds_max'], duration)
+            stats['wait_seconds_total'] += wait
+            stats['wait_seconds_max'] = max(stats['wait_seconds_max'], wait)
+        self._release()
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def stats(self):
+        """Snapshot of the counters, plus the jobs currently running or queued."""
+        with self._lock:
+            return {**self._stats, 'in_flight': self._in_flight}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+@lru_cache(maxsize=None)
+def get_hashing_pool():
+    config = settings.PASSWORD_HASHING
+    return HashingPool(workers=config['WORKERS'], max_queue=config['MAX_QUEUE'])
+
+
+def _reset_hashing_pool(setting, **kwargs):
+    if setting == 'PASSWORD_HASHING':
+        get_hashing_pool().shutdown()
+        get_hashing_pool.cache_clear()
+
+
+setting_changed.connect(_reset_hashing_pool)
+
+
+def set_user_password(user, raw_password):
+    """user.set_password with the hashing done on the pool."""
+    user.password = get_hashing_pool().run(make_password, raw_password)
+    user._password = raw_password
+
+
+def check_user_password(user, raw_password):
+    """
+    user.check_password with the hashing done on the pool. A hash upgrade
+    is hashed on the pool too and saved from the calling thread.
+    """
+    rehash = []
+    valid = get_hashing_pool().run(check_password, raw_password, user.password, rehash.append)
+    if rehash:
+        user.password = get_hashing_pool().run(make_password, raw_password)
+        user.save(update_fields=['password'])
+    return valid
+
+
+async def acheck_user_password(user, raw_password):
+    """Async check_user_password."""
+    rehash = []
+    valid = await get_hashing_pool().arun(check_password, raw_password, user.password, rehash.append)
+    if rehash:
+        user.password = await get_hashing_pool().arun(make_password, raw_password)
+        await user.asave(update_fields=['password'])
+    return valid
@@ -0,0 +1,191 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from multipitch.benchmark import DEFAULT_SIZES, Benchmark, compare, parse_size, peak_rss
+from datetime import datetime, timezone
+import http.client
+import json
+import os
+import platform
+import secrets
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+SCENARIOS = ('signup', 'login', 'refresh', 'me', 'upload', 'download')
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the API over HTTP and report latency percentiles, throughput, "
+        "DB queries per request and server peak RSS as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default=None,
+                            help="Server to benchmark (default: start one with --serve).")
+        parser.add_argument('--serve', action='store_true',
+                            help="Start a local runserver with throttles lifted, on a throwaway "
+                                 "database, and benchmark it.")
+        parser.add_argument('--server-pid', type=int, default=None,
+                            help="PID of the server process, to report its peak RSS.")
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                            help=f"Comma-separated scenarios (default: {','.join(SCENARIOS)}).")
+        parser.add_argument('--requests', type=int, default=200,
+                            help="Requests per auth scenario.")
+        parser.add_argument('--blob-requests', type=int, default=5,
+                            help="Requests per backup size.")
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help="Concurrent clients.")
+        parser.add_argument('--sizes', default=','.join(DEFAULT_SIZES),
+                            help="Comma-separated backup sizes, e.g. 100KB,10MB.")
+        parser.add_argument('--payload', choices=('random', 'sqlite'), default='random',
+                            help="Backup bodies: seeded random bytes, or generated device databases.")
+        parser.add_argument('--metrics-token', default=None,
+                            help="Bearer token for /metrics (default: METRICS['AUTH_TOKEN']).")
+        parser.add_argument('--output', default=None,
+                            help="Write the JSON report to this file.")
+        parser.add_argument('--compare', default=None,
+                            help="Baseline JSON report to compare against.")
+        parser.add_argument('--threshold', type=float, default=10,
+                            help="Percent p95/throughput change counted as a regression.")
+
+    def handle(self, *args, **options):
+        scenarios = {name.strip() for name in options['scenarios'].split(',') if name.strip()}
+        unknown = scenarios - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        sizes = [size.strip() for size in options['sizes'].split(',') if size.strip()]
+        try:
+            for size in sizes:
+                parse_size(size)
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options['requests'] < 1 or options['blob_requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError("--requests, --blob-requests and --concurrency must be positive.")
+
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read baseline: {e}")
+
+        server = data_dir = None
+        base_url, server_pid = options['base_url'], options['server_pid']
+        metrics_token = options['metrics_token'] or settings.METRICS['AUTH_TOKEN']
+        if not options['serve'] and base_url is None:
+            raise CommandError("Pass --base-url or --serve.")
+
+        try:
+            if options['serve']:
+                data_dir = tempfile.mkdtemp(prefix='multipitch-benchmark-')
+                # /metrics refuses scrapes without a token outside DEBUG.
+                metrics_token = metrics_token or secrets.token_urlsafe()
+                server, base_url = self._start_server(data_dir, metrics_token)
+                server_pid = server.pid
+            benchmark = Benchmark(
+                base_url,
+                requests=options['requests'],
+                blob_requests=options['blob_requests'],
+                concurrency=options['concurrency'],
+                sizes=sizes,
+                payload=options['payload'],
+                metrics_token=metrics_token,
+                server_pid=server_pid,
+                out=self.stdout,
+            )
+            try:
+                results = benchmark.run(scenarios)
+            except RuntimeError as e:
+                raise CommandError(str(e))
+            report = {
+                'meta': self._meta(options, base_url, sizes),
+                'server': {'peak_rss_bytes': peak_rss(server_pid) if server_pid else None},
+                'results': results,
+            }
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=10)
+            if data_dir is not None:
+                shutil.rmtree(data_dir, ignore_errors=True)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
+        else:
+            self.stdout.write(json.dumps(report, indent=2))
+
+        if baseline is not None:
+            regressions = compare(baseline, report, options['threshold'] / 100)
+            for name, metric, old, new in regressions:
+                self.stderr.write(f"Regression in {name}: {metric} {old:.1f} -> {new:.1f}")
+            if regressions:
+                raise CommandError(f"{len(regressions)} regressions beyond {options['threshold']}%.")
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
+
+    def _start_server(self, data_dir, metrics_token):
+        """
+        Start runserver with its database and blobs in `data_dir`, migrated
+        from scratch, so benchmark users and uploads never reach the real
+        database, and /metrics guarded by `metrics_token`.
+        Returns (process, base_url).
+        """
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        env = {
+            **os.environ, 'DJANGO_BENCHMARK': 'True', 'DJANGO_DATA_DIR': data_dir,
+            'DJANGO_METRICS_AUTH_TOKEN': metrics_token,
+        }
+        migrate = subprocess.run(
+            [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'migrate', '--noinput'],
+            env=env, capture_output=True, text=True,
+        )
+        if migrate.returncode:
+            raise CommandError(f"Migrating the benchmark database failed:\n{migrate.stderr}")
+        server = subprocess.Popen(
+            [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'runserver', '--noreload',
+             '--skip-checks', f'127.0.0.1:{port}'],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError("The benchmark server exited during startup.")
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+                connection.request('GET', '/metrics')
+                connection.getresponse().read()
+                connection.close()
+                return server, f"http://127.0.0.1:{port}"
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError("The benchmark server did not start within 30 seconds.")
+
+    def _meta(self, options, base_url, sizes):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'commit': commit,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'base_url': base_url,
+            'requests': options['requests'],
+            'blob_requests': options['blob_requests'],
+            'concurrency': options['concurrency'],
+            'sizes': sizes,
+            'payload': options['payload'],
+        }
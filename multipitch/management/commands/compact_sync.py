@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from multipitch.models import SyncChange, UserAuth
+from multipitch.services.sync_service import compact
+import time
+
+
+class Command(BaseCommand):
+    help = "Compact the sync change log: drop superseded changes and old, checkpointed deletions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help="Only compact this user id; may be repeated.")
+
+    def handle(self, *args, users, **options):
+        user_ids = SyncChange.objects.order_by('user_id').values_list('user_id', flat=True).distinct()
+        if users:
+            user_ids = user_ids.filter(user_id__in=users)
+
+        started = time.monotonic()
+        superseded = tombstones = 0
+        for user in UserAuth.objects.filter(pk__in=list(user_ids)).iterator():
+            result = compact(user)
+            superseded += result.superseded
+            tombstones += result.tombstones
+            if options['verbosity'] > 1:
+                self.stdout.write(
+                    f"User {user.pk}: {result.superseded} superseded, {result.tombstones} deletions dropped"
+                )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Dropped {superseded} superseded changes and {tombstones} deletions "
+            f"in {time.monotonic() - started:.1f}s."
+        ))
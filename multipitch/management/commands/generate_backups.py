@@ -0,0 +1,115 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from multipitch import dataset
+from multipitch.benchmark import parse_size
+from multipitch.models import UserBackup
+from multipitch.services.backup_service import build_backup, save_backup
+from multipitch.storage import get_blob_store
+import os
+import tempfile
+import time
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate realistic SQLite device databases and seed users with them as backups, "
+        "or write them to a directory with --output-dir."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10,
+                            help="Number of users (or devices with --output-dir).")
+        parser.add_argument('--size', default='1MB',
+                            help="Size of each first backup, e.g. 500KB or 20MB.")
+        parser.add_argument('--versions', type=int, default=1,
+                            help="Backups per user; each later one is the previous after churn.")
+        parser.add_argument('--churn', type=float, default=0.05,
+                            help="Fraction of the database changed between versions.")
+        parser.add_argument('--seed', type=int, default=0,
+                            help="Seed for the generated data.")
+        parser.add_argument('--prefix', default='seed-user-',
+                            help="Username and email prefix of the seeded users.")
+        parser.add_argument('--password', default='SeedPass123!',
+                            help="Password of every seeded user.")
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help="Users inserted per bulk insert.")
+        parser.add_argument('--output-dir', default=None,
+                            help="Write the databases here instead of seeding users.")
+
+    def handle(self, *args, users, versions, churn, seed, batch_size, **options):
+        try:
+            size = parse_size(options['size'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if users < 1 or versions < 1 or batch_size < 1:
+            raise CommandError("--users, --versions and --batch-size must be positive.")
+        if not 0 <= churn <= 1:
+            raise CommandError("--churn must be between 0 and 1.")
+
+        started = time.monotonic()
+        if options['output_dir']:
+            written = self._write_files(options['output_dir'], users, size, versions, churn, seed)
+            self.stdout.write(self.style.SUCCESS(
+                f"Wrote {written} databases to {options['output_dir']} in {time.monotonic() - started:.1f}s."
+            ))
+            return
+
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(f"Users named {prefix}* already exist; pass another --prefix.")
+
+        password = make_password(options['password'])
+        for first in range(0, users, batch_size):
+            indexes = range(first, min(first + batch_size, users))
+            self._seed_batch(prefix, password, indexes, size, versions, churn, seed)
+            if options['verbosity'] > 1:
+                self.stdout.write(f"Seeded {indexes.stop} of {users} users")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {users} users with {versions} backups each in {time.monotonic() - started:.1f}s."
+        ))
+
+    def _write_files(self, directory, users, size, versions, churn, seed):
+        os.makedirs(directory, exist_ok=True)
+        written = 0
+        for index in range(users):
+            contents = dataset.generate_versions(size, versions, churn, f"{seed}-{index}")
+            for version, data in enumerate(contents, start=1):
+                with open(os.path.join(directory, f"device-{index}-v{version}.sqlite3"), 'wb') as f:
+                    f.write(data)
+                written += 1
+        return written
+
+    def _seed_batch(self, prefix, password, indexes, size, versions, churn, seed):
+        batch = User.objects.bulk_create([
+            User(username=f"{prefix}{index}", email=f"{prefix}{index}@example.com", password=password)
+            for index in indexes
+        ])
+
+        with tempfile.TemporaryDirectory() as directory:
+            paths = {}
+            backups = []
+            try:
+                for user, index in zip(batch, indexes):
+                    paths[user.pk] = path = os.path.join(directory, f"{index}.sqlite3")
+                    dataset.generate(path, size, f"{seed}-{index}")
+                    with open(path, 'rb') as upload:
+                        backups.append(build_backup(user.pk, upload))
+                with transaction.atomic():
+                    UserBackup.objects.bulk_create(backups)
+            except BaseException:
+                for backup in backups:
+                    get_blob_store().delete(backup.blob_key)
+                raise
+
+            # Later versions go through save_backup so the history holds
+            # real page deltas.
+            for user, index in zip(batch, indexes):
+                for version in range(1, versions):
+                    dataset.churn(paths[user.pk], churn, f"{seed}-{index}-{version}")
+                    with open(paths[user.pk], 'rb') as upload:
+                        save_backup(user, upload)
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from multipitch.models import UserBackup
+from multipitch.services.maintenance_service import process_backup
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        "Index the contents of stored backups for the /backup/index/ endpoints. "
+        "Backups go through process_backup, so unchecked ones are checked first "
+        "and only healthy ones are indexed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help="Only index this user id; may be repeated.")
+
+    def handle(self, *args, users, **options):
+        user_ids = UserBackup.objects.order_by('user_id').values_list('user_id', flat=True)
+        if users:
+            user_ids = user_ids.filter(user_id__in=users)
+
+        started = time.monotonic()
+        indexed = skipped = rows = 0
+        for user_id in user_ids.iterator():
+            result = process_backup(user_id)
+            if result is None:
+                continue
+            if result.indexed is None:
+                skipped += 1
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"User {user_id}: not indexed, integrity {result.integrity}")
+                continue
+            indexed += 1
+            changed = sum(sum(counts) for counts in result.indexed.values())
+            rows += changed
+            if options['verbosity'] > 1:
+                self.stdout.write(f"User {user_id}: {changed} rows changed")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {indexed} backups, {rows} rows changed, {skipped} left unindexed, in {time.monotonic() - started:.1f}s."
+        ))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from multipitch.models import UserBackup
+from multipitch.services.maintenance_service import process_backup
+import time
+
+
+class Command(BaseCommand):
+    help = "Check, compact and index stored backups that have not been processed yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help="Only process this user id; may be repeated.")
+        parser.add_argument('--recheck', action='store_true',
+                            help="Check backups again, including ones skipped for lack of space.")
+
+    def handle(self, *args, users, recheck, **options):
+        backups = UserBackup.objects.order_by('user_id')
+        if users:
+            backups = backups.filter(user_id__in=users)
+        if recheck:
+            backups.update(integrity='unchecked', integrity_detail='')
+
+        started = time.monotonic()
+        processed = saved = 0
+        for user_id in backups.values_list('user_id', flat=True).iterator():
+            result = process_backup(user_id)
+            if result is None:
+                continue
+            processed += 1
+            saved += result.saved_bytes
+            if options['verbosity'] > 1:
+                self.stdout.write(f"User {user_id}: {result.integrity}, {result.saved_bytes} bytes saved")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {processed} backups, {saved} bytes saved by compaction, "
+            f"in {time.monotonic() - started:.1f}s."
+        ))
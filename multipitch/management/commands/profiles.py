@@ -0,0 +1,55 @@
+import io
+from django.core.management.base import BaseCommand, CommandError
+from multipitch.profiling import list_profiles, load_profile, prune_profiles
+
+
+class Command(BaseCommand):
+    help = "Browse request profiles recorded by ProfilerMiddleware."
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', nargs='?', default='list', choices=['list', 'show', 'clear'])
+        parser.add_argument('profile_id', nargs='?', help="Profile to show.")
+        parser.add_argument('--sort', default='cumulative', help="pstats sort key for 'show'.")
+        parser.add_argument('--limit', type=int, default=30, help="Rows to print.")
+
+    def handle(self, *args, action, profile_id, sort, limit, **options):
+        if action == 'list':
+            self._list(limit)
+        elif action == 'show':
+            if not profile_id:
+                raise CommandError("'show' needs a profile id.")
+            self._show(profile_id, sort, limit)
+        else:
+            prune_profiles(0)
+            self.stdout.write(self.style.SUCCESS("Deleted all profiles."))
+
+    def _list(self, limit):
+        profiles = list_profiles()[:limit]
+        if not profiles:
+            self.stdout.write("No profiles recorded.")
+            return
+        for summary in profiles:
+            self.stdout.write(
+                f"{summary['id']}  {summary['method']:6} {summary['status']} "
+                f"{summary['seconds'] * 1000:8.1f}ms {len(summary['queries']):4} queries  {summary['path']}"
+            )
+
+    def _show(self, profile_id, sort, limit):
+        try:
+            summary, stats = load_profile(profile_id)
+        except FileNotFoundError:
+            raise CommandError(f"No profile {profile_id!r}.")
+
+        self.stdout.write(
+            f"{summary['method']} {summary['path']} ({summary['view']}) -> {summary['status']} "
+            f"in {summary['seconds'] * 1000:.1f}ms, user {summary['user_id']}, at {summary['created_at']}"
+        )
+        queries = summary['queries']
+        self.stdout.write(f"\n{len(queries)} queries, {sum(q['seconds'] for q in queries) * 1000:.1f}ms total")
+        for query in sorted(queries, key=lambda q: q['seconds'], reverse=True)[:limit]:
+            self.stdout.write(f"  {query['seconds'] * 1000:7.2f}ms  {query['sql']}")
+
+        stream = io.StringIO()
+        stats.stream = stream
+        stats.sort_stats(sort).print_stats(limit)
+        self.stdout.write(stream.getvalue())
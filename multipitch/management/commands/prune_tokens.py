@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from multipitch.services.token_prune_service import iter_prune_batches
+import time
+
+
+class Command(BaseCommand):
+    help = "Delete expired outstanding and blacklisted JWT rows in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Rows per batch (default: TOKEN_PRUNE_BATCH_SIZE).")
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help="Stop after this many batches.")
+        parser.add_argument('--pause', type=float, default=0,
+                            help="Seconds to sleep between batches.")
+
+    def handle(self, *args, batch_size, max_batches, pause, **options):
+        if batch_size is not None and batch_size < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        started = time.monotonic()
+        outstanding = blacklisted = batches = 0
+        for batch in iter_prune_batches(batch_size):
+            outstanding += batch.outstanding
+            blacklisted += batch.blacklisted
+            batches += 1
+            if options['verbosity'] > 1:
+                self.stdout.write(f"Batch {batches}: {batch.outstanding + batch.blacklisted} rows")
+            if max_batches is not None and batches >= max_batches:
+                self.stdout.write(f"Stopped after {batches} batches; run again to resume")
+                break
+            if pause:
+                time.sleep(pause)
+
+        elapsed = time.monotonic() - started
+        total = outstanding + blacklisted
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {outstanding} outstanding and {blacklisted} blacklisted tokens "
+            f"in {batches} batches ({elapsed:.2f}s, {rate:.0f} rows/s)."
+        ))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from multipitch.services import job_service, token_prune_service, upload_session_service
+import signal
+import time
+
+
+class Command(BaseCommand):
+    help = "Run background jobs (backup processing, token and upload session pruning) until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', action='append', dest='kinds',
+                            help="Only run jobs of this kind; may be repeated.")
+        parser.add_argument('--threads', type=int, default=1,
+                            help="Jobs run at once by this worker (default 1).")
+        parser.add_argument('--name', help="Worker name recorded on claimed jobs (default host:pid).")
+        parser.add_argument('--burst', action='store_true',
+                            help="Exit once no job is ready instead of waiting for more.")
+
+    def handle(self, *args, kinds, threads, name, burst, **options):
+        unknown = set(kinds or ()) - set(job_service.registered_kinds())
+        if unknown:
+            raise CommandError(f"Unknown job kinds: {', '.join(sorted(unknown))}.")
+        if threads < 1:
+            raise CommandError("--threads must be at least 1.")
+
+        if kinds is None or 'prune_tokens' in kinds:
+            token_prune_service.schedule_pruning()
+        if kinds is None or 'purge_upload_sessions' in kinds:
+            upload_session_service.schedule_purge()
+        worker = job_service.Worker(name=name, kinds=kinds, threads=threads, burst=burst)
+        # SIGTERM lets the jobs in hand finish, like Ctrl-C.
+        previous_handler = signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+        if options['verbosity'] > 1:
+            self.stdout.write(f"Worker {worker.name} running {', '.join(kinds or job_service.registered_kinds())}")
+
+        started = time.monotonic()
+        try:
+            stats = worker.work()
+        except KeyboardInterrupt:
+            worker.stop()
+            stats = job_service.WorkerStats(worker.succeeded, worker.failed)
+        finally:
+            signal.signal(signal.SIGTERM, previous_handler)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Ran {stats.succeeded + stats.failed} jobs, {stats.failed} failed, "
+            f"in {time.monotonic() - started:.1f}s."
+        ))
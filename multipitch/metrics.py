@@ -0,0 +1,329 @@
+"""
+Process-wide request metrics in the Prometheus text format.
+
+Each thread updates its own shard of counters without taking a lock; a
+scrape sums the shards. With METRICS['MULTIPROCESS_DIR'] set, every
+process also writes its totals to a file in that directory (at most every
+FLUSH_INTERVAL seconds) and a scrape sums all files, so the /metrics of
+any worker reports the whole server. The files of processes that exited
+are folded into one archive file, so the directory does not grow with
+every restart and the totals never go down.
+"""
+import bisect
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: exited processes' files are kept.
+    fcntl = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = tuple(2 ** n * 1024 for n in range(4, 20, 2))  # 16 KiB .. 256 MiB
+
+# (thread, shard) of each thread that recorded something. Shards of threads
+# that exited are folded into _retired, so threads that come and go (threaded
+# runserver, sync_to_async) do not pile up shards.
+_shards = []
+_retired = defaultdict(float)
+_shards_lock = threading.Lock()
+_local = threading.local()
+
+
+def _retire_exited():
+    """Fold the shards of exited threads into _retired; hold _shards_lock."""
+    alive = []
+    for thread, shard in _shards:
+        if thread.is_alive():
+            alive.append((thread, shard))
+        else:
+            for key, value in shard.items():
+                _retired[key] += value
+    _shards[:] = alive
+
+
+def _shard():
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _local.shard = defaultdict(float)
+        with _shards_lock:
+            _retire_exited()
+            _shards.append((threading.current_thread(), shard))
+    return shard
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        REGISTRY[name] = self
+
+    def _labels(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, value=1, **labels):
+        _shard()[(self.name, '', self._labels(labels))] += value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        shard = _shard()
+        labels = self._labels(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        le = str(self.buckets[index]) if index < len(self.buckets) else '+Inf'
+        shard[(self.name, '_bucket', labels + (le,))] += 1
+        shard[(self.name, '_sum', labels)] += value
+        shard[(self.name, '_count', labels)] += 1
+
+
+REGISTRY = {}
+
+http_requests = Counter(
+    'multipitch_http_requests_total', "HTTP requests by view, method and status.",
+    ('view', 'method', 'status'))
+http_latency = Histogram(
+    'multipitch_http_request_duration_seconds', "Time spent producing a response.", ('view',))
+http_request_bytes = Counter(
+    'multipitch_http_request_bytes_total', "Request body bytes received.", ('view',))
+http_response_bytes = Counter(
+    'multipitch_http_response_bytes_total', "Response body bytes sent, when known up front.", ('view',))
+db_queries = Counter(
+    'multipitch_db_queries_total', "ORM queries run while handling requests.", ('view',))
+db_query_seconds = Counter(
+    'multipitch_db_query_seconds_total', "Time spent in ORM queries while handling requests.", ('view',))
+password_hash_seconds = Histogram(
+    'multipitch_password_hash_seconds', "Time spent hashing a password on the hashing pool.")
+password_hash_wait_seconds = Histogram(
+    'multipitch_password_hash_wait_seconds', "Time password hashing jobs waited for a worker.")
+password_hash_rejected = Counter(
+    'multipitch_password_hash_rejected_total', "Logins and signups turned away by a full hashing queue.")
+backup_bytes = Histogram(
+    'multipitch_backup_blob_bytes', "Size of saved backups, decoded and as stored.", ('kind',),
+    buckets=SIZE_BUCKETS)
+
+
+class QueryStats:
+    __slots__ = ('count', 'seconds')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+# Queries of the request handled in this context. A context variable, so
+# queries run from sync_to_async threads are counted for the request too.
+current_queries = ContextVar('metrics_current_queries', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    stats = current_queries.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.count += 1
+        stats.seconds += time.perf_counter() - started
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def observe_backup(backup):
+    backup_bytes.observe(backup.original_size, kind='original')
+    backup_bytes.observe(backup.stored_size, kind='stored')
+
+
+def local_samples():
+    with _shards_lock:
+        _retire_exited()
+        totals = _retired.copy()
+        shards = [shard for _, shard in _shards]
+    for shard in shards:
+        for key, value in shard.copy().items():
+            totals[key] += value
+    return totals
+
+
+def _multiprocess_dir():
+    directory = settings.METRICS['MULTIPROCESS_DIR']
+    return Path(directory) if directory else None
+
+
+def _write_samples(directory, filename, totals):
+    rows = [[name, suffix, list(labels), value] for (name, suffix, labels), value in totals.items()]
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as target:
+        json.dump(rows, target)
+    os.replace(tmp_path, directory / filename)
+
+
+_last_flush = 0.0
+
+
+def flush(force=False):
+    """Write this process's totals to the multiprocess directory, if configured."""
+    global _last_flush
+    directory = _multiprocess_dir()
+    if directory is None:
+        return
+    now = time.monotonic()
+    if not force and now - _last_flush < settings.METRICS['FLUSH_INTERVAL']:
+        return
+    _last_flush = now
+    directory.mkdir(parents=True, exist_ok=True)
+    _write_samples(directory, f"{os.getpid()}.json", local_samples())
+
+
+ARCHIVE_FILE = 'archive.json'
+
+
+@contextmanager
+def _locked(directory, operation):
+    """Hold a flock on the directory's lock file: LOCK_SH to read, LOCK_EX to archive."""
+    if fcntl is None:
+        yield
+        return
+    with open(directory / '.lock', 'a') as lock:
+        fcntl.flock(lock, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _read_samples(path, totals):
+    """Add the samples in the file at `path`, if it is readable, to `totals`."""
+    try:
+        rows = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return
+    for name, suffix, labels, value in rows:
+        totals[(name, suffix, tuple(labels))] += value
+
+
+def _process_exited(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+def archive_exited(directory):
+    """
+    Fold the files of processes that exited into ARCHIVE_FILE, so their
+    counts are kept in a single file. Scrapes read under a shared lock and
+    never see a file both archived and still in place.
+    """
+    exited = [
+        path for path in directory.glob('*.json')
+        if path.stem.isdigit() and int(path.stem) != os.getpid() and _process_exited(int(path.stem))
+    ]
+    if not exited or fcntl is None:
+        return
+    with _locked(directory, fcntl.LOCK_EX):
+        # Another scrape may have archived some of them meanwhile.
+        exited = [path for path in exited if path.exists()]
+        if not exited:
+            return
+        totals = defaultdict(float)
+        for path in [directory / ARCHIVE_FILE, *exited]:
+            _read_samples(path, totals)
+        _write_samples(directory, ARCHIVE_FILE, totals)
+        for path in exited:
+            path.unlink(missing_ok=True)
+
+
+def collect():
+    """Samples of every process (or just this one), keyed (name, suffix, labels)."""
+    directory = _multiprocess_dir()
+    if directory is None:
+        return local_samples()
+    flush(force=True)
+    archive_exited(directory)
+    totals = defaultdict(float)
+    with _locked(directory, fcntl.LOCK_SH if fcntl else None):
+        for path in directory.glob('*.json'):
+            _read_samples(path, totals)
+    return totals
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values)
+    )
+    return '{' + pairs + '}'
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def render(samples=None):
+    """Render samples (by default, collect()) in the Prometheus text format."""
+    samples = collect() if samples is None else samples
+    by_metric = defaultdict(list)
+    for (name, suffix, labels), value in samples.items():
+        by_metric[name].append((suffix, labels, value))
+
+    lines = []
+    for name, metric in REGISTRY.items():
+        lines.append(f"# HELP {name} {metric.help}")
+        lines.append(f"# TYPE {name} {metric.type}")
+        entries = by_metric.get(name, [])
+        if metric.type == 'counter':
+            for suffix, labels, value in sorted(entries):
+                lines.append(f"{name}{_format_labels(metric.labelnames, labels)} {_format_value(value)}")
+            continue
+
+        series = defaultdict(dict)
+        for suffix, labels, value in entries:
+            if suffix == '_bucket':
+                series[labels[:-1]][labels[-1]] = value
+            else:
+                series[labels][suffix] = value
+        bounds = [str(b) for b in metric.buckets] + ['+Inf']
+        for labels in sorted(series):
+            values = series[labels]
+            cumulative = 0
+            for le in bounds:
+                cumulative += values.get(le, 0)
+                label_text = _format_labels(metric.labelnames + ('le',), labels + (le,))
+                lines.append(f"{name}_bucket{label_text} {_format_value(cumulative)}")
+            label_text = _format_labels(metric.labelnames, labels)
+            lines.append(f"{name}_sum{label_text} {_format_value(values.get('_sum', 0))}")
+            lines.append(f"{name}_count{label_text} {_format_value(values.get('_count', 0))}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,106 @@
+import random
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework.exceptions import AuthenticationFailed
+from multipitch import metrics, profiling
+from multipitch.authentication import CachedJWTAuthentication
+
+
+class MetricsMiddleware:
+    """
+    Records per-view request counts, latency, body sizes and ORM query
+    counts/time into multipitch.metrics. Views are labelled with their URL
+    name from config/urls.py. Works for sync and async views without
+    switching threads.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        queries = metrics.QueryStats()
+        token = metrics.current_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current_queries.reset(token)
+        self._record(request, response, time.perf_counter() - started, queries)
+        return response
+
+    async def __acall__(self, request):
+        queries = metrics.QueryStats()
+        token = metrics.current_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current_queries.reset(token)
+        self._record(request, response, time.perf_counter() - started, queries)
+        return response
+
+    def _record(self, request, response, duration, queries):
+        match = request.resolver_match
+        view = match.url_name if match is not None and match.url_name else 'unmatched'
+        metrics.http_requests.inc(view=view, method=request.method, status=response.status_code)
+        metrics.http_latency.observe(duration, view=view)
+        metrics.db_queries.inc(queries.count, view=view)
+        metrics.db_query_seconds.inc(queries.seconds, view=view)
+
+        try:
+            request_bytes = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            request_bytes = 0
+        metrics.http_request_bytes.inc(request_bytes, view=view)
+        if response.has_header('Content-Length'):
+            response_bytes = int(response['Content-Length'])
+        elif not response.streaming:
+            response_bytes = len(response.content)
+        else:
+            response_bytes = 0
+        metrics.http_response_bytes.inc(response_bytes, view=view)
+        metrics.flush()
+
+
+class ProfilerMiddleware:
+    """
+    Profiles sampled requests, and requests from staff users that send the
+    PROFILER['HEADER'] header, with cProfile plus the SQL they run. Results
+    are written under PROFILER['DIR'] and browsed with
+    `manage.py profiles`. Removed from the stack at startup unless
+    PROFILER['ENABLED'] is set, so it costs nothing when off.
+    This middleware is sync-only, so under ASGI enabling it runs the
+    views behind it in a thread.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILER['ENABLED']:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.config = settings.PROFILER
+
+    def __call__(self, request):
+        if not self._should_profile(request):
+            return self.get_response(request)
+        return profiling.profile_request(request, self.get_response)
+
+    def _should_profile(self, request):
+        header = self.config['HEADER']
+        if header and request.headers.get(header):
+            try:
+                result = CachedJWTAuthentication().authenticate(request)
+            except AuthenticationFailed:
+                result = None
+            user = result[0] if result else getattr(request, 'user', None)
+            if user is not None and user.is_staff:
+                return True
+        return random.random() < self.config['SAMPLE_RATE']
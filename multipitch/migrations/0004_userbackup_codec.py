@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:45
+
+from django.db import migrations, models
+from django.db.models.functions import Length
+
+
+def backfill_original_size(apps, schema_editor):
+    UserBackup = apps.get_model('multipitch', 'UserBackup')
+    UserBackup.objects.update(original_size=Length('sqlite_blob'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('multipitch', '0003_backupuploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userbackup',
+            name='codec',
+            field=models.CharField(choices=[('identity', 'Uncompressed'), ('gzip', 'Gzip')], default='identity', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='userbackup',
+            name='original_size',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_original_size, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:47
+
+import gzip
+import hashlib
+
+from django.db import migrations, models
+
+
+def backfill_sha256(apps, schema_editor):
+    UserBackup = apps.get_model('multipitch', 'UserBackup')
+    for backup in UserBackup.objects.iterator(chunk_size=100):
+        blob = bytes(backup.sqlite_blob)
+        if backup.codec == 'gzip':
+            blob = gzip.decompress(blob)
+        UserBackup.objects.filter(pk=backup.pk).update(sha256=hashlib.sha256(blob).hexdigest())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('multipitch', '0004_userbackup_codec'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userbackup',
+            name='sha256',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.RunPython(backfill_sha256, migrations.RunPython.noop),
+    ]
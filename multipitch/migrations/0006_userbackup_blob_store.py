@@ -0,0 +1,64 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:51
+
+import io
+import uuid
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def move_blobs_to_store(apps, schema_editor):
+    from multipitch.storage import get_blob_store
+
+    store = get_blob_store()
+    UserBackup = apps.get_model('multipitch', 'UserBackup')
+    for backup in UserBackup.objects.iterator(chunk_size=100):
+        blob = bytes(backup.sqlite_blob)
+        key = f"backups/{backup.user_id}/{uuid.uuid4().hex}"
+        store.save(key, io.BytesIO(blob))
+        UserBackup.objects.filter(pk=backup.pk).update(blob_key=key, stored_size=len(blob))
+
+
+def move_blobs_to_rows(apps, schema_editor):
+    from multipitch.storage import get_blob_store
+
+    store = get_blob_store()
+    UserBackup = apps.get_model('multipitch', 'UserBackup')
+    for backup in UserBackup.objects.exclude(blob_key='').iterator(chunk_size=100):
+        with store.open(backup.blob_key) as blob:
+            UserBackup.objects.filter(pk=backup.pk).update(sqlite_blob=blob.read())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('multipitch', '0005_userbackup_sha256'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userbackup',
+            name='blob_key',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='userbackup',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='userbackup',
+            name='stored_size',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='userbackup',
+            name='sqlite_blob',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.RunPython(move_blobs_to_store, move_blobs_to_rows),
+        migrations.RemoveField(
+            model_name='userbackup',
+            name='sqlite_blob',
+        ),
+    ]
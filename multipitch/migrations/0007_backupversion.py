@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('multipitch', '0006_userbackup_blob_store'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userbackup',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.CreateModel(
+            name='BackupVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('blob_key', models.CharField(max_length=255)),
+                ('codec', models.CharField(choices=[('identity', 'Uncompressed'), ('gzip', 'Gzip')], default='identity', max_length=16)),
+                ('is_delta', models.BooleanField(default=False)),
+                ('page_size', models.PositiveIntegerField()),
+                ('stored_size', models.BigIntegerField()),
+                ('original_size', models.BigIntegerField()),
+                ('sha256', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='backup_versions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-number'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'number'), name='unique_backup_version')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('multipitch', '0007_backupversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userauth',
+            name='token_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
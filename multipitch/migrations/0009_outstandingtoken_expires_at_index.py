@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Index token_blacklist_outstandingtoken.expires_at so prune_tokens can
+    find expired rows without scanning the table. The table belongs to
+    simplejwt, hence raw SQL.
+    """
+
+    dependencies = [
+        ('multipitch', '0008_userauth_token_version'),
+        ('token_blacklist', '0013_alter_blacklistedtoken_options_and_more'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql='CREATE INDEX IF NOT EXISTS multipitch_outstandingtoken_expires_at '
+                'ON token_blacklist_outstandingtoken (expires_at, id)',
+            reverse_sql='DROP INDEX IF EXISTS multipitch_outstandingtoken_expires_at',
+        ),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('multipitch', '0009_outstandingtoken_expires_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackupIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(blank=True, max_length=64)),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('indexed_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='backup_index', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='IndexedClimb',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_id', models.BigIntegerField()),
+                ('row_hash', models.CharField(max_length=40)),
+                ('route_id', models.BigIntegerField(null=True)),
+                ('started_at', models.DateTimeField(null=True)),
+                ('finished_at', models.DateTimeField(null=True)),
+                ('partner', models.CharField(blank=True, max_length=255)),
+                ('style', models.CharField(blank=True, max_length=32)),
+                ('status', models.CharField(blank=True, max_length=32)),
+                ('notes', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-started_at'], name='indexed_climb_recent')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'source_id'), name='unique_indexed_climb')],
+            },
+        ),
+        migrations.CreateModel(
+            name='IndexedLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_id', models.BigIntegerField()),
+                ('row_hash', models.CharField(max_length=40)),
+                ('climb_id', models.BigIntegerField(null=True)),
+                ('pitch_id', models.BigIntegerField(null=True)),
+                ('recorded_at', models.DateTimeField(null=True)),
+                ('event', models.CharField(blank=True, max_length=32)),
+                ('duration_s', models.IntegerField(null=True)),
+                ('latitude', models.FloatField(null=True)),
+                ('longitude', models.FloatField(null=True)),
+                ('altitude_m', models.FloatField(null=True)),
+                ('note', models.TextField(blank=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'climb_id', 'recorded_at'], name='indexed_log_climb')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'source_id'), name='unique_indexed_log')],
+            },
+        ),
+        migrations.CreateModel(
+            name='IndexedPitch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_id', models.BigIntegerField()),
+                ('row_hash', models.CharField(max_length=40)),
+                ('route_id', models.BigIntegerField(null=True)),
+                ('number', models.IntegerField(null=True)),
+                ('grade', models.CharField(blank=True, max_length=16)),
+                ('length_m', models.IntegerField(null=True)),
+                ('protection', models.TextField(blank=True)),
+                ('belay', models.TextField(blank=True)),
+                ('notes', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'route_id', 'number'], name='indexed_pitch_route')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'source_id'), name='unique_indexed_pitch')],
+            },
+        ),
+        migrations.CreateModel(
+            name='IndexedRoute',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_id', models.BigIntegerField()),
+                ('row_hash', models.CharField(max_length=40)),
+                ('name', models.CharField(blank=True, max_length=255)),
+                ('crag', models.CharField(blank=True, max_length=255)),
+                ('country', models.CharField(blank=True, max_length=64)),
+                ('grade', models.CharField(blank=True, max_length=16)),
+                ('length_m', models.IntegerField(null=True)),
+                ('latitude', models.FloatField(null=True)),
+                ('longitude', models.FloatField(null=True)),
+                ('description', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'source_id'), name='unique_indexed_route')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('multipitch', '0011_sync_changes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userbackup',
+            name='compacted_from',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='userbackup',
+            name='integrity',
+            field=models.CharField(choices=[('unchecked', 'Unchecked'), ('ok', 'OK'), ('corrupt', 'Corrupt'), ('not_sqlite', 'Not a SQLite database'), ('skipped', 'Too large to check')], default='unchecked', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='userbackup',
+            name='integrity_detail',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('multipitch', '0013_job_queue'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userbackup',
+            name='last_sync',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
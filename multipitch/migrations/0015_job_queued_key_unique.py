@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+
+def merge_queued_duplicates(apps, schema_editor):
+    # Keep the oldest queued job of each kind and key, as enqueue() would have.
+    Job = apps.get_model('multipitch', 'Job')
+    seen = set()
+    duplicates = []
+    for pk, kind, key in Job.objects.filter(state='queued').exclude(key='').order_by('id').values_list('pk', 'kind', 'key'):
+        if (kind, key) in seen:
+            duplicates.append(pk)
+        seen.add((kind, key))
+    Job.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('multipitch', '0014_backup_last_sync_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_queued_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='job',
+            constraint=models.UniqueConstraint(condition=models.Q(('state', 'queued'), models.Q(('key', ''), _negated=True)), fields=('kind', 'key'), name='unique_queued_job_key'),
+        ),
+    ]
@@ -1,19 +1,371 @@
-from django.db import models
+import hashlib
+import io
+import uuid
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
+from multipitch.codecs import CODECS, DECODE_PIECE_SIZE, get_codec
+from multipitch.conditional import etag_matches
+from multipitch.storage import get_blob_store
 
 class UserAuth(AbstractUser):
     email = models.EmailField(unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    token_version = models.PositiveIntegerField(default=0)
     
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
 
+    def save(self, *args, **kwargs):
+        # Changing the password of an existing user through set_password()
+        # revokes tokens issued before it. Hash upgrades during
+        # check_password() do not, since they clear _password before saving.
+        if self._password is not None and not self._state.adding:
+            self.token_version += 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'password' in update_fields:
+                kwargs['update_fields'] = {*update_fields, 'token_version'}
+        super().save(*args, **kwargs)
+
 class UserBackup(models.Model):
+    """
+    Metadata of a user's current backup. The blob itself lives in the
+    configured blob store under `blob_key`, so loading this row never pulls
+    the backup through the database driver.
+    """
+    CODEC_CHOICES = [
+        ('identity', 'Uncompressed'),
+        ('gzip', 'Gzip'),
+    ]
+    INTEGRITY_CHOICES = [
+        ('unchecked', 'Unchecked'),
+        ('ok', 'OK'),
+        ('corrupt', 'Corrupt'),
+        ('not_sqlite', 'Not a SQLite database'),
+        ('skipped', 'Too large to check'),
+    ]
+
     user = models.OneToOneField(UserAuth, on_delete=models.CASCADE, related_name="data")
-    sqlite_blob = models.BinaryField()
-    last_sync= models.DateTimeField(auto_now=True)
-    
+    blob_key = models.CharField(max_length=255, blank=True)
+    codec = models.CharField(max_length=16, choices=CODEC_CHOICES, default='identity')
+    stored_size = models.BigIntegerField(default=0)
+    original_size = models.BigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)
+    version = models.PositiveIntegerField(default=1)
+    # Last SyncChange id the device had applied when it took this snapshot.
+    sync_cursor = models.BigIntegerField(null=True, blank=True)
+    integrity = models.CharField(max_length=16, choices=INTEGRITY_CHOICES, default='unchecked')
+    integrity_detail = models.CharField(max_length=255, blank=True)
+    # SHA-256 of the upload this blob is a compacted copy of.
+    compacted_from = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    # Indexed for DatabasePollingBroker, which looks up recently saved backups.
+    last_sync= models.DateTimeField(auto_now=True, db_index=True)
+
+    _pending_blob = None
+
+    @staticmethod
+    def new_blob_key(user_id):
+        return f"backups/{user_id}/{uuid.uuid4().hex}"
+
+    @property
+    def sqlite_blob(self):
+        """
+        The whole decoded backup. Convenience for small blobs, the admin and
+        tests; request paths stream through backup_service instead.
+        """
+        if self._pending_blob is not None:
+            return self._pending_blob
+        if not self.blob_key:
+            return b''
+        chunks = get_blob_store().iter_range(self.blob_key, 0, None, DECODE_PIECE_SIZE)
+        return b''.join(get_codec(self.codec).decode(chunks))
+
+    @sqlite_blob.setter
+    def sqlite_blob(self, value):
+        self._pending_blob = bytes(value)
+
+    def save(self, *args, **kwargs):
+        if self._pending_blob is None:
+            return super().save(*args, **kwargs)
+
+        store = get_blob_store()
+        old_key = self.blob_key
+        blob = self._pending_blob
+        self.blob_key = self.new_blob_key(self.user_id)
+        store.save(self.blob_key, io.BytesIO(blob))
+        self.codec = 'identity'
+        self.stored_size = self.original_size = len(blob)
+        self.sha256 = hashlib.sha256(blob).hexdigest()
+        try:
+            super().save(*args, **kwargs)
+        except BaseException:
+            store.delete(self.blob_key)
+            self.blob_key = old_key
+            raise
+        self._pending_blob = None
+        if old_key:
+            transaction.on_commit(lambda: store.delete(old_key))
+
+    @property
+    def etag(self):
+        return f'"{self.sha256}"'
+
+    def encoded_etag(self, content_encoding=None):
+        """
+        ETag of the backup as sent with `content_encoding`. Each encoding is
+        a different byte sequence, so each gets its own strong ETag.
+        """
+        if content_encoding is None:
+            return self.etag
+        return f'"{self.sha256}-{content_encoding}"'
+
+    def etag_matches(self, header, sha256=None):
+        """
+        Whether an If-Match / If-None-Match header names this backup, in any
+        encoding. `sha256` checks the ETags of other content instead.
+        """
+        sha256 = sha256 or self.sha256
+        encodings = sorted({codec.content_encoding for codec in CODECS.values() if codec.content_encoding})
+        tags = [f'"{sha256}"'] + [f'"{sha256}-{encoding}"' for encoding in encodings]
+        return any(etag_matches(header, tag) for tag in tags)
+
+    def if_match_allows(self, header):
+        """
+        Whether an If-Match header allows replacing this backup. The ETag of
+        the upload a compacted copy replaced is accepted too: the device
+        holding that upload has lost no change. Compaction still moves the
+        ETag, so If-None-Match and delta sync bring devices onto the copy.
+        """
+        if self.etag_matches(header):
+            return True
+        return bool(self.compacted_from) and self.etag_matches(header, self.compacted_from)
+
     def __str__(self):
         return f"Backup for {self.user.username} at {self.last_sync}"
-    
\ No newline at end of file
+
+
+class BackupUploadSession(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(UserAuth, on_delete=models.CASCADE, related_name="upload_sessions")
+    chunk_size = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Upload session {self.id} for {self.user.username}"
+
+
+class BackupVersion(models.Model):
+    """
+    A previous backup of a user. Versions are stored as page-level deltas
+    against the next newer version (or the current backup), which restores
+    them, unless the delta would not be smaller than the version itself.
+    """
+    user = models.ForeignKey(UserAuth, on_delete=models.CASCADE, related_name="backup_versions")
+    number = models.PositiveIntegerField()
+    blob_key = models.CharField(max_length=255)
+    codec = models.CharField(max_length=16, choices=UserBackup.CODEC_CHOICES, default='identity')
+    is_delta = models.BooleanField(default=False)
+    page_size = models.PositiveIntegerField()
+    stored_size = models.BigIntegerField()
+    original_size = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-number']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'number'], name='unique_backup_version'),
+        ]
+
+    def __str__(self):
+        return f"Backup version {self.number} for {self.user.username}"
+
+
+class BackupIndex(models.Model):
+    """
+    Which backup of a user the Indexed* tables were last built from, so
+    dashboards can query its contents without downloading it.
+    """
+    user = models.OneToOneField(UserAuth, on_delete=models.CASCADE, related_name="backup_index")
+    sha256 = models.CharField(max_length=64, blank=True)
+    version = models.PositiveIntegerField(default=0)
+    indexed_at = models.DateTimeField(null=True, blank=True)
+    error = models.CharField(max_length=255, blank=True)
+
+    def __str__(self):
+        return f"Index of backup {self.version} for {self.user.username}"
+
+
+class IndexedRow(models.Model):
+    """
+    A row copied out of a user's device database. `source_id` is its id on
+    the device and `row_hash` a digest of the copied columns, so reindexing
+    only writes rows that changed.
+    """
+    user = models.ForeignKey(UserAuth, on_delete=models.CASCADE, related_name="+")
+    source_id = models.BigIntegerField()
+    row_hash = models.CharField(max_length=40)
+
+    class Meta:
+        abstract = True
+
+
+class IndexedRoute(IndexedRow):
+    name = models.CharField(max_length=255, blank=True)
+    crag = models.CharField(max_length=255, blank=True)
+    country = models.CharField(max_length=64, blank=True)
+    grade = models.CharField(max_length=16, blank=True)
+    length_m = models.IntegerField(null=True)
+    latitude = models.FloatField(null=True)
+    longitude = models.FloatField(null=True)
+    description = models.TextField(blank=True)
+    updated_at = models.DateTimeField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'source_id'], name='unique_indexed_route'),
+        ]
+
+
+class IndexedPitch(IndexedRow):
+    route_id = models.BigIntegerField(null=True)
+    number = models.IntegerField(null=True)
+    grade = models.CharField(max_length=16, blank=True)
+    length_m = models.IntegerField(null=True)
+    protection = models.TextField(blank=True)
+    belay = models.TextField(blank=True)
+    notes = models.TextField(blank=True)
+    updated_at = models.DateTimeField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'source_id'], name='unique_indexed_pitch'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'route_id', 'number'], name='indexed_pitch_route'),
+        ]
+
+
+class IndexedClimb(IndexedRow):
+    route_id = models.BigIntegerField(null=True)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+    partner = models.CharField(max_length=255, blank=True)
+    style = models.CharField(max_length=32, blank=True)
+    status = models.CharField(max_length=32, blank=True)
+    notes = models.TextField(blank=True)
+    updated_at = models.DateTimeField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'source_id'], name='unique_indexed_climb'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-started_at'], name='indexed_climb_recent'),
+        ]
+
+
+class IndexedLog(IndexedRow):
+    climb_id = models.BigIntegerField(null=True)
+    pitch_id = models.BigIntegerField(null=True)
+    recorded_at = models.DateTimeField(null=True)
+    event = models.CharField(max_length=32, blank=True)
+    duration_s = models.IntegerField(null=True)
+    latitude = models.FloatField(null=True)
+    longitude = models.FloatField(null=True)
+    altitude_m = models.FloatField(null=True)
+    note = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'source_id'], name='unique_indexed_log'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'climb_id', 'recorded_at'], name='indexed_log_climb'),
+        ]
+
+
+class SyncChange(models.Model):
+    """
+    One row change pushed by a device. The log is append-only; its ids are
+    the cursors devices pull from. For each (table, row_id) the change with
+    the highest id is the row's current state, since only changes that win
+    last-writer-wins on (timestamp, device) are appended.
+    """
+    user = models.ForeignKey(UserAuth, on_delete=models.CASCADE, related_name="sync_changes")
+    table = models.CharField(max_length=64)
+    row_id = models.CharField(max_length=64)
+    deleted = models.BooleanField(default=False)
+    data = models.JSONField(null=True, blank=True)
+    timestamp = models.BigIntegerField()
+    device = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'], name='sync_change_cursor'),
+            models.Index(fields=['user', 'table', 'row_id', '-id'], name='sync_change_row'),
+        ]
+
+    def __str__(self):
+        return f"Change {self.id} to {self.table} {self.row_id} for {self.user.username}"
+
+
+class SyncState(models.Model):
+    """
+    Per-user sync bookkeeping. Pushes lock this row, so they are applied
+    one at a time. Cursors below `pruned_through` may have missed
+    deletions that compaction removed.
+    """
+    user = models.OneToOneField(UserAuth, on_delete=models.CASCADE, related_name="sync_state")
+    pruned_through = models.BigIntegerField(default=0)
+    compacted_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Sync state for {self.user.username}"
+
+
+class Job(models.Model):
+    """
+    A unit of background work for `manage.py run_jobs`. A worker claims a
+    job by moving it to 'running' with `locked_until` set; a job still
+    running past that time is taken to have lost its worker and is claimed
+    again. Failed attempts are retried after `run_after` until `attempts`
+    reaches the kind's limit.
+    """
+    STATE_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=64)
+    # Queued jobs of a kind with the same key are merged; blank never merges.
+    key = models.CharField(max_length=255, blank=True)
+    payload = models.JSONField(default=dict, blank=True)
+    state = models.CharField(max_length=16, choices=STATE_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    worker = models.CharField(max_length=255, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['state', 'run_after'], name='job_ready'),
+            models.Index(fields=['kind', 'key', 'state'], name='job_key'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['kind', 'key'], condition=models.Q(state='queued') & ~models.Q(key=''), name='unique_queued_job_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} job {self.id} ({self.state})"
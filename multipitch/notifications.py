@@ -0,0 +1,195 @@
+"""
+Backup change notifications for the long-poll / SSE endpoint.
+
+Waiting requests subscribe to a user on the process-wide Hub, which wakes
+them by setting an asyncio.Event on their own event loop; an idle
+subscriber is a suspended coroutine and a set entry, with no thread.
+Brokers carry "user X's backup changed" between processes; a wake-up only
+tells the subscriber to look at the database again, so duplicate or
+spurious wake-ups are harmless.
+"""
+import asyncio
+import logging
+import threading
+from collections import Counter
+from datetime import timedelta
+from functools import lru_cache
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """A subscriber's wake-up flag. Use as a context manager to unsubscribe."""
+
+    def __init__(self, hub, user_id, loop):
+        self.hub = hub
+        self.user_id = user_id
+        self.loop = loop
+        self.event = asyncio.Event()
+
+    async def wait(self, timeout):
+        """Wait up to `timeout` seconds for a change; True if one came."""
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self.event.clear()
+        return True
+
+    def close(self):
+        self.hub._unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Hub:
+    """
+    In-process fan-out of backup changes to subscribers, which may live on
+    any number of event loops. publish() is thread-safe, so it can be
+    called from sync code such as post_save handlers.
+    """
+
+    def __init__(self, broker):
+        self.broker = broker
+        self._subscriptions = {}
+        self._loop_counts = Counter()
+        self._listeners = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        """Subscribe to changes of `user_id`'s backup; call from a coroutine."""
+        loop = asyncio.get_running_loop()
+        subscription = Subscription(self, user_id, loop)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+            self._loop_counts[loop] += 1
+            listener = self._listeners.get(loop)
+            if listener is None or listener.done():
+                listener = self._listeners[loop] = loop.create_task(self.broker.listen(self, loop))
+                listener.add_done_callback(lambda task: self._listener_done(loop, task))
+        return subscription
+
+    def _listener_done(self, loop, task):
+        with self._lock:
+            if self._listeners.get(loop) is task:
+                del self._listeners[loop]
+
+    def _unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is None or subscription not in subscriptions:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.user_id]
+            self._loop_counts[subscription.loop] -= 1
+            if not self._loop_counts[subscription.loop]:
+                del self._loop_counts[subscription.loop]
+
+    def has_subscribers(self, loop):
+        """Whether any subscriber waits on `loop`."""
+        with self._lock:
+            return loop in self._loop_counts
+
+    def subscribed_users(self):
+        with self._lock:
+            return set(self._subscriptions)
+
+    def deliver(self, user_id):
+        """Wake this process's subscribers of `user_id`."""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.event.set)
+            except RuntimeError:
+                # The subscriber's loop is closed; it is gone too.
+                self._unsubscribe(subscription)
+
+    def publish(self, user_id):
+        """Announce that `user_id`'s backup changed, to every process."""
+        self.broker.publish(self, user_id)
+
+
+class Broker:
+    """
+    Interface for carrying changes between processes. publish() is called
+    in the process where the backup changed; listen() runs on each event
+    loop with subscribers and hands changes made elsewhere to
+    hub.deliver(). It should return once the loop has no subscribers left.
+    """
+
+    def publish(self, hub, user_id):
+        raise NotImplementedError
+
+    async def listen(self, hub, loop):
+        raise NotImplementedError
+
+
+class LocalBroker(Broker):
+    """Delivers within the process only; enough for a single server process."""
+
+    def publish(self, hub, user_id):
+        hub.deliver(user_id)
+
+    async def listen(self, hub, loop):
+        return
+
+
+class DatabasePollingBroker(LocalBroker):
+    """
+    Delivers within the process immediately, and picks up backups saved by
+    other processes by querying, every `interval` seconds, for backups
+    whose last_sync moved. There is one query per event loop and interval
+    however many requests are waiting, and none while nobody waits.
+    Clocks of the writing processes may be up to `interval` apart.
+    """
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+
+    async def listen(self, hub, loop):
+        from multipitch.models import UserBackup
+
+        since = timezone.now() - timedelta(seconds=self.interval)
+        seen = {}
+        while hub.has_subscribers(loop):
+            await asyncio.sleep(self.interval)
+            now = timezone.now()
+            changed = UserBackup.objects.filter(last_sync__gte=since).values_list('user_id', 'last_sync')
+            try:
+                recent = {user_id: last_sync async for user_id, last_sync in changed}
+            except Exception:
+                logger.exception("Polling for backup changes failed")
+                continue
+            subscribed = hub.subscribed_users()
+            for user_id, last_sync in recent.items():
+                if seen.get(user_id) != last_sync and user_id in subscribed:
+                    hub.deliver(user_id)
+            # Changes are looked for an interval back, to absorb clock skew
+            # and commits that land after the query; `seen` drops repeats.
+            since, seen = now - timedelta(seconds=self.interval), recent
+
+
+@lru_cache(maxsize=None)
+def get_hub():
+    """Return the process's Hub, using the broker in BACKUP_CHANGE_BROKER."""
+    config = settings.BACKUP_CHANGE_BROKER
+    broker = import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+    return Hub(broker)
+
+
+def _reset_hub(setting, **kwargs):
+    if setting == 'BACKUP_CHANGE_BROKER':
+        get_hub.cache_clear()
+
+
+setting_changed.connect(_reset_hub)
@@ -0,0 +1,15 @@
+from rest_framework.pagination import CursorPagination
+
+
+class IndexCursorPagination(CursorPagination):
+    """
+    Cursor pagination for the backup index endpoints, so deep pages cost
+    the same as the first. Views order by their `cursor_ordering`.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = 'source_id'
+
+    def get_ordering(self, request, queryset, view):
+        return getattr(view, 'cursor_ordering', self.ordering)
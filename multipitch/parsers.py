@@ -0,0 +1,245 @@
+import binascii
+import json
+import re
+import tempfile
+from django.conf import settings
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.parsers import BaseParser
+
+
+class OctetStreamParser(BaseParser):
+    """
+    Copies a raw request body into a temporary file in fixed-size chunks,
+    so an upload is never held in memory as a whole.
+    Returns the open temporary file, rewound to the start.
+    """
+    media_type = 'application/octet-stream'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        upload = tempfile.TemporaryFile()
+        chunk_size = settings.BACKUP_UPLOAD_CHUNK_SIZE
+        while chunk := stream.read(chunk_size):
+            upload.write(chunk)
+        upload.seek(0)
+        return upload
+
+
+class SQLiteParser(OctetStreamParser):
+    media_type = 'application/x-sqlite3'
+
+
+class _JSONSyntaxError(Exception):
+    pass
+
+
+class _Base64Writer:
+    """
+    Decodes Base64 text fed in arbitrary pieces into `target`, four
+    characters at a time. Like base64.b64decode, characters outside the
+    alphabet are ignored and decoding stops after the first padded quad.
+    Invalid input sets `failed` and the rest is ignored.
+    """
+    NON_ALPHABET = re.compile(rb'[^A-Za-z0-9+/=]')
+
+    def __init__(self, target):
+        self.target = target
+        self.pending = b''
+        self.finished = False
+        self.failed = False
+
+    def write(self, text):
+        if self.finished or self.failed:
+            return
+        data = self.pending + self.NON_ALPHABET.sub(b'', text)
+        padding = data.find(b'=')
+        if padding != -1:
+            end = padding - padding % 4 + 4
+            if len(data) < end:
+                self.pending = data
+                return
+            data = data[:end]
+            self.finished = True
+        usable = len(data) - len(data) % 4
+        self._decode(data[:usable])
+        self.pending = data[usable:]
+
+    def close(self):
+        if self.pending and not self.failed:
+            self._decode(self.pending)
+        self.pending = b''
+
+    def _decode(self, data):
+        try:
+            self.target.write(binascii.a2b_base64(data))
+        except binascii.Error:
+            self.failed = True
+
+
+class _JSONReader:
+    """Just enough of a pull-based JSON reader to walk one object from a stream."""
+    WHITESPACE = b' \t\r\n'
+    STRING_SPECIAL = re.compile(rb'["\\]')
+    LITERAL_CHARS = frozenset(bytes([c]) for c in b'+-.0123456789Eaeflnrstu')
+
+    def __init__(self, stream, chunk_size):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buffer = b''
+        self.pos = 0
+
+    def _fill(self, size=1):
+        """Make at least `size` unread bytes available; False at end of stream."""
+        while len(self.buffer) - self.pos < size:
+            chunk = self.stream.read(self.chunk_size)
+            if not chunk:
+                return False
+            self.buffer = self.buffer[self.pos:] + chunk
+            self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            if not self._fill():
+                return b''
+            char = self.buffer[self.pos:self.pos + 1]
+            if char not in self.WHITESPACE:
+                return char
+            self.pos += 1
+
+    def consume(self, char):
+        if self.peek() == char:
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, char):
+        if not self.consume(char):
+            found = self.peek()
+            raise _JSONSyntaxError(f"expected {char.decode()!r}, found {found.decode(errors='replace')!r}"
+                                   if found else f"expected {char.decode()!r}, found end of data")
+
+    def expect_end(self):
+        if self.peek():
+            raise _JSONSyntaxError("extra data after the object")
+
+    def read_string(self, write):
+        """Read a string's content and pass its unescaped bytes to `write`, piece by piece."""
+        self.expect(b'"')
+        while True:
+            if not self._fill():
+                raise _JSONSyntaxError("unterminated string")
+            match = self.STRING_SPECIAL.search(self.buffer, self.pos)
+            if match is None:
+                write(self.buffer[self.pos:])
+                self.pos = len(self.buffer)
+                continue
+            write(self.buffer[self.pos:match.start()])
+            self.pos = match.end()
+            if match.group() == b'"':
+                return
+            if not self._fill(1):
+                raise _JSONSyntaxError("unterminated string")
+            size = 5 if self.buffer[self.pos:self.pos + 1] == b'u' else 1
+            if not self._fill(size):
+                raise _JSONSyntaxError("unterminated string")
+            escape = b'\\' + self.buffer[self.pos:self.pos + size]
+            self.pos += size
+            try:
+                write(json.loads(b'"' + escape + b'"').encode('utf-8', 'surrogatepass'))
+            except ValueError:
+                raise _JSONSyntaxError(f"invalid escape {escape.decode(errors='replace')!r}")
+
+    def read_key(self):
+        pieces = []
+        self.read_string(pieces.append)
+        return b''.join(pieces).decode('utf-8', errors='replace')
+
+    def skip_value(self):
+        """Skip any value; returns its kind ('string', 'object', 'array' or the literal)."""
+        char = self.peek()
+        if char == b'"':
+            self.read_string(lambda piece: None)
+            return 'string'
+        if char in (b'{', b'['):
+            close = b'}' if char == b'{' else b']'
+            self.pos += 1
+            if not self.consume(close):
+                while True:
+                    if char == b'{':
+                        self.read_key()
+                        self.expect(b':')
+                    self.skip_value()
+                    if self.consume(close):
+                        break
+                    self.expect(b',')
+            return 'object' if char == b'{' else 'array'
+
+        literal = bytearray()
+        while self._fill() and self.buffer[self.pos:self.pos + 1] in self.LITERAL_CHARS:
+            literal += self.buffer[self.pos:self.pos + 1]
+            self.pos += 1
+        try:
+            value = json.loads(literal)
+        except ValueError:
+            raise _JSONSyntaxError(f"invalid value {bytes(literal[:20]).decode(errors='replace')!r}")
+        return 'null' if value is None else type(value).__name__
+
+
+class Base64JSONParser(BaseParser):
+    """
+    Parses the legacy {"sqlite_blob": "<base64>"} upload body without
+    holding it in memory: the Base64 string is decoded piece by piece into
+    a temporary file as the body is read. Other members are skipped.
+    Returns the open temporary file, rewound to the start; field errors
+    are raised as a ValidationError shaped like UserBackupSerializer's.
+    """
+    media_type = 'application/json'
+    field = 'sqlite_blob'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        reader = _JSONReader(stream, settings.BACKUP_UPLOAD_CHUNK_SIZE)
+        upload = None
+        error = None
+        try:
+            reader.expect(b'{')
+            if not reader.consume(b'}'):
+                while True:
+                    key = reader.read_key()
+                    reader.expect(b':')
+                    if key == self.field:
+                        # As with json.loads, the last duplicate key wins.
+                        if upload is not None:
+                            upload.close()
+                            upload = None
+                        error = None
+                        if reader.peek() == b'"':
+                            upload = tempfile.TemporaryFile()
+                            decoder = _Base64Writer(upload)
+                            reader.read_string(decoder.write)
+                            decoder.close()
+                            if decoder.failed:
+                                error = "Invalid Base64 data."
+                        else:
+                            kind = reader.skip_value()
+                            error = "This field may not be null." if kind == 'null' else "Not a valid string."
+                    else:
+                        reader.skip_value()
+                    if reader.consume(b'}'):
+                        break
+                    reader.expect(b',')
+            reader.expect_end()
+        except BaseException as exc:
+            if upload is not None:
+                upload.close()
+            if isinstance(exc, _JSONSyntaxError):
+                raise ParseError(f"JSON parse error - {exc}")
+            raise
+
+        if error is None and upload is None:
+            error = "This field is required."
+        if error is not None:
+            if upload is not None:
+                upload.close()
+            raise ValidationError({self.field: [error]})
+        upload.seek(0)
+        return upload
@@ -0,0 +1,143 @@
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from pathlib import Path
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+STATS_LIMIT = 50
+
+# Only one profiler can be active per process (Python 3.12+ refuses a
+# second), so overlapping requests are served unprofiled.
+_profiling = threading.Lock()
+
+
+def profile_dir():
+    return Path(settings.PROFILER['DIR'])
+
+
+class SQLRecorder:
+    """
+    execute_wrapper collecting every statement with its duration. Parameters
+    are left out: they hold password hashes, tokens and email addresses.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': context['connection'].alias,
+                'sql': sql,
+                'many': many,
+                'seconds': time.perf_counter() - started,
+            })
+
+
+def profile_request(request, get_response):
+    """
+    Run get_response(request) under cProfile and SQL capture, and save the
+    result. While another request is being profiled, or another profiling
+    tool is active, the request is served unprofiled.
+    """
+    if not _profiling.acquire(blocking=False):
+        return get_response(request)
+    try:
+        recorder = SQLRecorder()
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            return get_response(request)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(recorder))
+                response = get_response(request)
+        finally:
+            profiler.disable()
+        duration = time.perf_counter() - started
+    finally:
+        _profiling.release()
+
+    match = request.resolver_match
+    user = getattr(request, 'user', None)
+    save_profile(profiler, {
+        'method': request.method,
+        'path': request.path,
+        'view': match.url_name if match is not None else None,
+        'status': response.status_code,
+        'user_id': user.pk if user is not None and user.is_authenticated else None,
+        'seconds': duration,
+        'created_at': timezone.now().isoformat(),
+        'queries': recorder.queries,
+    })
+    return response
+
+
+def save_profile(profiler, summary):
+    """
+    Write `<id>.prof` (pstats format, for snakeviz and friends) and
+    `<id>.json` (request summary, SQL and top functions), then drop the
+    oldest profiles beyond PROFILER['MAX_PROFILES'].
+    """
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    # Sortable by creation time, so the newest profiles are kept.
+    profile_id = f"{timezone.now():%Y%m%d-%H%M%S-%f}-{uuid.uuid4().hex[:6]}"
+    profiler.dump_stats(directory / f"{profile_id}.prof")
+
+    stats = pstats.Stats(profiler).sort_stats('cumulative')
+    summary = {'id': profile_id, **summary, 'functions': top_functions(stats, STATS_LIMIT)}
+    (directory / f"{profile_id}.json").write_text(json.dumps(summary, indent=1))
+    prune_profiles(settings.PROFILER['MAX_PROFILES'])
+    return profile_id
+
+
+def top_functions(stats, limit):
+    rows = []
+    for (filename, line, name), (calls, primitive, own, cumulative, _) in stats.stats.items():
+        rows.append({
+            'function': f"{filename}:{line}({name})",
+            'calls': calls,
+            'own_seconds': own,
+            'cumulative_seconds': cumulative,
+        })
+    rows.sort(key=lambda row: row['cumulative_seconds'], reverse=True)
+    return rows[:limit]
+
+
+def list_profiles():
+    """Summaries of stored profiles, newest first."""
+    summaries = []
+    for path in sorted(profile_dir().glob('*.json'), reverse=True):
+        try:
+            summaries.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+    return summaries
+
+
+def load_profile(profile_id):
+    """Return (summary, pstats.Stats). Raises FileNotFoundError."""
+    directory = profile_dir()
+    summary = json.loads((directory / f"{Path(profile_id).name}.json").read_text())
+    stats = pstats.Stats(str(directory / f"{Path(profile_id).name}.prof"), stream=io.StringIO())
+    return summary, stats
+
+
+def prune_profiles(keep):
+    for path in sorted(profile_dir().glob('*.json'), reverse=True)[keep:]:
+        path.unlink(missing_ok=True)
+        path.with_suffix('.prof').unlink(missing_ok=True)
@@ -2,10 +2,11 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from django.contrib.auth.hashers import check_password
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
 
+from multipitch.hashing import check_user_password, set_user_password
 from multipitch.models import UserAuth
+from multipitch.tokens import VersionedRefreshToken
 
 User = get_user_model()
 
@@ -26,28 +27,36 @@ class SignupSerializer(serializers.ModelSerializer):
             username=validated_data['username'],
             email=validated_data.get('email')
         )
-        user.set_password(validated_data['password'])
+        set_user_password(user, validated_data['password'])
         user.save()
         return user
 
     def to_representation(self, instance):
         """Return user data + tokens in desired format."""
-        refresh = RefreshToken.for_user(instance)
-        return {
-            "user": {
-                "id": instance.id,
-                "username": instance.username,
-                "email": instance.email,
-            },
-            "access": str(refresh.access_token),
-            "refresh": str(refresh)
-        }
-
-
-class LoginSerializer(serializers.Serializer):
+        return user_with_tokens(instance)
+
+
+def user_with_tokens(user):
+    """User data plus a new token pair, as returned by signup and login."""
+    refresh = VersionedRefreshToken.for_user(user)
+    return {
+        "user": {
+            "id": user.id,
+            "username": user.username,
+            "email": user.email,
+        },
+        "access": str(refresh.access_token),
+        "refresh": str(refresh),
+    }
+
+
+class CredentialsSerializer(serializers.Serializer):
     email = serializers.EmailField()
     password = serializers.CharField(write_only=True)
 
+
+class LoginSerializer(CredentialsSerializer):
+
     def validate(self, attrs):
         email = attrs.get('email')
         password = attrs.get('password')
@@ -60,20 +69,10 @@ class LoginSerializer(serializers.Serializer):
         except UserAuth.DoesNotExist:
             raise serializers.ValidationError("Invalid email or password.")
 
-        if not user.check_password(password):
+        if not check_user_password(user, password):
             raise serializers.ValidationError("Invalid email or password.")
 
-        refresh = RefreshToken.for_user(user)
-
-        return {
-            "user": {
-                "id": user.id,
-                "username": user.username,
-                "email": user.email,
-            },
-            "access": str(refresh.access_token),
-            "refresh": str(refresh),
-        }
+        return user_with_tokens(user)
 
         
 class MeSerializer(serializers.ModelSerializer):
@@ -1,6 +1,9 @@
 import base64
+import math
+from django.conf import settings
 from rest_framework import serializers
-from multipitch.models import UserBackup
+from multipitch.models import BackupVersion, UserBackup
+from multipitch.services.backup_service import read_backup
 
 class UserBackupSerializer(serializers.ModelSerializer):
     sqlite_blob = serializers.CharField()
@@ -19,8 +22,66 @@ class UserBackupSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Invalid Base64 data.")
 
     def to_representation(self, instance):
-        data = super().to_representation(instance)
-        data['sqlite_blob'] = base64.b64encode(instance.sqlite_blob).decode('utf-8')
-        data['last_sync'] = instance.last_sync.isoformat() if instance.last_sync else None
+        # Built by hand so a backup loaded without its blob column is not
+        # fetched whole by the default field access.
+        return {
+            'sqlite_blob': base64.b64encode(read_backup(instance)).decode('utf-8'),
+            'last_sync': instance.last_sync.isoformat() if instance.last_sync else None,
+        }
+
+
+SHA256_PATTERN = r'^[0-9a-fA-F]{64}$'
+
+
+class UploadSessionCommitSerializer(serializers.Serializer):
+    chunk_count = serializers.IntegerField(min_value=1)
+    sha256 = serializers.RegexField(SHA256_PATTERN)
+
+
+MIN_PAGE_SIZE = 512
+
+
+def max_pages(page_size=MIN_PAGE_SIZE):
+    """Pages of `page_size` bytes a backup of at most BACKUP_MAX_SIZE can have."""
+    return math.ceil(settings.BACKUP_MAX_SIZE / page_size)
+
+
+class DeltaCompareSerializer(serializers.Serializer):
+    page_size = serializers.IntegerField(min_value=MIN_PAGE_SIZE, max_value=65536)
+    hashes = serializers.ListField(child=serializers.RegexField(SHA256_PATTERN), allow_empty=True)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        # Bounded here rather than on the class, so it follows BACKUP_MAX_SIZE.
+        fields['hashes'] = serializers.ListField(
+            child=serializers.RegexField(SHA256_PATTERN), allow_empty=True, max_length=max_pages()
+        )
+        return fields
+
+    def validate(self, data):
+        if len(data['hashes']) > max_pages(data['page_size']):
+            raise serializers.ValidationError(
+                {'hashes': [f"A backup has at most {max_pages(data['page_size'])} pages of this size."]}
+            )
         return data
 
+
+class DeltaPagesSerializer(serializers.Serializer):
+    base = serializers.RegexField(SHA256_PATTERN)
+    pages = serializers.ListField(child=serializers.IntegerField(min_value=0))
+
+
+class DeltaApplySerializer(serializers.Serializer):
+    base = serializers.RegexField(SHA256_PATTERN, required=False, default='')
+    page_size = serializers.IntegerField(min_value=MIN_PAGE_SIZE, max_value=65536)
+    size = serializers.IntegerField(min_value=1)
+    sha256 = serializers.RegexField(SHA256_PATTERN)
+
+
+class BackupVersionSerializer(serializers.ModelSerializer):
+    version = serializers.IntegerField(source='number')
+    size = serializers.IntegerField(source='original_size')
+
+    class Meta:
+        model = BackupVersion
+        fields = ['version', 'size', 'stored_size', 'is_delta', 'sha256', 'created_at']
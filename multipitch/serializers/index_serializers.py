@@ -0,0 +1,45 @@
+from rest_framework import serializers
+from multipitch.models import BackupIndex, IndexedClimb, IndexedLog, IndexedPitch, IndexedRoute
+
+
+class IndexedRowSerializer(serializers.ModelSerializer):
+    """Indexed rows are identified by their id on the device."""
+    id = serializers.IntegerField(source='source_id')
+
+
+class IndexedRouteSerializer(IndexedRowSerializer):
+    class Meta:
+        model = IndexedRoute
+        fields = [
+            'id', 'name', 'crag', 'country', 'grade', 'length_m',
+            'latitude', 'longitude', 'description', 'updated_at',
+        ]
+
+
+class IndexedPitchSerializer(IndexedRowSerializer):
+    class Meta:
+        model = IndexedPitch
+        fields = ['id', 'route_id', 'number', 'grade', 'length_m', 'protection', 'belay', 'notes', 'updated_at']
+
+
+class IndexedClimbSerializer(IndexedRowSerializer):
+    class Meta:
+        model = IndexedClimb
+        fields = [
+            'id', 'route_id', 'started_at', 'finished_at', 'partner', 'style', 'status', 'notes', 'updated_at',
+        ]
+
+
+class IndexedLogSerializer(IndexedRowSerializer):
+    class Meta:
+        model = IndexedLog
+        fields = [
+            'id', 'climb_id', 'pitch_id', 'recorded_at', 'event', 'duration_s',
+            'latitude', 'longitude', 'altitude_m', 'note',
+        ]
+
+
+class BackupIndexSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BackupIndex
+        fields = ['version', 'sha256', 'indexed_at', 'error']
@@ -0,0 +1,56 @@
+from django.conf import settings
+from rest_framework import serializers
+from multipitch.services.sync_service import too_far_ahead
+
+
+class RowChangeSerializer(serializers.Serializer):
+    table = serializers.CharField(max_length=64)
+    id = serializers.CharField(max_length=64)
+    op = serializers.ChoiceField(choices=['upsert', 'delete'])
+    data = serializers.DictField(required=False)
+    timestamp = serializers.IntegerField(min_value=0)
+
+    def validate_table(self, value):
+        if value not in settings.SYNC_TABLES:
+            raise serializers.ValidationError("Table is not synced.")
+        return value
+
+    def validate_timestamp(self, value):
+        if too_far_ahead(value):
+            raise serializers.ValidationError("Timestamp is ahead of the server clock.")
+        return value
+
+    def validate(self, attrs):
+        attrs['deleted'] = attrs.pop('op') == 'delete'
+        if attrs['deleted']:
+            attrs['data'] = None
+            return attrs
+        if 'data' not in attrs:
+            raise serializers.ValidationError({"data": ["Required for upserts."]})
+        primary_key = settings.SYNC_TABLES[attrs['table']]
+        if str(attrs['data'].get(primary_key, attrs['id'])) != attrs['id']:
+            raise serializers.ValidationError({"data": [f"'{primary_key}' does not match 'id'."]})
+        return attrs
+
+
+class SyncPushSerializer(serializers.Serializer):
+    device = serializers.CharField(max_length=64)
+    changes = RowChangeSerializer(many=True, allow_empty=False, max_length=settings.SYNC_MAX_CHANGES)
+
+
+class SyncPullSerializer(serializers.Serializer):
+    cursor = serializers.IntegerField(min_value=0, default=0)
+    limit = serializers.IntegerField(min_value=1, max_value=settings.SYNC_MAX_CHANGES, required=False)
+    device = serializers.CharField(max_length=64, required=False)
+
+
+def change_data(change):
+    return {
+        "cursor": change.id,
+        "table": change.table,
+        "id": change.row_id,
+        "op": "delete" if change.deleted else "upsert",
+        "data": change.data,
+        "timestamp": change.timestamp,
+        "device": change.device,
+    }
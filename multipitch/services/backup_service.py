@@ -0,0 +1,310 @@
+import hashlib
+import tempfile
+from collections import namedtuple
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import transaction
+from multipitch import delta
+from multipitch.codecs import IDENTITY, get_codec
+from multipitch.models import BackupVersion, UserBackup
+from multipitch.storage import get_blob_store
+
+
+def _read_chunks(upload):
+    chunk_size = settings.BACKUP_UPLOAD_CHUNK_SIZE
+    while chunk := upload.read(chunk_size):
+        yield chunk
+
+
+class PreconditionFailed(Exception):
+    """The stored backup does not match the client's If-Match header."""
+
+
+EncodedBlob = namedtuple('EncodedBlob', 'file codec stored_size original_size sha256')
+
+
+@contextmanager
+def _encoded(upload):
+    """
+    Hash and encode a readable, seekable file with BACKUP_STORAGE_CODEC in a
+    single streaming pass. Yields an EncodedBlob whose file is the encoded
+    copy, or the upload itself when encoding does not make it smaller.
+    """
+    codec = get_codec(settings.BACKUP_STORAGE_CODEC)
+    digest = hashlib.sha256()
+    original_size = 0
+
+    def counted(chunks):
+        nonlocal original_size
+        for chunk in chunks:
+            original_size += len(chunk)
+            digest.update(chunk)
+            yield chunk
+
+    upload.seek(0)
+    with tempfile.TemporaryFile() as encoded:
+        for data in codec.encode(counted(_read_chunks(upload))):
+            encoded.write(data)
+
+        if codec.name == IDENTITY or encoded.tell() >= original_size:
+            yield EncodedBlob(upload, IDENTITY, original_size, original_size, digest.hexdigest())
+        else:
+            yield EncodedBlob(encoded, codec.name, encoded.tell(), original_size, digest.hexdigest())
+
+
+def _store(blob, key):
+    blob.file.seek(0)
+    get_blob_store().save(key, blob.file)
+    return key
+
+
+def backup_page_size(backup):
+    header = next(iter_backup(backup, 0, min(backup.original_size, 100) - 1), b'')
+    return delta.read_page_size(header)
+
+
+def _archive(current, upload, written):
+    """
+    Prepare the BackupVersion that keeps `current` once it is replaced by
+    `upload`. The version is stored as the pages that differ from `upload`;
+    when that is not smaller than the current blob, the version takes over
+    the current blob instead. Keys written are appended to `written`.
+    Returns the BackupVersion field values to insert.
+    """
+    page_size = backup_page_size(current)
+    upload.seek(0)
+    with tempfile.TemporaryFile() as frames:
+        for frame in delta.diff_pages(iter_backup(current), _read_chunks(upload), page_size):
+            frames.write(frame)
+
+        with _encoded(frames) as blob:
+            is_delta = blob.stored_size < current.stored_size
+            if is_delta:
+                blob_key = _store(blob, UserBackup.new_blob_key(current.user_id))
+                written.append(blob_key)
+                codec, stored_size = blob.codec, blob.stored_size
+            else:
+                blob_key, codec, stored_size = current.blob_key, current.codec, current.stored_size
+
+    return {
+        'user_id': current.user_id,
+        'number': current.version,
+        'blob_key': blob_key,
+        'codec': codec,
+        'is_delta': is_delta,
+        'page_size': page_size,
+        'stored_size': stored_size,
+        'original_size': current.original_size,
+        'sha256': current.sha256,
+        'created_at': current.last_sync,
+    }
+
+
+def _prune_versions(user):
+    """Delete versions beyond BACKUP_VERSION_RETENTION; blobs go with them on commit."""
+    stale = (
+        BackupVersion.objects.filter(user=user)
+        .order_by('-number')
+        .values_list('pk', flat=True)[settings.BACKUP_VERSION_RETENTION:]
+    )
+    BackupVersion.objects.filter(pk__in=list(stale)).delete()
+
+
+# Times save_backup prepares blobs outside the row lock before it gives up
+# on the backup holding still and prepares them under the lock.
+SAVE_ATTEMPTS = 3
+
+Prepared = namedtuple('Prepared', 'blob_key version')
+
+
+class _Replaced(Exception):
+    """The backup changed while the blobs replacing it were being stored."""
+
+
+def _same_backup(snapshot, current):
+    if snapshot is None or current is None:
+        return snapshot is None and current is None
+    return (snapshot.blob_key, snapshot.sha256, snapshot.version) == (current.blob_key, current.sha256, current.version)
+
+
+def _unchanged(backup, blob):
+    return backup is not None and blob.sha256 in (backup.sha256, backup.compacted_from)
+
+
+def _prepare(user, current, blob, upload, written):
+    """Store the new blob and the version archiving `current`. Returns Prepared."""
+    blob_key = _store(blob, UserBackup.new_blob_key(user.pk))
+    written.append(blob_key)
+    version = None
+    if current is not None and current.blob_key and settings.BACKUP_VERSION_RETENTION > 0:
+        version = _archive(current, upload, written)
+    return Prepared(blob_key, version)
+
+
+def save_backup(user, upload, if_match=None, sync_cursor=None):
+    """
+    Save or replace the user's backup from a readable, seekable file object.
+    The upload is hashed and encoded in a single streaming pass, and the
+    replaced backup is kept as a version, subject to BACKUP_VERSION_RETENTION.
+    An upload identical to the stored backup is not written.
+    `sync_cursor` is the last sync change the snapshot includes.
+    The blobs are stored, and the version diffed, before the backup row is
+    locked; if the backup changed meanwhile they are discarded and prepared
+    again, as in maintenance_service._swap_in. The lock is then held only to
+    write the rows.
+    Raises PreconditionFailed when `if_match` does not match the stored ETag.
+    Returns (backup, created, changed).
+    """
+    with _encoded(upload) as blob:
+        for _ in range(SAVE_ATTEMPTS - 1):
+            result = _attempt_save(user, blob, upload, if_match, sync_cursor, prepare_early=True)
+            if result is not None:
+                return result
+        return _attempt_save(user, blob, upload, if_match, sync_cursor, prepare_early=False)
+
+
+def _attempt_save(user, blob, upload, if_match, sync_cursor, prepare_early):
+    """
+    One try of save_backup. With `prepare_early` the blobs are prepared
+    against an unlocked snapshot, and None is returned when the backup
+    changed before the lock was taken.
+    """
+    snapshot = UserBackup.objects.filter(user=user).first()
+    if if_match is not None and (snapshot is None or not snapshot.if_match_allows(if_match)):
+        raise PreconditionFailed()
+    store = get_blob_store()
+    written = []
+    try:
+        prepared = None
+        if prepare_early and not _unchanged(snapshot, blob):
+            prepared = _prepare(user, snapshot, blob, upload, written)
+        with transaction.atomic():
+            result = _replace(user, blob, upload, prepared, snapshot, written, if_match, sync_cursor)
+    except _Replaced:
+        result = None
+    except BaseException:
+        for key in written:
+            store.delete(key)
+        raise
+    if result is None or not result[2]:
+        for key in written:
+            store.delete(key)
+    return result
+
+
+def _replace(user, blob, upload, prepared, snapshot, written, if_match, sync_cursor):
+    """The locked part of save_backup. Raises _Replaced when `prepared` is stale."""
+    current = UserBackup.objects.select_for_update().filter(user=user).first()
+    if if_match is not None and (current is None or not current.if_match_allows(if_match)):
+        raise PreconditionFailed()
+    if _unchanged(current, blob):
+        if sync_cursor is not None and sync_cursor > (current.sync_cursor or 0):
+            current.sync_cursor = sync_cursor
+            current.save(update_fields=['sync_cursor'])
+        return current, False, False
+    if prepared is None:
+        # Out of early attempts, or the snapshot matched the upload.
+        prepared = _prepare(user, current, blob, upload, written)
+    elif not _same_backup(snapshot, current):
+        raise _Replaced()
+
+    if prepared.version is not None:
+        BackupVersion.objects.create(**prepared.version)
+    backup, created = UserBackup.objects.update_or_create(
+        user=user,
+        defaults={
+            'blob_key': prepared.blob_key,
+            'codec': blob.codec,
+            'stored_size': blob.stored_size,
+            'original_size': blob.original_size,
+            'sha256': blob.sha256,
+            'version': current.version + 1 if current is not None else 1,
+            'sync_cursor': sync_cursor,
+            'integrity': 'unchecked',
+            'integrity_detail': '',
+            'compacted_from': '',
+        }
+    )
+    _prune_versions(user)
+
+    keep_current_blob = prepared.version is not None and not prepared.version['is_delta']
+    if current is not None and current.blob_key and not keep_current_blob:
+        old_key = current.blob_key
+        transaction.on_commit(lambda: get_blob_store().delete(old_key))
+    return backup, created, True
+
+
+def store_blob(user_id, fileobj):
+    """
+    Encode and store a readable, seekable file as a new blob of the user.
+    Returns (blob_key, blob), `blob` being the EncodedBlob without its file.
+    """
+    with _encoded(fileobj) as blob:
+        return _store(blob, UserBackup.new_blob_key(user_id)), blob._replace(file=None)
+
+
+def build_backup(user_id, upload):
+    """
+    Encode and store `upload` as a user's first backup without saving the
+    row, so many can be inserted with bulk_create. The caller deletes the
+    blob if the row is never saved. Returns an unsaved UserBackup.
+    """
+    blob_key, blob = store_blob(user_id, upload)
+    return UserBackup(
+        user_id=user_id,
+        blob_key=blob_key,
+        codec=blob.codec,
+        stored_size=blob.stored_size,
+        original_size=blob.original_size,
+        sha256=blob.sha256,
+    )
+
+
+def get_backup_metadata(user, for_update=False):
+    """
+    Load the user's backup metadata.
+    Raises UserBackup.DoesNotExist when the user has no backup.
+    """
+    queryset = UserBackup.objects.all()
+    if for_update:
+        queryset = queryset.select_for_update()
+    return queryset.get(user=user)
+
+
+def iter_stored(backup, start=0, end=None):
+    """
+    Yield the stored (encoded) bytes of `backup` from `start` to `end`
+    (inclusive), streamed from the blob store in BACKUP_DOWNLOAD_CHUNK_SIZE
+    reads so the whole blob is never loaded at once.
+    """
+    if not backup.blob_key:
+        return iter(())
+    return get_blob_store().iter_range(backup.blob_key, start, end, settings.BACKUP_DOWNLOAD_CHUNK_SIZE)
+
+
+def iter_backup(backup, start=0, end=None):
+    """
+    Yield the decoded bytes of `backup` from `start` to `end` (inclusive).
+    Compressed blobs are decoded as a stream; bytes before `start` are
+    decoded and dropped.
+    """
+    if end is None:
+        end = backup.original_size - 1
+    codec = get_codec(backup.codec)
+    if codec.name == IDENTITY:
+        yield from iter_stored(backup, start, end)
+        return
+
+    position = 0
+    for piece in codec.decode(iter_stored(backup)):
+        piece_end = position + len(piece)
+        if piece_end > start:
+            yield piece[max(start - position, 0):end - position + 1]
+        position = piece_end
+        if position > end:
+            return
+
+
+def read_backup(backup):
+    """Return the whole decoded backup. Only for small blobs and tests."""
+    return b''.join(iter_backup(backup))
@@ -0,0 +1,109 @@
+import hashlib
+import tempfile
+from multipitch import delta
+from multipitch.models import UserBackup
+from multipitch.services.backup_service import (
+    PreconditionFailed, backup_page_size, get_backup_metadata, iter_backup, save_backup
+)
+
+
+class BaseMismatch(Exception):
+    """The stored backup changed since the client compared against it."""
+
+
+def _find_backup(user):
+    try:
+        return get_backup_metadata(user)
+    except UserBackup.DoesNotExist:
+        return None
+
+
+def signature(backup):
+    """Return (page_size, page_hashes) for a stored backup, computed in one streaming pass."""
+    page_size = backup_page_size(backup)
+    hashes = [delta.page_hash(page) for page in delta.iter_pages(iter_backup(backup), page_size)]
+    return page_size, hashes
+
+
+def compare(user, page_size, client_hashes):
+    """
+    Compare the client's page hashes against the stored backup.
+    The returned `base` is the SHA-256 of the stored backup; a page size
+    mismatch marks every page as changed.
+    """
+    backup = _find_backup(user)
+    if backup is None or backup.original_size == 0:
+        return {
+            "base": None,
+            "size": 0,
+            "page_size": page_size,
+            "changed_pages": list(range(len(client_hashes))),
+        }
+
+    server_page_size, server_hashes = signature(backup)
+    if server_page_size != page_size:
+        server_hashes = [None] * len(server_hashes)
+    return {
+        "base": backup.sha256,
+        "size": backup.original_size,
+        "page_size": server_page_size,
+        "changed_pages": delta.changed_pages(server_hashes, client_hashes),
+    }
+
+
+def iter_page_frames(user, base, pages):
+    """
+    Return (backup, page_size, frames) where frames yields the requested
+    pages of the stored backup. Raises BaseMismatch up front if the backup
+    changed since `base` was returned, so the caller can still send an error.
+    """
+    backup = _find_backup(user)
+    if backup is None or backup.sha256 != base:
+        raise BaseMismatch()
+
+    page_size = backup_page_size(backup)
+    wanted = set(pages)
+
+    def frames():
+        for index, page in enumerate(delta.iter_pages(iter_backup(backup), page_size)):
+            if index in wanted:
+                yield delta.encode_frame(index, page)
+
+    return backup, page_size, frames()
+
+
+def apply(user, base, page_size, size, sha256, stream):
+    """
+    Rebuild the backup from the stored copy plus the uploaded frames and
+    save it if the result matches `sha256`.
+    Unchanged pages are copied from the stored backup, so only changed
+    pages travel over the network. The save is conditional on the stored
+    backup still being `base`.
+    Returns (backup, created, changed) from save_backup.
+    """
+    backup = _find_backup(user)
+    if backup is None:
+        if base:
+            raise BaseMismatch()
+        server_chunks = iter(())
+    else:
+        if backup.sha256 != base:
+            raise BaseMismatch()
+        if backup_page_size(backup) != page_size:
+            raise delta.DeltaError("Page size differs from the stored backup.")
+        server_chunks = iter_backup(backup)
+
+    digest = hashlib.sha256()
+    with tempfile.TemporaryFile() as rebuilt:
+        frames = delta.iter_frames(stream, page_size)
+        for page in delta.patch_pages(server_chunks, frames, page_size, size):
+            digest.update(page)
+            rebuilt.write(page)
+        if digest.hexdigest() != sha256.lower():
+            raise delta.DeltaError("Checksum mismatch.")
+
+        rebuilt.seek(0)
+        try:
+            return save_backup(user, rebuilt, if_match=f'"{base}"' if backup else None)
+        except PreconditionFailed:
+            raise BaseMismatch()
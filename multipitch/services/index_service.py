@@ -0,0 +1,193 @@
+import hashlib
+import logging
+import sqlite3
+import tempfile
+from collections import namedtuple
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from multipitch import delta
+from multipitch.models import (
+    BackupIndex, IndexedClimb, IndexedLog, IndexedPitch, IndexedRoute, UserBackup
+)
+from multipitch.services.backup_service import iter_backup
+
+logger = logging.getLogger(__name__)
+
+# Rows read from the device database and written to the index per round trip.
+BATCH_SIZE = 1000
+
+IndexedTable = namedtuple('IndexedTable', 'table model columns')
+
+# Device table -> model, and the device columns copied into model fields of
+# the same name. Columns a device database lacks are indexed as empty.
+TABLES = (
+    IndexedTable('routes', IndexedRoute, (
+        'name', 'crag', 'country', 'grade', 'length_m', 'latitude', 'longitude', 'description', 'updated_at',
+    )),
+    IndexedTable('pitches', IndexedPitch, (
+        'route_id', 'number', 'grade', 'length_m', 'protection', 'belay', 'notes', 'updated_at',
+    )),
+    IndexedTable('climbs', IndexedClimb, (
+        'route_id', 'started_at', 'finished_at', 'partner', 'style', 'status', 'notes', 'updated_at',
+    )),
+    IndexedTable('logs', IndexedLog, (
+        'climb_id', 'pitch_id', 'recorded_at', 'event', 'duration_s', 'latitude', 'longitude', 'altitude_m', 'note',
+    )),
+)
+
+IndexResult = namedtuple('IndexResult', 'created updated deleted')
+
+
+class NotIndexable(Exception):
+    """The backup is not a SQLite database this server can read."""
+
+
+def open_read_only(path):
+    conn = sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True)
+    # Read pages straight from the page cache instead of copying them.
+    conn.execute(f"PRAGMA mmap_size = {settings.BACKUP_INDEX_MMAP_SIZE}")
+    return conn
+
+
+def _field_value(field, value):
+    """Coerce a device value to what `field` stores; bad values become empty."""
+    if value is None:
+        return None if field.null else ''
+    internal_type = field.get_internal_type()
+    try:
+        if internal_type == 'DateTimeField':
+            parsed = datetime.fromisoformat(str(value))
+            return parsed if timezone.is_aware(parsed) else parsed.replace(tzinfo=dt_timezone.utc)
+        if internal_type in ('IntegerField', 'BigIntegerField'):
+            return int(value)
+        if internal_type == 'FloatField':
+            return float(value)
+    except (TypeError, ValueError, OverflowError):
+        return None if field.null else ''
+    text = str(value)
+    return text[:field.max_length] if field.max_length else text
+
+
+def _iter_rows(conn, spec):
+    """Yield (source_id, row_hash, values) from a device table, in id order."""
+    try:
+        available = {row[1] for row in conn.execute(f"PRAGMA table_info({spec.table})")}
+    except sqlite3.DatabaseError as exc:
+        raise NotIndexable(str(exc))
+    if 'id' not in available:
+        return
+    selected = [column if column in available else 'NULL' for column in spec.columns]
+    fields = [spec.model._meta.get_field(column) for column in spec.columns]
+    cursor = conn.execute(f"SELECT id, {', '.join(selected)} FROM {spec.table} ORDER BY id")
+    while rows := cursor.fetchmany(BATCH_SIZE):
+        for source_id, *raw in rows:
+            if not isinstance(source_id, int):
+                continue
+            row_hash = hashlib.sha1(repr(raw).encode()).hexdigest()
+            yield source_id, row_hash, [_field_value(field, value) for field, value in zip(fields, raw)]
+
+
+def _index_table(user_id, conn, spec):
+    """
+    Bring one indexed table in line with the device table: rows are
+    created, updated or deleted only when their hash changed.
+    """
+    model = spec.model
+    known = {
+        source_id: (pk, row_hash)
+        for pk, source_id, row_hash in model.objects.filter(user_id=user_id).values_list('pk', 'source_id', 'row_hash')
+    }
+    created = updated = 0
+    to_create, to_update = [], []
+
+    def flush():
+        if to_create:
+            model.objects.bulk_create(to_create)
+            to_create.clear()
+        if to_update:
+            model.objects.bulk_update(to_update, ['row_hash', *spec.columns])
+            to_update.clear()
+
+    for source_id, row_hash, values in _iter_rows(conn, spec):
+        existing = known.pop(source_id, None)
+        if existing is not None and existing[1] == row_hash:
+            continue
+        row = model(user_id=user_id, source_id=source_id, row_hash=row_hash, **dict(zip(spec.columns, values)))
+        if existing is None:
+            to_create.append(row)
+            created += 1
+        else:
+            row.pk = existing[0]
+            to_update.append(row)
+            updated += 1
+        if len(to_create) + len(to_update) >= BATCH_SIZE:
+            flush()
+    flush()
+
+    stale = [pk for pk, _ in known.values()]
+    for start in range(0, len(stale), BATCH_SIZE):
+        model.objects.filter(pk__in=stale[start:start + BATCH_SIZE]).delete()
+    return IndexResult(created, updated, len(stale))
+
+
+def index_file(backup, path):
+    """
+    Index the decoded copy of `backup` at `path`, opened read-only; only
+    rows that changed since the last indexed backup are written. Backups
+    that are not SQLite databases leave the previous index in place and
+    record the error.
+    Returns {table: IndexResult}, or None when there was nothing to do.
+    """
+    user_id = backup.user_id
+    with transaction.atomic():
+        index, _ = BackupIndex.objects.select_for_update().get_or_create(user_id=user_id)
+        if index.sha256 == backup.sha256 and not index.error:
+            return None
+
+        conn = None
+        try:
+            with open(path, 'rb') as copy:
+                if copy.read(len(delta.SQLITE_MAGIC)) != delta.SQLITE_MAGIC:
+                    raise NotIndexable("Backup is not a SQLite database.")
+            conn = open_read_only(path)
+            results = {spec.table: _index_table(user_id, conn, spec) for spec in TABLES}
+        except (NotIndexable, sqlite3.DatabaseError) as exc:
+            index.error = str(exc)[:255]
+            index.save(update_fields=['error'])
+            logger.warning("Could not index backup %s of user %s: %s", backup.version, user_id, exc)
+            return None
+        finally:
+            if conn is not None:
+                conn.close()
+
+        index.sha256 = backup.sha256
+        index.version = backup.version
+        index.indexed_at = timezone.now()
+        index.error = ''
+        index.save()
+    return results
+
+
+def is_indexed(backup):
+    return BackupIndex.objects.filter(user_id=backup.user_id, sha256=backup.sha256, error='').exists()
+
+
+def index_backup(user_id):
+    """
+    Decode the user's current backup into a temporary file and index it.
+    Returns what index_file returns.
+    """
+    try:
+        backup = UserBackup.objects.get(user_id=user_id)
+    except UserBackup.DoesNotExist:
+        return None
+    if is_indexed(backup):
+        return None
+
+    with tempfile.NamedTemporaryFile(suffix='.sqlite3', dir=settings.BACKUP_PROCESS_TEMP_DIR) as copy:
+        for chunk in iter_backup(backup):
+            copy.write(chunk)
+        copy.flush()
+        return index_file(backup, copy.name)
@@ -0,0 +1,252 @@
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from collections import Counter, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from multipitch.models import Job
+
+logger = logging.getLogger(__name__)
+
+# Ready jobs looked at per claim, so one busy kind cannot hide the others.
+CLAIM_SCAN = 100
+
+# Seconds between the prune() calls of a worker.
+PRUNE_INTERVAL = 3600
+
+JobKind = namedtuple('JobKind', 'name func max_attempts timeout')
+
+_kinds = {}
+
+
+def register(name, max_attempts=None, timeout=None):
+    """
+    Register the decorated function as the handler of jobs of kind `name`;
+    it is called with the job payload as keyword arguments. `max_attempts`
+    and `timeout` override JOB_MAX_ATTEMPTS and JOB_VISIBILITY_TIMEOUT.
+    """
+    def decorator(func):
+        _kinds[name] = JobKind(name, func, max_attempts, timeout)
+        return func
+    return decorator
+
+
+def registered_kinds():
+    return sorted(_kinds)
+
+
+def _max_attempts(kind):
+    return kind.max_attempts or settings.JOB_MAX_ATTEMPTS
+
+
+def _timeout(kind):
+    return kind.timeout or settings.JOB_VISIBILITY_TIMEOUT
+
+
+def enqueue(kind, payload=None, key='', delay=None):
+    """
+    Queue a job. It is written in the current transaction, so it runs only
+    if the change that asked for it commits. A job of the same kind and
+    non-blank `key` that is still queued absorbs this one; the
+    unique_queued_job_key constraint decides between concurrent callers.
+    Returns the new Job, or None when it was merged.
+    """
+    if kind not in _kinds:
+        raise KeyError(f"Unknown job kind {kind!r}.")
+    if key and Job.objects.filter(kind=kind, key=key, state='queued').exists():
+        return None
+    run_after = timezone.now() + delay if delay else timezone.now()
+    try:
+        with transaction.atomic():
+            return Job.objects.create(kind=kind, key=key, payload=payload or {}, run_after=run_after)
+    except IntegrityError:
+        if not key:
+            raise
+        return None
+
+
+def retry_backoff(attempts):
+    """Delay before retrying a job that failed its `attempts`-th attempt."""
+    return min(settings.JOB_RETRY_BACKOFF * 2 ** (attempts - 1), settings.JOB_MAX_RETRY_BACKOFF)
+
+
+def claim(worker, kinds=None, limit=1):
+    """
+    Claim up to `limit` ready jobs for `worker`: queued jobs due to run, and
+    running jobs whose visibility timeout expired. Kinds already running
+    JOB_CONCURRENCY jobs are left alone, as are keys with a job running.
+    Jobs are claimed with a conditional update, so concurrent workers never
+    get the same one. Returns the claimed jobs.
+    """
+    now = timezone.now()
+    kinds = [name for name in (kinds or _kinds) if name in _kinds]
+    claimed = []
+    with transaction.atomic():
+        active = Job.objects.filter(state='running', locked_until__gt=now, kind__in=kinds)
+        running = Counter()
+        busy_keys = set()
+        for kind, key in active.values_list('kind', 'key'):
+            running[kind] += 1
+            if key:
+                busy_keys.add((kind, key))
+        free = {
+            name: settings.JOB_CONCURRENCY.get(name, 1) - running[name] for name in kinds
+        }
+
+        ready = Job.objects.filter(
+            Q(state='queued', run_after__lte=now) | Q(state='running', locked_until__lte=now),
+            kind__in=[name for name, slots in free.items() if slots > 0],
+        ).order_by('run_after', 'id')
+        for job in ready[:CLAIM_SCAN]:
+            if len(claimed) >= limit:
+                break
+            if free[job.kind] <= 0 or (job.key and (job.kind, job.key) in busy_keys):
+                continue
+            kind = _kinds[job.kind]
+            if job.state == 'running' and job.attempts >= _max_attempts(kind):
+                # The worker died on the last attempt; do not try again.
+                Job.objects.filter(pk=job.pk, state='running', attempts=job.attempts).update(
+                    state='failed', locked_until=None, finished_at=now,
+                    last_error=f"{job.worker} did not finish before the visibility timeout.",
+                )
+                continue
+
+            locked_until = now + _timeout(kind)
+            updated = Job.objects.filter(pk=job.pk, state=job.state, attempts=job.attempts).update(
+                state='running', locked_until=locked_until, worker=worker, attempts=F('attempts') + 1,
+            )
+            if not updated:
+                continue
+            job.state, job.locked_until, job.worker, job.attempts = 'running', locked_until, worker, job.attempts + 1
+            claimed.append(job)
+            free[job.kind] -= 1
+            if job.key:
+                busy_keys.add((job.kind, job.key))
+    return claimed
+
+
+def _finish(job, **fields):
+    """Record the outcome of a claimed job, unless another worker reclaimed it."""
+    return Job.objects.filter(pk=job.pk, state='running', worker=job.worker, attempts=job.attempts).update(
+        locked_until=None, **fields
+    )
+
+
+def _retry(job, error):
+    """
+    Queue a failed job again after retry_backoff(). When a job with the same
+    key was queued meanwhile, that one runs instead and this one fails.
+    """
+    try:
+        with transaction.atomic():
+            _finish(job, state='queued', run_after=timezone.now() + retry_backoff(job.attempts), last_error=error)
+    except IntegrityError:
+        _finish(job, state='failed', finished_at=timezone.now(), last_error=error)
+
+
+def run(job):
+    """
+    Run a claimed job. A failure is retried after retry_backoff() until the
+    kind's attempts are used up, then the job is marked failed.
+    Returns True when the job succeeded.
+    """
+    kind = _kinds[job.kind]
+    try:
+        kind.func(**job.payload)
+    except Exception:
+        logger.exception("%s job %s failed on attempt %s", job.kind, job.pk, job.attempts)
+        error = traceback.format_exc()[-4000:]
+        if job.attempts >= _max_attempts(kind):
+            _finish(job, state='failed', finished_at=timezone.now(), last_error=error)
+        else:
+            _retry(job, error)
+        return False
+    finally:
+        close_old_connections()
+    _finish(job, state='done', finished_at=timezone.now())
+    return True
+
+
+def prune():
+    """Delete jobs that finished successfully more than JOB_RETENTION ago."""
+    deleted, _ = Job.objects.filter(state='done', finished_at__lt=timezone.now() - settings.JOB_RETENTION).delete()
+    return deleted
+
+
+WorkerStats = namedtuple('WorkerStats', 'succeeded failed')
+
+
+class Worker:
+    """
+    Claims and runs jobs on `threads` threads, polling every
+    JOB_POLL_INTERVAL while there is nothing to do. With `burst` it returns
+    once no job is ready instead of waiting for more.
+    """
+
+    def __init__(self, name=None, kinds=None, threads=1, burst=False):
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.kinds = kinds
+        self.threads = threads
+        self.burst = burst
+        self.stopping = threading.Event()
+        self.succeeded = self.failed = 0
+
+    def stop(self):
+        """Finish the jobs in hand and return from work()."""
+        self.stopping.set()
+
+    def _count(self, succeeded):
+        if succeeded:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+
+    def work(self):
+        next_prune = time.monotonic()
+        if self.threads == 1:
+            self._run_inline(next_prune)
+        else:
+            with ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='multipitch-job') as executor:
+                self._run_threaded(executor, next_prune)
+        return WorkerStats(self.succeeded, self.failed)
+
+    def _prune_due(self, next_prune):
+        if time.monotonic() < next_prune:
+            return next_prune
+        prune()
+        return time.monotonic() + PRUNE_INTERVAL
+
+    def _run_inline(self, next_prune):
+        while not self.stopping.is_set():
+            next_prune = self._prune_due(next_prune)
+            jobs = claim(self.name, self.kinds)
+            for job in jobs:
+                self._count(run(job))
+            if not jobs:
+                if self.burst:
+                    return
+                self.stopping.wait(settings.JOB_POLL_INTERVAL)
+
+    def _run_threaded(self, executor, next_prune):
+        in_flight = set()
+        while not self.stopping.is_set():
+            next_prune = self._prune_due(next_prune)
+            close_old_connections()
+            jobs = claim(self.name, self.kinds, self.threads - len(in_flight)) if len(in_flight) < self.threads else []
+            in_flight.update(executor.submit(run, job) for job in jobs)
+            if not in_flight:
+                if self.burst:
+                    return
+                self.stopping.wait(settings.JOB_POLL_INTERVAL)
+                continue
+            done, in_flight = wait(in_flight, timeout=settings.JOB_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                self._count(future.result())
+        for future in wait(in_flight).done:
+            self._count(future.result())
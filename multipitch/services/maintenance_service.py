@@ -0,0 +1,261 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+from collections import namedtuple
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from multipitch import delta
+from multipitch.models import BackupVersion, UserBackup
+from multipitch.services import job_service
+from multipitch.services.backup_service import iter_backup, store_blob
+from multipitch.services.index_service import index_file, is_indexed, open_read_only
+from multipitch.services.version_service import reconstruct
+from multipitch.storage import get_blob_store
+
+ProcessResult = namedtuple('ProcessResult', 'integrity saved_bytes indexed')
+
+
+class _Replaced(Exception):
+    """The backup changed while a compacted copy was being prepared."""
+
+
+def needs_processing(backup):
+    """Whether process_backup still has work to do for `backup`."""
+    if backup.integrity == 'unchecked':
+        return True
+    return backup.integrity == 'ok' and not is_indexed(backup)
+
+
+def check_header(path, size):
+    """
+    Check the SQLite header of the file at `path`: the magic string, a valid
+    page size, and a file that is no shorter than the pages the header
+    declares. Returns (integrity, detail).
+    """
+    with open(path, 'rb') as file:
+        header = file.read(100)
+    if len(header) < 100 or not header.startswith(delta.SQLITE_MAGIC):
+        return 'not_sqlite', "Missing SQLite header."
+
+    page_size = int.from_bytes(header[16:18], 'big')
+    if page_size == 1:
+        page_size = 65536
+    if page_size < 512 or page_size > 65536 or page_size & (page_size - 1):
+        return 'corrupt', f"Invalid page size {page_size}."
+
+    # The page count is only maintained by writers that also stamp the
+    # version-valid-for number (bytes 92-95) with the change counter.
+    page_count = int.from_bytes(header[28:32], 'big')
+    if header[92:96] == header[24:28] and page_count * page_size > size:
+        return 'corrupt', f"Header declares {page_count} pages, file holds {size // page_size}."
+    return 'ok', ''
+
+
+def check_integrity(path, size):
+    """Run check_header, then PRAGMA quick_check. Returns (integrity, detail)."""
+    integrity, detail = check_header(path, size)
+    if integrity != 'ok':
+        return integrity, detail
+
+    try:
+        conn = open_read_only(path)
+        try:
+            problems = [row[0] for row in conn.execute("PRAGMA quick_check")]
+        finally:
+            conn.close()
+    except sqlite3.DatabaseError as exc:
+        return 'corrupt', str(exc)[:255]
+    if problems != ['ok']:
+        return 'corrupt', "; ".join(problems)[:255]
+    return 'ok', ''
+
+
+def temp_bytes_needed(backup):
+    """
+    Temporary disk space processing `backup` takes at most: the decoded copy,
+    the compacted copy and its encoding, plus the newest version and its
+    re-diffed delta when that version has to be rebased.
+    """
+    needed = 3 * backup.original_size
+    newest = BackupVersion.objects.filter(user_id=backup.user_id, number=backup.version - 1, is_delta=True).first()
+    if newest is not None:
+        needed += 3 * newest.original_size
+    return needed
+
+
+def _temp_dir():
+    return settings.BACKUP_PROCESS_TEMP_DIR or tempfile.gettempdir()
+
+
+def _record(backup, integrity, detail=''):
+    """Store the check result unless the backup was replaced meanwhile."""
+    UserBackup.objects.filter(pk=backup.pk, sha256=backup.sha256).update(
+        integrity=integrity, integrity_detail=detail[:255]
+    )
+    backup.integrity, backup.integrity_detail = integrity, detail[:255]
+
+
+def _write_backup(backup, path):
+    with open(path, 'wb') as copy:
+        for chunk in iter_backup(backup):
+            copy.write(chunk)
+
+
+def _vacuum(path, target):
+    conn = open_read_only(path)
+    try:
+        conn.execute("VACUUM INTO ?", (target,))
+    finally:
+        conn.close()
+
+
+def _iter_file(path):
+    with open(path, 'rb') as file:
+        while chunk := file.read(settings.BACKUP_DOWNLOAD_CHUNK_SIZE):
+            yield chunk
+
+
+def _rebase_version(version, compacted_path, written):
+    """
+    Re-diff the delta `version` against the compacted copy that replaces
+    the backup it was diffed against. Keys written are appended to
+    `written`. Returns the BackupVersion field values to store.
+    """
+    with reconstruct(version.user_id, version.number) as content:
+        with tempfile.TemporaryFile(dir=settings.BACKUP_PROCESS_TEMP_DIR) as frames:
+            chunks = iter(lambda: content.read(settings.BACKUP_DOWNLOAD_CHUNK_SIZE), b'')
+            for frame in delta.diff_pages(chunks, _iter_file(compacted_path), version.page_size):
+                frames.write(frame)
+            blob_key, blob = store_blob(version.user_id, frames)
+            written.append(blob_key)
+            if blob.stored_size < version.original_size:
+                return {'blob_key': blob_key, 'codec': blob.codec, 'is_delta': True, 'stored_size': blob.stored_size}
+
+        content.seek(0)
+        blob_key, blob = store_blob(version.user_id, content)
+        written.append(blob_key)
+        return {'blob_key': blob_key, 'codec': blob.codec, 'is_delta': False, 'stored_size': blob.stored_size}
+
+
+def _swap_in(backup, compacted_path):
+    """
+    Replace the blob of `backup` with the compacted copy at `compacted_path`.
+    The newest version, when it is a delta against the replaced blob, is
+    re-diffed against the copy first. Nothing changes if the backup or that
+    version were replaced meanwhile. Returns the updated backup, or None.
+    """
+    store = get_blob_store()
+    written = []
+    try:
+        newest = BackupVersion.objects.filter(user_id=backup.user_id, number=backup.version - 1, is_delta=True).first()
+        rebased = _rebase_version(newest, compacted_path, written) if newest is not None else None
+
+        with open(compacted_path, 'rb') as compacted:
+            blob_key, blob = store_blob(backup.user_id, compacted)
+        written.append(blob_key)
+
+        with transaction.atomic():
+            current = UserBackup.objects.select_for_update().filter(pk=backup.pk).first()
+            if current is None or current.sha256 != backup.sha256 or current.blob_key != backup.blob_key:
+                raise _Replaced()
+            stale_keys = [current.blob_key]
+            if newest is not None:
+                version = BackupVersion.objects.select_for_update().filter(pk=newest.pk).first()
+                if version is None or version.blob_key != newest.blob_key:
+                    raise _Replaced()
+                stale_keys.append(version.blob_key)
+                for field, value in rebased.items():
+                    setattr(version, field, value)
+                version.save(update_fields=list(rebased))
+
+            current.compacted_from = current.sha256
+            current.blob_key = blob_key
+            current.codec = blob.codec
+            current.stored_size = blob.stored_size
+            current.original_size = blob.original_size
+            current.sha256 = blob.sha256
+            current.integrity, current.integrity_detail = 'ok', ''
+            # The page layout changed, so last_sync moves with the ETag: devices
+            # are told about the copy and download it before their next delta
+            # compare, which would otherwise find nearly every page changed.
+            current.save(update_fields=[
+                'compacted_from', 'blob_key', 'codec', 'stored_size', 'original_size',
+                'sha256', 'integrity', 'integrity_detail', 'last_sync',
+            ])
+
+            def delete_stale():
+                for key in stale_keys:
+                    store.delete(key)
+            transaction.on_commit(delete_stale)
+    except _Replaced:
+        for key in written:
+            store.delete(key)
+        return None
+    except BaseException:
+        for key in written:
+            store.delete(key)
+        raise
+    return current
+
+
+@job_service.register('process_backup', timeout=timedelta(hours=1))
+def process_backup(user_id):
+    """
+    Check, compact and index the user's current backup.
+    The backup is decoded once into BACKUP_PROCESS_TEMP_DIR and checked with
+    check_integrity. A healthy backup whose VACUUM INTO copy is at least
+    BACKUP_COMPACT_MIN_SAVING smaller is replaced by that copy, under a new
+    ETag; If-Match still accepts the upload's through `compacted_from`.
+    Backups that would take more temporary space than allowed are marked
+    'skipped'.
+    Returns a ProcessResult, or None when there was nothing to do.
+    """
+    try:
+        backup = UserBackup.objects.get(user_id=user_id)
+    except UserBackup.DoesNotExist:
+        return None
+    if not needs_processing(backup):
+        return None
+
+    needed = temp_bytes_needed(backup)
+    if needed > settings.BACKUP_PROCESS_MAX_TEMP_BYTES or needed > shutil.disk_usage(_temp_dir()).free:
+        _record(backup, 'skipped', f"Needs {needed} bytes of temporary space.")
+        return ProcessResult(backup.integrity, 0, None)
+
+    saved_bytes = 0
+    with tempfile.TemporaryDirectory(dir=settings.BACKUP_PROCESS_TEMP_DIR) as work:
+        path = os.path.join(work, 'backup.sqlite3')
+        _write_backup(backup, path)
+
+        if backup.integrity == 'unchecked':
+            integrity, detail = check_integrity(path, backup.original_size)
+            compacted = None
+            if integrity == 'ok':
+                compacted_path = os.path.join(work, 'compacted.sqlite3')
+                _vacuum(path, compacted_path)
+                saving = backup.original_size - os.path.getsize(compacted_path)
+                if saving >= backup.original_size * settings.BACKUP_COMPACT_MIN_SAVING:
+                    compacted = _swap_in(backup, compacted_path)
+            if compacted is not None:
+                saved_bytes = backup.original_size - compacted.original_size
+                backup, path = compacted, compacted_path
+            else:
+                _record(backup, integrity, detail)
+
+        # Backups that failed the check keep the previous index.
+        indexed = index_file(backup, path) if backup.integrity == 'ok' else None
+    return ProcessResult(backup.integrity, saved_bytes, indexed)
+
+
+def schedule_processing(user_id):
+    """
+    Process the user's backup once the current transaction commits: as a
+    job for `manage.py run_jobs` when BACKUP_PROCESS_IN_BACKGROUND is set,
+    inline otherwise. Jobs for a user still waiting in the queue are merged.
+    """
+    if settings.BACKUP_PROCESS_IN_BACKGROUND:
+        job_service.enqueue('process_backup', {'user_id': user_id}, key=str(user_id))
+    else:
+        transaction.on_commit(lambda: process_backup(user_id))
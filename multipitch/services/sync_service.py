@@ -0,0 +1,137 @@
+import time
+from collections import namedtuple
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from multipitch.models import SyncChange, SyncState, UserBackup
+
+PushResult = namedtuple('PushResult', 'applied conflicts')
+PullResult = namedtuple('PullResult', 'changes cursor has_more')
+CompactResult = namedtuple('CompactResult', 'superseded tombstones')
+
+# Rows deleted per statement while compacting.
+COMPACT_BATCH_SIZE = 1000
+
+
+class CursorExpired(Exception):
+    """The cursor predates deletions that compaction has since dropped."""
+
+
+def _state(user, for_update=False):
+    queryset = SyncState.objects.select_for_update() if for_update else SyncState.objects
+    return queryset.get_or_create(user=user)[0]
+
+
+def _wins(change, current):
+    """Last writer wins on the device clock; the device id breaks ties."""
+    return current is None or (change['timestamp'], change['device']) > (current.timestamp, current.device)
+
+
+def _latest(user, table, row_ids):
+    """The current change of each of `row_ids` in `table`, by row id."""
+    latest = (
+        SyncChange.objects.filter(user=user, table=table, row_id__in=row_ids)
+        .values('row_id').annotate(last=Max('id')).values('last')
+    )
+    return {change.row_id: change for change in SyncChange.objects.filter(id__in=latest)}
+
+
+def push_changes(user, device, changes):
+    """
+    Apply row changes from `device`. Each change is a dict with `table`,
+    `id`, `deleted`, `data` and `timestamp`, in the order they were made.
+    A change older than the row's current state is not applied; it is
+    returned as a conflict together with the change that won.
+    Returns a PushResult.
+    """
+    applied, conflicts = [], []
+    with transaction.atomic():
+        _state(user, for_update=True)
+        by_table = {}
+        for change in changes:
+            by_table.setdefault(change['table'], set()).add(change['id'])
+        current = {
+            (table, row_id): row
+            for table, row_ids in by_table.items()
+            for row_id, row in _latest(user, table, row_ids).items()
+        }
+
+        for change in changes:
+            key = (change['table'], change['id'])
+            change = {**change, 'device': device}
+            if not _wins(change, current.get(key)):
+                conflicts.append((change, current[key]))
+                continue
+            current[key] = SyncChange(
+                user=user,
+                table=change['table'],
+                row_id=change['id'],
+                deleted=change['deleted'],
+                data=None if change['deleted'] else change['data'],
+                timestamp=change['timestamp'],
+                device=device,
+            )
+            applied.append(current[key])
+        SyncChange.objects.bulk_create(applied)
+    return PushResult(applied, conflicts)
+
+
+def pull_changes(user, cursor, limit, device=None):
+    """
+    Changes after `cursor`, oldest first, skipping those made by `device`.
+    The returned cursor covers skipped changes too, so it always advances.
+    Raises CursorExpired when `cursor` predates pruned deletions;
+    the device must restore the latest backup and pull from its cursor.
+    """
+    if cursor and cursor < _state(user).pruned_through:
+        raise CursorExpired()
+    rows = list(SyncChange.objects.filter(user=user, id__gt=cursor).order_by('id')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return PullResult(
+        [row for row in rows if row.device != device],
+        rows[-1].id if rows else cursor,
+        has_more,
+    )
+
+
+def too_far_ahead(timestamp):
+    """Whether a device clock reading is beyond SYNC_MAX_CLOCK_SKEW from now."""
+    return timestamp > (time.time() + settings.SYNC_MAX_CLOCK_SKEW.total_seconds()) * 1000
+
+
+def _delete_in_batches(queryset):
+    ids = list(queryset.values_list('id', flat=True))
+    for start in range(0, len(ids), COMPACT_BATCH_SIZE):
+        SyncChange.objects.filter(id__in=ids[start:start + COMPACT_BATCH_SIZE]).delete()
+    return ids
+
+
+def compact(user):
+    """
+    Compact a user's change log: drop changes superseded by a newer change
+    to the same row, and deletions that are both older than
+    SYNC_TOMBSTONE_RETENTION and covered by the latest backup's
+    sync_cursor, since a device bootstrapping from that backup never sees
+    the deleted rows. Returns a CompactResult.
+    """
+    with transaction.atomic():
+        state = _state(user, for_update=True)
+        changes = SyncChange.objects.filter(user=user)
+        current = changes.values('table', 'row_id').annotate(last=Max('id')).values('last')
+        superseded = _delete_in_batches(changes.exclude(id__in=current))
+
+        checkpoint = UserBackup.objects.filter(user=user).values_list('sync_cursor', flat=True).first()
+        tombstones = []
+        if checkpoint:
+            tombstones = _delete_in_batches(changes.filter(
+                deleted=True,
+                id__lte=checkpoint,
+                created_at__lt=timezone.now() - settings.SYNC_TOMBSTONE_RETENTION,
+            ))
+        if tombstones:
+            state.pruned_through = max(state.pruned_through, max(tombstones))
+        state.compacted_at = timezone.now()
+        state.save()
+    return CompactResult(len(superseded), len(tombstones))
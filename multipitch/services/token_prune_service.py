@@ -0,0 +1,85 @@
+import logging
+import time
+from collections import namedtuple
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from multipitch.services import job_service
+
+logger = logging.getLogger(__name__)
+
+PruneBatch = namedtuple('PruneBatch', 'outstanding blacklisted')
+PruneResult = namedtuple('PruneResult', 'outstanding blacklisted batches elapsed')
+
+
+def expired_ids(now, batch_size):
+    """
+    Ids of the `batch_size` tokens that expired first, up to `now`. The
+    query walks the (expires_at, id) index from migration 0009, so it reads
+    no live rows however many there are.
+    """
+    return (
+        OutstandingToken.objects.filter(expires_at__lte=now)
+        .order_by('expires_at', 'pk')
+        .values_list('pk', flat=True)[:batch_size]
+    )
+
+
+def iter_prune_batches(batch_size=None, now=None):
+    """
+    Delete expired OutstandingToken rows, and the BlacklistedToken rows that
+    point at them, in batches of at most `batch_size` ids, oldest expiry
+    first. Each batch runs in its own short transaction, so locks are held
+    for one batch only. Yields a PruneBatch after every batch. Deleted rows
+    are the progress, so an interrupted run resumes by running again.
+    """
+    batch_size = batch_size or settings.TOKEN_PRUNE_BATCH_SIZE
+    now = now or timezone.now()
+    while True:
+        ids = list(expired_ids(now, batch_size))
+        if not ids:
+            return
+        with transaction.atomic():
+            blacklisted, _ = BlacklistedToken.objects.filter(token_id__in=ids).delete()
+            outstanding, _ = OutstandingToken.objects.filter(pk__in=ids).delete()
+        yield PruneBatch(outstanding, blacklisted)
+
+
+def prune_expired_tokens(batch_size=None):
+    """Prune every expired token and return a PruneResult."""
+    started = time.monotonic()
+    outstanding = blacklisted = batches = 0
+    for batch in iter_prune_batches(batch_size):
+        outstanding += batch.outstanding
+        blacklisted += batch.blacklisted
+        batches += 1
+    return PruneResult(outstanding, blacklisted, batches, time.monotonic() - started)
+
+
+def schedule_pruning():
+    """
+    Queue a prune_tokens job TOKEN_PRUNE_INTERVAL seconds from now, when that
+    is set; a job already queued absorbs it. `manage.py run_jobs` calls this
+    when it starts and every run queues the next, so however many workers
+    there are, one chain of runs prunes. Returns the new Job, or None.
+    """
+    interval = settings.TOKEN_PRUNE_INTERVAL
+    if not interval:
+        return None
+    return job_service.enqueue('prune_tokens', key='prune_tokens', delay=timedelta(seconds=interval))
+
+
+@job_service.register('prune_tokens', max_attempts=1)
+def run_scheduled_pruning():
+    """
+    Queue the next run, then prune. A run that fails is not retried; the
+    next one is already queued.
+    """
+    schedule_pruning()
+    result = prune_expired_tokens()
+    logger.info(
+        "Pruned %d outstanding and %d blacklisted tokens in %.2fs",
+        result.outstanding, result.blacklisted, result.elapsed,
+    )
@@ -0,0 +1,208 @@
+import hashlib
+import logging
+import math
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from django.conf import settings
+from django.utils import timezone
+from multipitch.models import BackupUploadSession
+from multipitch.services import job_service
+from multipitch.services.backup_service import save_backup
+
+logger = logging.getLogger(__name__)
+
+# Missing chunk indices listed when a commit is incomplete.
+MISSING_CHUNKS_REPORTED = 100
+
+
+class ChunkRejected(Exception):
+    pass
+
+
+class IncompleteUpload(Exception):
+    pass
+
+
+class ChecksumMismatch(Exception):
+    pass
+
+
+class SessionTooLarge(Exception):
+    pass
+
+
+class TooManySessions(Exception):
+    pass
+
+
+def session_dir(session):
+    return Path(settings.BACKUP_STAGING_DIR) / str(session.id)
+
+
+def create_session(user):
+    """
+    Open an upload session for `user`. The user's expired sessions are
+    discarded first; raises TooManySessions when BACKUP_MAX_OPEN_SESSIONS
+    are still open.
+    """
+    now = timezone.now()
+    open_sessions = 0
+    for session in BackupUploadSession.objects.filter(user=user):
+        if session.expires_at <= now:
+            abort_session(session)
+        else:
+            open_sessions += 1
+    if open_sessions >= settings.BACKUP_MAX_OPEN_SESSIONS:
+        raise TooManySessions(f"At most {settings.BACKUP_MAX_OPEN_SESSIONS} upload sessions can be open at once.")
+    session = BackupUploadSession.objects.create(
+        user=user,
+        chunk_size=settings.BACKUP_SESSION_CHUNK_SIZE,
+        expires_at=now + settings.BACKUP_SESSION_LIFETIME,
+    )
+    session_dir(session).mkdir(parents=True, exist_ok=True)
+    return session
+
+
+def get_active_session(user, session_id):
+    """
+    Raises BackupUploadSession.DoesNotExist for unknown, foreign or expired sessions.
+    """
+    return BackupUploadSession.objects.get(
+        id=session_id, user=user, expires_at__gt=timezone.now()
+    )
+
+
+def received_chunks(session):
+    directory = session_dir(session)
+    if not directory.is_dir():
+        return []
+    return sorted(int(path.stem) for path in directory.glob('*.part'))
+
+
+def max_chunks(session):
+    """Number of chunks a session of at most BACKUP_MAX_SIZE bytes can have."""
+    return math.ceil(settings.BACKUP_MAX_SIZE / session.chunk_size)
+
+
+def staged_bytes(session, exclude=None):
+    """Bytes held by the session's received chunks, other than `exclude`."""
+    directory = session_dir(session)
+    if not directory.is_dir():
+        return 0
+    return sum(
+        path.stat().st_size for path in directory.glob('*.part') if path.stem != str(exclude)
+    )
+
+
+def write_chunk(session, index, stream):
+    """
+    Stage chunk `index` from a readable stream. The chunk is written to a
+    temporary file and renamed into place, so a dropped connection never
+    leaves a partial chunk behind and a retry simply replaces it.
+    Raises ChunkRejected for an index past max_chunks(), and SessionTooLarge
+    once the session would stage more than BACKUP_MAX_SIZE bytes.
+    """
+    if not 0 <= index < max_chunks(session):
+        raise ChunkRejected(f"Chunk index must be below {max_chunks(session)}.")
+    if stream is None:
+        raise ChunkRejected("Chunk cannot be empty.")
+    directory = session_dir(session)
+    directory.mkdir(parents=True, exist_ok=True)
+    read_size = settings.BACKUP_UPLOAD_CHUNK_SIZE
+    # A retried chunk replaces its earlier attempt, so that one is not counted.
+    allowed = settings.BACKUP_MAX_SIZE - staged_bytes(session, exclude=index)
+    written = 0
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as staged:
+            while data := stream.read(read_size):
+                written += len(data)
+                if written > session.chunk_size:
+                    raise ChunkRejected(f"Chunk exceeds the session chunk size of {session.chunk_size} bytes.")
+                if written > allowed:
+                    raise SessionTooLarge(f"Upload exceeds the maximum backup size of {settings.BACKUP_MAX_SIZE} bytes.")
+                staged.write(data)
+        if written == 0:
+            raise ChunkRejected("Chunk cannot be empty.")
+        os.replace(tmp_path, directory / f"{index}.part")
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return written
+
+
+def commit_session(session, chunk_count, sha256, if_match=None, sync_cursor=None):
+    """
+    Assemble chunks 0..chunk_count-1 into a single file, verify the SHA-256
+    of the result and replace the user's backup with it.
+    Raises ChunkRejected for a chunk_count past max_chunks(), and
+    IncompleteUpload(missing_count, first_missing) when chunks are missing.
+    Returns (backup, created, changed) from save_backup.
+    """
+    if chunk_count > max_chunks(session):
+        raise ChunkRejected(f"Chunk count must be at most {max_chunks(session)}.")
+    directory = session_dir(session)
+    chunks = [directory / f"{index}.part" for index in range(chunk_count)]
+    missing = [index for index, path in enumerate(chunks) if not path.exists()]
+    if missing:
+        raise IncompleteUpload(len(missing), missing[:MISSING_CHUNKS_REPORTED])
+    for path in chunks[:-1]:
+        if path.stat().st_size != session.chunk_size:
+            raise ChunkRejected(f"Chunk {path.stem} is shorter than the session chunk size.")
+
+    digest = hashlib.sha256()
+    read_size = settings.BACKUP_UPLOAD_CHUNK_SIZE
+    with tempfile.TemporaryFile(dir=directory) as assembled:
+        for path in chunks:
+            with open(path, 'rb') as chunk:
+                while data := chunk.read(read_size):
+                    digest.update(data)
+                    assembled.write(data)
+        if digest.hexdigest() != sha256.lower():
+            raise ChecksumMismatch()
+        assembled.seek(0)
+        # Not in a transaction: save_backup stores the blobs before it locks the backup.
+        result = save_backup(session.user, assembled, if_match=if_match, sync_cursor=sync_cursor)
+    session.delete()
+    shutil.rmtree(directory, ignore_errors=True)
+    return result
+
+
+def abort_session(session):
+    shutil.rmtree(session_dir(session), ignore_errors=True)
+    session.delete()
+
+
+def purge_expired_sessions():
+    """Discard expired sessions and their staged chunks. Returns how many."""
+    purged = 0
+    for session in BackupUploadSession.objects.filter(expires_at__lte=timezone.now()).iterator():
+        abort_session(session)
+        purged += 1
+    return purged
+
+
+def schedule_purge():
+    """
+    Queue a purge_upload_sessions job BACKUP_SESSION_PURGE_INTERVAL seconds
+    from now, when that is set; a job already queued absorbs it. Like
+    token_prune_service.schedule_pruning(), `manage.py run_jobs` calls this
+    when it starts and every run queues the next. Returns the new Job, or None.
+    """
+    interval = settings.BACKUP_SESSION_PURGE_INTERVAL
+    if not interval:
+        return None
+    return job_service.enqueue(
+        'purge_upload_sessions', key='purge_upload_sessions', delay=timedelta(seconds=interval)
+    )
+
+
+@job_service.register('purge_upload_sessions', max_attempts=1)
+def run_scheduled_purge():
+    """Queue the next run, then purge. A failed run is not retried."""
+    schedule_purge()
+    logger.info("Purged %d expired upload sessions", purge_expired_sessions())
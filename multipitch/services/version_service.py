@@ -0,0 +1,87 @@
+import hashlib
+import tempfile
+from django.conf import settings
+from multipitch import delta
+from multipitch.codecs import get_codec
+from multipitch.models import BackupVersion
+from multipitch.services.backup_service import get_backup_metadata, iter_backup, iter_stored, save_backup
+
+
+class CorruptVersion(Exception):
+    pass
+
+
+def list_versions(user):
+    return BackupVersion.objects.filter(user=user).order_by('-number')
+
+
+def _iter_frames(version):
+    chunks = get_codec(version.codec).decode(iter_stored(version))
+    return delta.iter_frames(delta.ChunkStream(chunks), version.page_size)
+
+
+def _iter_file(fileobj):
+    fileobj.seek(0)
+    chunk_size = settings.BACKUP_DOWNLOAD_CHUNK_SIZE
+    while chunk := fileobj.read(chunk_size):
+        yield chunk
+
+
+def reconstruct(user, number):
+    """
+    Rebuild version `number` into a temporary file and return it rewound.
+    Starts from the nearest newer full copy (a full version or the current
+    backup) and applies the page deltas of each version down to `number`.
+    Raises BackupVersion.DoesNotExist and CorruptVersion.
+    """
+    target = BackupVersion.objects.get(user=user, number=number)
+
+    chain = []
+    for version in BackupVersion.objects.filter(user=user, number__gte=number).order_by('number'):
+        chain.append(version)
+        if not version.is_delta:
+            break
+
+    if chain[-1].is_delta:
+        base_chunks = iter_backup(get_backup_metadata(user))
+    else:
+        base_chunks = iter_backup(chain.pop())
+
+    result = None
+    for version in reversed(chain):
+        rebuilt = tempfile.TemporaryFile()
+        try:
+            for page in delta.patch_pages(base_chunks, _iter_frames(version), version.page_size, version.original_size):
+                rebuilt.write(page)
+        except delta.DeltaError:
+            rebuilt.close()
+            raise CorruptVersion(version.number)
+        finally:
+            if result is not None:
+                result.close()
+        result = rebuilt
+        base_chunks = _iter_file(result)
+
+    if result is None:
+        result = tempfile.TemporaryFile()
+        for chunk in base_chunks:
+            result.write(chunk)
+
+    digest = hashlib.sha256()
+    for chunk in _iter_file(result):
+        digest.update(chunk)
+    if digest.hexdigest() != target.sha256:
+        result.close()
+        raise CorruptVersion(number)
+    result.seek(0)
+    return result
+
+
+def restore(user, number, if_match=None):
+    """
+    Make version `number` the current backup. The replaced backup is kept as
+    a new version, so a restore can itself be undone.
+    Returns (backup, created, changed) from save_backup.
+    """
+    with reconstruct(user, number) as content:
+        return save_backup(user, content, if_match=if_match)
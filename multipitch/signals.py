@@ -0,0 +1,44 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from multipitch import metrics
+from multipitch.notifications import get_hub
+from multipitch.models import BackupVersion, UserAuth, UserBackup
+from multipitch.services.maintenance_service import schedule_processing
+from multipitch.storage import get_blob_store
+from multipitch.user_cache import get_user_cache
+
+
+@receiver(post_delete, sender=UserBackup)
+@receiver(post_delete, sender=BackupVersion)
+def delete_backup_blob(sender, instance, **kwargs):
+    if instance.blob_key:
+        key = instance.blob_key
+        transaction.on_commit(lambda: get_blob_store().delete(key))
+
+
+@receiver(post_save, sender=UserBackup)
+def observe_backup_size(sender, instance, **kwargs):
+    metrics.observe_backup(instance)
+
+
+@receiver(post_save, sender=UserBackup)
+def process_saved_backup(sender, instance, **kwargs):
+    if instance.integrity == 'unchecked':
+        schedule_processing(instance.user_id)
+
+
+@receiver(post_save, sender=UserBackup)
+def announce_saved_backup(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: get_hub().publish(user_id))
+
+
+connection_created.connect(metrics.install_query_recorder)
+
+
+@receiver(post_save, sender=UserAuth)
+@receiver(post_delete, sender=UserAuth)
+def evict_cached_user(sender, instance, **kwargs):
+    get_user_cache().invalidate(instance.pk)
@@ -0,0 +1,23 @@
+from functools import lru_cache
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.utils.module_loading import import_string
+from multipitch.storage.base import BlobNotFound, BlobStore
+
+
+@lru_cache(maxsize=None)
+def get_blob_store():
+    """Return the blob store configured in BACKUP_BLOB_STORE."""
+    config = settings.BACKUP_BLOB_STORE
+    backend = import_string(config['BACKEND'])
+    return backend(**config.get('OPTIONS', {}))
+
+
+def _reset_blob_store(setting, **kwargs):
+    if setting == 'BACKUP_BLOB_STORE':
+        get_blob_store.cache_clear()
+
+
+setting_changed.connect(_reset_blob_store)
+
+__all__ = ['BlobNotFound', 'BlobStore', 'get_blob_store']
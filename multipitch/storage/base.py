@@ -0,0 +1,43 @@
+class BlobNotFound(Exception):
+    pass
+
+
+class BlobStore:
+    """
+    Interface for backup blob storage backends.
+
+    Blobs are immutable and addressed by string keys; replacing a backup
+    writes a new key and deletes the old one. A backend only has to
+    implement save, open, delete and exists. open must return a readable,
+    seekable binary file object; iter_range is built on top of it and may
+    be overridden by backends that support ranged reads natively.
+    """
+
+    def save(self, key, fileobj):
+        """Store the contents of a readable file object under `key`."""
+        raise NotImplementedError
+
+    def open(self, key):
+        """Open `key` for reading. Raises BlobNotFound."""
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Delete `key`; deleting a missing key is not an error."""
+        raise NotImplementedError
+
+    def exists(self, key):
+        raise NotImplementedError
+
+    def iter_range(self, key, start, end, chunk_size):
+        """Yield the bytes of `key` from `start` to `end` (inclusive, None for EOF) in chunks."""
+        with self.open(key) as blob:
+            blob.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                size = chunk_size if remaining is None else min(chunk_size, remaining)
+                chunk = blob.read(size)
+                if not chunk:
+                    return
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
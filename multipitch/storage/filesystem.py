@@ -0,0 +1,52 @@
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from multipitch.storage.base import BlobNotFound, BlobStore
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+class FileSystemBlobStore(BlobStore):
+    """
+    Stores each blob as a file under `root`, using the key as relative path.
+    Writes go to a temporary file in the target directory and are renamed
+    into place, so readers never observe a partially written blob.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def path(self, key):
+        path = (self.root / key).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f"Invalid blob key: {key!r}")
+        return path
+
+    def save(self, key, fileobj):
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as target:
+                shutil.copyfileobj(fileobj, target, COPY_BUFFER_SIZE)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def open(self, key):
+        try:
+            return open(self.path(key), 'rb')
+        except FileNotFoundError:
+            raise BlobNotFound(key)
+
+    def delete(self, key):
+        try:
+            os.unlink(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def exists(self, key):
+        return self.path(key).is_file()
@@ -0,0 +1,104 @@
+"""
+Per-endpoint performance budgets, enforced by test_budgets.
+
+Each endpoint, keyed by URL name (plus ":method" where one URL serves
+several hot methods), may run at most `queries` SQL queries,
+allocate at most `allocated_bytes` at peak (tracemalloc) and take at most
+`wall_ms` per request. Query counts are exact for the scenario in
+test_budgets, so any new query fails the test; raise a budget only
+together with the change that justifies it. Wall times are loose bounds
+that catch order-of-magnitude slowdowns without flaking on slow CI.
+"""
+import time
+import tracemalloc
+from collections import namedtuple
+from contextlib import contextmanager
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+Budget = namedtuple('Budget', 'queries allocated_bytes wall_ms')
+
+KB = 1024
+MB = 1024 * KB
+
+# Backup endpoints are measured with 1MB device databases. Byte budgets
+# leave room for first-call imports, since test order is not fixed.
+BUDGETS = {
+    'signup': Budget(4, 3 * MB, 3000),
+    'login': Budget(2, 768 * KB, 3000),
+    'me': Budget(1, 512 * KB, 500),
+    'token-refresh': Budget(1, 512 * KB, 500),
+    'backup-upload': Budget(11, 5 * MB, 1000),
+    # Base64 JSON holds the whole backup in memory, several times over.
+    'backup-download': Budget(2, 7 * MB, 1000),
+    'backup-download-raw': Budget(2, 3 * MB, 1000),
+    'upload-session-create': Budget(3, 512 * KB, 500),
+    'upload-session-detail': Budget(1, 512 * KB, 500),
+    'upload-session-chunk': Budget(1, 2 * MB, 500),
+    'upload-session-commit': Budget(15, 3 * MB, 1000),
+    'backup-delta-compare': Budget(2, 3584 * KB, 1000),
+    'backup-delta-pages': Budget(2, 3584 * KB, 1000),
+    'backup-delta-apply': Budget(12, 3584 * KB, 1000),
+    'backup-versions': Budget(3, 512 * KB, 500),
+    'backup-version-restore': Budget(14, 3584 * KB, 1000),
+    'backup-index': Budget(3, 512 * KB, 500),
+    'backup-index-routes': Budget(2, 1 * MB, 500),
+    'backup-index-pitches': Budget(2, 1 * MB, 500),
+    'backup-index-climbs': Budget(2, 1 * MB, 500),
+    'backup-index-logs': Budget(2, 1 * MB, 500),
+    'sync-changes': Budget(2, 1536 * KB, 500),
+    'sync-changes:post': Budget(7, 2 * MB, 1000),
+    'metrics': Budget(0, 512 * KB, 500),
+    'async-login': Budget(2, 768 * KB, 3000),
+    'async-me': Budget(1, 512 * KB, 500),
+    'async-backup-upload': Budget(10, 5 * MB, 1000),
+    'async-backup-download': Budget(1, 7 * MB, 1000),
+    'async-backup-download-raw': Budget(1, 3 * MB, 1000),
+    'async-backup-changes': Budget(1, 512 * KB, 500),
+}
+
+
+class Measurement:
+    queries = allocated_bytes = wall_ms = None
+    captured = ()
+
+
+@contextmanager
+def measure():
+    """Measure the SQL queries, peak allocation and wall time of the block."""
+    measurement = Measurement()
+    already_tracing = tracemalloc.is_tracing()
+    if already_tracing:
+        tracemalloc.reset_peak()
+    else:
+        tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            yield measurement
+            measurement.wall_ms = (time.perf_counter() - started) * 1000
+        measurement.allocated_bytes = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        if not already_tracing:
+            tracemalloc.stop()
+    measurement.queries = len(queries)
+    measurement.captured = queries.captured_queries
+
+
+class BudgetAssertionsMixin:
+    @contextmanager
+    def assertWithinBudget(self, name):
+        budget = BUDGETS[name]
+        with measure() as measurement:
+            yield measurement
+        problems = []
+        if measurement.queries > budget.queries:
+            statements = '\n'.join(f"  {query['sql']}" for query in measurement.captured)
+            problems.append(f"{measurement.queries} queries (budget {budget.queries}):\n{statements}")
+        if measurement.allocated_bytes > budget.allocated_bytes:
+            problems.append(f"{measurement.allocated_bytes} bytes allocated (budget {budget.allocated_bytes})")
+        if measurement.wall_ms > budget.wall_ms:
+            problems.append(f"{measurement.wall_ms:.0f}ms (budget {budget.wall_ms}ms)")
+        if problems:
+            self.fail(f"{name} is over budget: " + '; '.join(problems))
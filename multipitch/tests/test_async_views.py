@@ -0,0 +1,154 @@
+import asyncio
+import base64
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from multipitch.models import UserBackup
+from multipitch.services.backup_service import read_backup
+from multipitch.throttling import ScopedTokenBucketThrottle
+from multipitch.tokens import VersionedRefreshToken
+
+User = get_user_model()
+
+
+async def read_streaming(response):
+    return b''.join([chunk async for chunk in response.streaming_content])
+
+
+class AsyncAuthViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='asyncuser',
+            email='async@example.com',
+            password='StrongPass123!'
+        )
+        self.access = str(VersionedRefreshToken.for_user(self.user).access_token)
+
+    async def test_login_success(self):
+        response = await self.async_client.post(
+            reverse('async-login'),
+            {'email': 'async@example.com', 'password': 'StrongPass123!'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['user']['email'], 'async@example.com')
+        self.assertIn('access', data)
+        self.assertIn('refresh', data)
+
+    async def test_login_wrong_password(self):
+        response = await self.async_client.post(
+            reverse('async-login'),
+            {'email': 'async@example.com', 'password': 'wrong'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {'non_field_errors': ['Invalid email or password.']})
+
+    async def test_login_missing_fields(self):
+        response = await self.async_client.post(reverse('async-login'), {}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('email', response.json())
+
+    async def test_me(self):
+        response = await self.async_client.get(reverse('async-me'), headers={'Authorization': f'Bearer {self.access}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['user']['username'], 'asyncuser')
+        self.assertEqual(response.json()['access'], self.access)
+
+    async def test_me_unauthenticated(self):
+        response = await self.async_client.get(reverse('async-me'))
+        self.assertEqual(response.json(), {'user': None})
+
+    async def test_me_invalid_token(self):
+        response = await self.async_client.get(reverse('async-me'), headers={'Authorization': 'Bearer invalid'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn('WWW-Authenticate', response)
+
+
+@override_settings(BACKUP_DOWNLOAD_CHUNK_SIZE=1000)
+class AsyncBackupViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='asyncbackup',
+            email='asyncbackup@example.com',
+            password='StrongPass123!'
+        )
+        access = VersionedRefreshToken.for_user(self.user).access_token
+        self.headers = {'Authorization': f'Bearer {access}'}
+        self.blob = b'pitch 1, 5.10a, 30m\n' * 500
+
+    async def test_raw_upload_and_stream(self):
+        response = await self.async_client.post(
+            reverse('async-backup-upload'), self.blob,
+            content_type='application/octet-stream', headers=self.headers
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.json()['changed'])
+        etag = response['ETag']
+
+        response = await self.async_client.get(reverse('async-backup-download-raw'), headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(await read_streaming(response), self.blob)
+
+        response = await self.async_client.get(
+            reverse('async-backup-download-raw'), headers={**self.headers, 'If-None-Match': etag}
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    async def test_json_upload_and_download(self):
+        payload = {'sqlite_blob': base64.b64encode(self.blob).decode()}
+        response = await self.async_client.post(
+            reverse('async-backup-upload'), payload, content_type='application/json', headers=self.headers
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        backup = await UserBackup.objects.aget(user=self.user)
+        self.assertEqual(read_backup(backup), self.blob)
+
+        response = await self.async_client.get(reverse('async-backup-download'), headers=self.headers)
+        self.assertEqual(base64.b64decode(response.json()['sqlite_blob']), self.blob)
+
+    async def test_json_upload_rejects_empty_blob(self):
+        response = await self.async_client.post(
+            reverse('async-backup-upload'), {'sqlite_blob': ''},
+            content_type='application/json', headers=self.headers
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('sqlite_blob', response.json())
+
+    async def test_throttle_runs_off_the_event_loop(self):
+        loops = []
+
+        def allow_request(throttle, request, view):
+            try:
+                loops.append(asyncio.get_running_loop())
+            except RuntimeError:
+                loops.append(None)
+            return True
+
+        with mock.patch.object(ScopedTokenBucketThrottle, 'allow_request', allow_request):
+            response = await self.async_client.get(reverse('async-backup-download-raw'), headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(loops, [None])
+
+    async def test_stream_range(self):
+        await self.async_client.post(
+            reverse('async-backup-upload'), self.blob,
+            content_type='application/octet-stream', headers=self.headers
+        )
+        response = await self.async_client.get(
+            reverse('async-backup-download-raw'), headers={**self.headers, 'Range': 'bytes=100-2599'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(await read_streaming(response), self.blob[100:2600])
+
+    async def test_download_without_backup(self):
+        response = await self.async_client.get(reverse('async-backup-download-raw'), headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.get(reverse('async-backup-download-raw'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -2,7 +2,9 @@
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
-from rest_framework_simplejwt.tokens import RefreshToken
+from datetime import timedelta
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -141,8 +143,9 @@ class MeViewTests(APITestCase):
         self.access_token = str(self.refresh.access_token)
     
     def test_me_authenticated(self):
-        """Authenticated user receives user data and a refreshed access token"""
+        """Authenticated user receives user data and their still-fresh access token"""
         self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+        outstanding = OutstandingToken.objects.count()
         response = self.client.get(self.url, format='json')
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -150,7 +153,24 @@ class MeViewTests(APITestCase):
         self.assertIn('access', response.data)
         self.assertEqual(response.data['user']['username'], self.user.username)
         self.assertEqual(response.data['user']['email'], self.user.email)
-        self.assertNotEqual(response.data['access'], self.access_token)  # new token issued
+        self.assertEqual(response.data['access'], self.access_token)  # not near expiry
+        self.assertEqual(OutstandingToken.objects.count(), outstanding)
+
+    def test_me_renews_token_near_expiry(self):
+        """A token about to expire is swapped for a new one without a database write"""
+        access = self.refresh.access_token
+        access.set_exp(lifetime=timedelta(days=1))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        outstanding = OutstandingToken.objects.count()
+        response = self.client.get(self.url, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.data['access'], str(access))  # new token issued
+        self.assertEqual(OutstandingToken.objects.count(), outstanding)
+
+        renewed = AccessToken(response.data['access'])
+        self.assertEqual(renewed['user_id'], str(self.user.id))
+        self.assertGreater(renewed['exp'], access['exp'])
 
     def test_me_unauthenticated(self):
         """Unauthenticated request returns user as None"""
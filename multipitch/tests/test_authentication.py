@@ -0,0 +1,111 @@
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hasher
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from multipitch.tokens import TOKEN_VERSION_CLAIM, VersionedRefreshToken
+from multipitch.user_cache import UserCache, get_user_cache
+
+User = get_user_model()
+
+
+class UserCacheTests(SimpleTestCase):
+    def test_get_requires_matching_token_version(self):
+        cache = UserCache(max_size=10, ttl=60)
+        cache.set(1, 3, 'user')
+        self.assertEqual(cache.get('1', 3), 'user')
+        self.assertIsNone(cache.get(1, 4))
+        self.assertEqual(len(cache), 0)
+
+    def test_evicts_least_recently_used(self):
+        cache = UserCache(max_size=2, ttl=60)
+        cache.set(1, 0, 'a')
+        cache.set(2, 0, 'b')
+        cache.get(1, 0)
+        cache.set(3, 0, 'c')
+        self.assertEqual(cache.get(1, 0), 'a')
+        self.assertIsNone(cache.get(2, 0))
+        self.assertEqual(cache.get(3, 0), 'c')
+
+    def test_entries_expire(self):
+        cache = UserCache(max_size=10, ttl=60)
+        with mock.patch('multipitch.user_cache.time.monotonic', return_value=100):
+            cache.set(1, 0, 'a')
+        with mock.patch('multipitch.user_cache.time.monotonic', return_value=161):
+            self.assertIsNone(cache.get(1, 0))
+
+    def test_zero_size_disables_cache(self):
+        cache = UserCache(max_size=0, ttl=60)
+        cache.set(1, 0, 'a')
+        self.assertIsNone(cache.get(1, 0))
+
+
+class CachedJWTAuthenticationTests(APITestCase):
+    # Authenticated requests reach the view, which finds no backup.
+    def setUp(self):
+        get_user_cache().clear()
+        self.url = reverse('backup-download')
+        self.user = User.objects.create_user(
+            username='cacheuser',
+            email='cache@example.com',
+            password='StrongPass123!'
+        )
+        self.access = str(VersionedRefreshToken.for_user(self.user).access_token)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+
+    def test_repeated_requests_skip_user_lookup(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(1):  # the backup lookup only
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_password_change_revokes_tokens(self):
+        self.client.get(self.url)
+        self.user.set_password('OtherPass456!')
+        self.user.save()
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        access = str(VersionedRefreshToken.for_user(self.user).access_token)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_deactivation_is_seen_immediately(self):
+        self.client.get(self.url)
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_tokens_without_version_claim_match_version_zero(self):
+        token = RefreshToken.for_user(self.user).access_token
+        self.assertNotIn(TOKEN_VERSION_CLAIM, token)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(JWT_USER_CACHE={'MAX_SIZE': 0, 'TTL': 60})
+    def test_disabled_cache_loads_user_every_time(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+
+
+class TokenVersionTests(APITestCase):
+    def test_hash_upgrade_keeps_token_version(self):
+        user = User.objects.create_user(username='u', email='u@example.com', password='StrongPass123!')
+        self.assertEqual(user.token_version, 0)
+        with mock.patch.object(type(get_hasher()), 'must_update', return_value=True):
+            self.assertTrue(user.check_password('StrongPass123!'))
+        user.refresh_from_db()
+        self.assertEqual(user.token_version, 0)
+
+    def test_set_password_with_update_fields_bumps_version(self):
+        user = User.objects.create_user(username='u', email='u@example.com', password='StrongPass123!')
+        user.set_password('OtherPass456!')
+        user.save(update_fields=['password'])
+        user.refresh_from_db()
+        self.assertEqual(user.token_version, 1)
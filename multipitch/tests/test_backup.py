@@ -1,9 +1,14 @@
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.contrib.auth import get_user_model
 from multipitch.models import UserBackup
+from multipitch.services.backup_service import read_backup
 import base64
+import hashlib
+import gzip
+import os
 
 User = get_user_model()
 
@@ -41,6 +46,13 @@ class BackupUploadViewTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('sqlite_blob', response.data)
 
+    def test_upload_invalid_base64(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(self.url, {'sqlite_blob': 'QUJDR'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'sqlite_blob': ['Invalid Base64 data.']})
+        self.assertFalse(UserBackup.objects.filter(user=self.user).exists())
+
     def test_upload_unauthenticated(self):
         response = self.client.post(self.url, self.valid_payload, format='json')
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -77,3 +89,245 @@ class BackupRetrieveViewTests(APITestCase):
     def test_retrieve_unauthenticated(self):
         response = self.client.get(self.url)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class BackupRawUploadViewTests(APITestCase):
+    def setUp(self):
+        self.url = reverse('backup-upload')
+        self.user = User.objects.create_user(
+            username='rawuser',
+            email='raw@example.com',
+            password='StrongPass123!'
+        )
+        self.blob = bytes(range(256)) * 1024
+
+    def test_raw_upload_octet_stream(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(self.url, self.blob, content_type='application/octet-stream')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('last_sync', response.data)
+        backup = UserBackup.objects.get(user=self.user)
+        self.assertEqual(read_backup(backup), self.blob)
+
+    def test_raw_upload_sqlite_media_type(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(self.url, self.blob, content_type='application/x-sqlite3')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(read_backup(UserBackup.objects.get(user=self.user)), self.blob)
+
+    def test_raw_upload_overwrite(self):
+        UserBackup.objects.create(user=self.user, sqlite_blob=b'old data')
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(self.url, b'new data', content_type='application/octet-stream')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(read_backup(UserBackup.objects.get(user=self.user)), b'new data')
+
+    def test_raw_upload_empty_body(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(self.url, b'', content_type='application/octet-stream')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('sqlite_blob', response.data)
+
+    def test_raw_upload_unauthenticated(self):
+        response = self.client.post(self.url, self.blob, content_type='application/octet-stream')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(BACKUP_DOWNLOAD_CHUNK_SIZE=1000)
+class BackupStreamViewTests(APITestCase):
+    def setUp(self):
+        self.url = reverse('backup-download-raw')
+        self.user = User.objects.create_user(
+            username='streamuser',
+            email='stream@example.com',
+            password='StrongPass123!'
+        )
+        self.blob = bytes(range(256)) * 20
+        UserBackup.objects.create(user=self.user, sqlite_blob=self.blob)
+        self.client.force_authenticate(user=self.user)
+
+    def test_stream_full_backup(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Length'], str(len(self.blob)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(b''.join(response.streaming_content), self.blob)
+
+    def test_stream_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=900-2099')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response['Content-Range'], f'bytes 900-2099/{len(self.blob)}')
+        self.assertEqual(response['Content-Length'], '1200')
+        self.assertEqual(b''.join(response.streaming_content), self.blob[900:2100])
+
+    def test_stream_open_ended_and_suffix_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=5000-')
+        self.assertEqual(b''.join(response.streaming_content), self.blob[5000:])
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.blob[-10:])
+
+    def test_stream_unsatisfiable_range(self):
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.blob)}-')
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.blob)}')
+
+    def test_stream_stale_if_range_returns_full_body(self):
+        response = self.client.get(
+            self.url,
+            HTTP_RANGE='bytes=0-9',
+            HTTP_IF_RANGE='Wed, 21 Oct 2015 07:28:00 GMT'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), self.blob)
+
+    def test_stream_no_backup(self):
+        UserBackup.objects.filter(user=self.user).delete()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_stream_unauthenticated(self):
+        self.client.force_authenticate(user=None)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(BACKUP_DOWNLOAD_CHUNK_SIZE=1000, BACKUP_STORAGE_CODEC='gzip')
+class BackupCompressionTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='gzipuser',
+            email='gzip@example.com',
+            password='StrongPass123!'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.blob = b'pitch 1, 5.10a, 30m\n' * 5000
+
+    def _upload(self, blob):
+        response = self.client.post(reverse('backup-upload'), blob, content_type='application/octet-stream')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return UserBackup.objects.get(user=self.user)
+
+    def test_compressible_backup_is_stored_gzipped(self):
+        backup = self._upload(self.blob)
+        self.assertEqual(backup.codec, 'gzip')
+        self.assertEqual(backup.original_size, len(self.blob))
+        self.assertLess(backup.stored_size, len(self.blob))
+        self.assertEqual(read_backup(backup), self.blob)
+
+    def test_incompressible_backup_is_stored_as_is(self):
+        blob = os.urandom(4096)
+        backup = self._upload(blob)
+        self.assertEqual(backup.codec, 'identity')
+        self.assertEqual(bytes(backup.sqlite_blob), blob)
+
+    def test_download_decodes_without_accept_encoding(self):
+        self._upload(self.blob)
+        response = self.client.get(reverse('backup-download-raw'))
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response['Content-Length'], str(len(self.blob)))
+        self.assertEqual(b''.join(response.streaming_content), self.blob)
+
+    def test_download_passes_gzip_through(self):
+        backup = self._upload(self.blob)
+        response = self.client.get(reverse('backup-download-raw'), HTTP_ACCEPT_ENCODING='br, gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        body = b''.join(response.streaming_content)
+        self.assertEqual(len(body), backup.stored_size)
+        self.assertEqual(gzip.decompress(body), self.blob)
+
+    def test_download_refuses_gzip_with_zero_quality(self):
+        self._upload(self.blob)
+        response = self.client.get(reverse('backup-download-raw'), HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_range_over_decoded_backup(self):
+        self._upload(self.blob)
+        response = self.client.get(reverse('backup-download-raw'), HTTP_RANGE='bytes=45000-54999')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(response.streaming_content), self.blob[45000:55000])
+
+    def test_range_does_not_resume_across_encodings(self):
+        backup = self._upload(self.blob)
+        url = reverse('backup-download-raw')
+        gzip_etag = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')['ETag']
+        self.assertEqual(gzip_etag, f'"{backup.sha256}-gzip"')
+        self.assertEqual(self.client.get(url)['ETag'], backup.etag)
+
+        response = self.client.get(url, HTTP_RANGE='bytes=100-199', HTTP_IF_RANGE=gzip_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), self.blob)
+
+        response = self.client.get(
+            url, HTTP_ACCEPT_ENCODING='gzip', HTTP_RANGE='bytes=100-199', HTTP_IF_RANGE=backup.etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+        response = self.client.get(
+            url, HTTP_ACCEPT_ENCODING='gzip', HTTP_RANGE='bytes=100-199', HTTP_IF_RANGE=gzip_etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+
+    def test_if_none_match_accepts_either_encoding(self):
+        backup = self._upload(self.blob)
+        response = self.client.get(reverse('backup-download-raw'), HTTP_IF_NONE_MATCH=f'"{backup.sha256}-gzip"')
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], backup.etag)
+
+    def test_json_download_decodes(self):
+        self._upload(self.blob)
+        response = self.client.get(reverse('backup-download'))
+        self.assertEqual(base64.b64decode(response.data['sqlite_blob']), self.blob)
+
+
+class BackupConditionalTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='etaguser',
+            email='etag@example.com',
+            password='StrongPass123!'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.blob = b'some binary data'
+        self.backup = UserBackup.objects.create(user=self.user, sqlite_blob=self.blob)
+        self.etag = f'"{hashlib.sha256(self.blob).hexdigest()}"'
+
+    def _upload(self, blob, **headers):
+        return self.client.post(reverse('backup-upload'), blob, content_type='application/octet-stream', **headers)
+
+    def test_downloads_return_etag(self):
+        self.assertEqual(self.client.get(reverse('backup-download'))['ETag'], self.etag)
+        self.assertEqual(self.client.get(reverse('backup-download-raw'))['ETag'], self.etag)
+
+    def test_if_none_match_returns_not_modified(self):
+        for name in ('backup-download', 'backup-download-raw'):
+            response = self.client.get(reverse(name), HTTP_IF_NONE_MATCH=self.etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(response['ETag'], self.etag)
+
+    def test_if_none_match_with_stale_etag_returns_backup(self):
+        response = self.client.get(reverse('backup-download'), HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_identical_upload_is_noop(self):
+        last_sync = self.backup.last_sync
+        response = self._upload(self.blob)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['changed'])
+        self.assertEqual(UserBackup.objects.get(user=self.user).last_sync, last_sync)
+
+    def test_if_match_allows_update(self):
+        response = self._upload(b'new data', HTTP_IF_MATCH=self.etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['changed'])
+        self.assertEqual(response['ETag'], f'"{hashlib.sha256(b"new data").hexdigest()}"')
+
+    def test_if_match_mismatch_prevents_lost_update(self):
+        response = self._upload(b'new data', HTTP_IF_MATCH='"stale"')
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(read_backup(UserBackup.objects.get(user=self.user)), self.blob)
+
+    def test_if_match_without_backup_fails(self):
+        self.backup.delete()
+        response = self._upload(b'new data', HTTP_IF_MATCH='*')
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
@@ -0,0 +1,112 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.test import LiveServerTestCase, SimpleTestCase, override_settings
+from multipitch.benchmark import Benchmark, compare, make_payload, parse_size, percentile
+
+
+class BenchmarkHelperTests(SimpleTestCase):
+    def test_parse_size(self):
+        self.assertEqual(parse_size('100KB'), 100_000)
+        self.assertEqual(parse_size('2MiB'), 2 * 1024 * 1024)
+        self.assertEqual(parse_size('512'), 512)
+        with self.assertRaises(ValueError):
+            parse_size('10 parsecs')
+
+    def test_percentile_uses_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.50), 50)
+        self.assertEqual(percentile(values, 0.95), 95)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([7], 0.99), 7)
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_payload_is_deterministic(self):
+        self.assertEqual(len(make_payload(100_000)), 100_000)
+        self.assertEqual(make_payload(5000, seed=1), make_payload(5000, seed=1))
+        self.assertNotEqual(make_payload(5000, seed=1), make_payload(5000, seed=2))
+
+    def test_compare_flags_regressions_beyond_threshold(self):
+        baseline = {'results': {
+            'me': {'p95_ms': 10.0, 'rps': 100.0, 'errors': 0},
+            'login': {'p95_ms': 10.0, 'rps': 100.0, 'errors': 0},
+        }}
+        current = {'results': {
+            'me': {'p95_ms': 10.5, 'rps': 95.0, 'errors': 0},
+            'login': {'p95_ms': 12.0, 'rps': 80.0, 'errors': 1},
+            'signup': {'p95_ms': 99.0, 'rps': 1.0, 'errors': 0},
+        }}
+        self.assertEqual(compare(baseline, current, 0.10), [
+            ('login', 'p95_ms', 10.0, 12.0),
+            ('login', 'rps', 100.0, 80.0),
+            ('login', 'errors', 0, 1),
+        ])
+
+
+@override_settings(METRICS={'MULTIPROCESS_DIR': None, 'FLUSH_INTERVAL': 5, 'AUTH_TOKEN': 'scrape'})
+class BenchmarkLiveServerTests(LiveServerTestCase):
+    def test_runs_every_scenario(self):
+        benchmark = Benchmark(self.live_server_url, requests=2, blob_requests=2,
+                              concurrency=1, sizes=['10KB'], metrics_token='scrape')
+        results = benchmark.run()
+
+        self.assertEqual(
+            set(results),
+            {'signup', 'login', 'refresh', 'me', 'upload:10KB', 'download:10KB'},
+        )
+        for name, result in results.items():
+            self.assertEqual(result['errors'], 0, name)
+            self.assertEqual(result['count'], 2)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        self.assertGreater(results['login']['db_queries_per_request'], 0)
+
+    def test_command_fails_on_regression(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        baseline = os.path.join(directory, 'baseline.json')
+        with open(baseline, 'w') as f:
+            json.dump({'results': {'me': {'p95_ms': 0.001, 'rps': 1e9, 'errors': 0}}}, f)
+
+        with self.assertRaises(CommandError):
+            call_command(
+                'benchmark', base_url=self.live_server_url, scenarios='me', requests=2,
+                concurrency=1, compare=baseline, output=os.path.join(directory, 'report.json'),
+                stdout=StringIO(), stderr=StringIO(),
+            )
+        with open(os.path.join(directory, 'report.json')) as f:
+            report = json.load(f)
+        self.assertEqual(report['results']['me']['count'], 2)
+
+
+class BenchmarkServeTests(SimpleTestCase):
+    def test_serve_uses_a_throwaway_database(self):
+        real_db = settings.BASE_DIR / 'db.sqlite3'
+        before = real_db.stat().st_mtime if real_db.exists() else None
+        data_dirs = []
+        real_mkdtemp = tempfile.mkdtemp
+
+        def mkdtemp(**kwargs):
+            data_dirs.append(real_mkdtemp(**kwargs))
+            return data_dirs[-1]
+
+        directory = real_mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        output = os.path.join(directory, 'report.json')
+        with mock.patch('tempfile.mkdtemp', mkdtemp):
+            call_command(
+                'benchmark', serve=True, scenarios='signup,me', requests=2, concurrency=1,
+                output=output, stdout=StringIO(),
+            )
+
+        with open(output) as f:
+            report = json.load(f)
+        self.assertEqual(report['results']['signup']['errors'], 0)
+        self.assertGreater(report['results']['me']['db_queries_per_request'], 0)
+        [data_dir] = data_dirs
+        self.assertFalse(os.path.exists(data_dir))
+        self.assertEqual(real_db.stat().st_mtime if real_db.exists() else None, before)
@@ -0,0 +1,326 @@
+import base64
+import hashlib
+import io
+import time
+from functools import lru_cache
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.validators import validate_email
+from django.test import TestCase, override_settings
+from django.urls import get_resolver, reverse
+from rest_framework import status
+from multipitch import dataset, delta
+from multipitch.models import BackupVersion
+from multipitch.services.backup_service import save_backup
+from multipitch.services.index_service import index_backup
+from multipitch.services.sync_service import push_changes
+from multipitch.tests.test_async_views import read_streaming
+from multipitch.tests.budgets import BUDGETS, BudgetAssertionsMixin
+from multipitch.tokens import VersionedRefreshToken
+from multipitch.user_cache import get_user_cache
+
+User = get_user_model()
+
+
+@lru_cache
+def device_backups():
+    """Two successive 1MB device databases, shared by every test."""
+    return list(dataset.generate_versions(1024 * 1024, 2, fraction=0.05, seed='budgets'))
+
+
+def page_hashes(data, page_size=4096):
+    return [delta.page_hash(page) for page in delta.iter_pages([data], page_size)]
+
+
+class BudgetCoverageTests(TestCase):
+    def test_every_view_has_a_budget(self):
+        names = {
+            pattern.name for pattern in get_resolver().url_patterns
+            if getattr(pattern, 'name', None) and pattern.callback.__module__.startswith('multipitch.views')
+        }
+        budgeted = {name.split(':')[0] for name in BUDGETS}
+        self.assertEqual(names - budgeted, set())
+        self.assertEqual(budgeted - names, set())
+
+
+class EndpointBudgetTests(BudgetAssertionsMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Django compiles its email regexes on first use, which takes most of
+        # a second under tracemalloc; keep that out of whichever test is first.
+        validate_email('budget@example.com')
+
+    def setUp(self):
+        get_user_cache().clear()
+        self.user = User.objects.create_user(
+            username='budgetuser', email='budget@example.com', password='StrongPass123!'
+        )
+        self.refresh = VersionedRefreshToken.for_user(self.user)
+        self.headers = {'Authorization': f'Bearer {self.refresh.access_token}'}
+        self.first, self.second = device_backups()
+
+    def _with_backup(self, *blobs):
+        for blob in blobs or (self.first,):
+            save_backup(self.user, io.BytesIO(blob))
+
+    def _session(self):
+        response = self.client.post(reverse('upload-session-create'), headers=self.headers)
+        return response.data['session_id']
+
+    # Auth
+
+    def test_signup(self):
+        with self.assertWithinBudget('signup'):
+            response = self.client.post(reverse('signup'), {
+                'username': 'new', 'email': 'new@example.com', 'password': 'StrongPass123!',
+            }, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_login(self):
+        with self.assertWithinBudget('login'):
+            response = self.client.post(reverse('login'), {
+                'email': 'budget@example.com', 'password': 'StrongPass123!',
+            }, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_me(self):
+        with self.assertWithinBudget('me'):
+            response = self.client.get(reverse('me'), headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_token_refresh(self):
+        with self.assertWithinBudget('token-refresh'):
+            response = self.client.post(
+                reverse('token-refresh'), {'refresh': str(self.refresh)}, content_type='application/json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    # Backups
+
+    def test_backup_upload(self):
+        self._with_backup()
+        with self.assertWithinBudget('backup-upload'):
+            response = self.client.post(
+                reverse('backup-upload'), self.second,
+                content_type='application/octet-stream', headers=self.headers,
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_backup_download(self):
+        self._with_backup()
+        with self.assertWithinBudget('backup-download'):
+            response = self.client.get(reverse('backup-download'), headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_backup_download_raw(self):
+        self._with_backup()
+        with self.assertWithinBudget('backup-download-raw'):
+            response = self.client.get(reverse('backup-download-raw'), headers=self.headers)
+            size = sum(len(chunk) for chunk in response.streaming_content)
+        self.assertEqual(size, len(self.first))
+
+    # Resumable uploads
+
+    def test_upload_session_create(self):
+        with self.assertWithinBudget('upload-session-create'):
+            response = self.client.post(reverse('upload-session-create'), headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_upload_session_detail(self):
+        session_id = self._session()
+        with self.assertWithinBudget('upload-session-detail'):
+            response = self.client.get(reverse('upload-session-detail', args=[session_id]), headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_upload_session_chunk(self):
+        session_id = self._session()
+        with self.assertWithinBudget('upload-session-chunk'):
+            response = self.client.put(
+                reverse('upload-session-chunk', args=[session_id, 0]), self.first,
+                content_type='application/octet-stream', headers=self.headers,
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_upload_session_commit(self):
+        self._with_backup()
+        session_id = self._session()
+        self.client.put(
+            reverse('upload-session-chunk', args=[session_id, 0]), self.second,
+            content_type='application/octet-stream', headers=self.headers,
+        )
+        with self.assertWithinBudget('upload-session-commit'):
+            response = self.client.post(
+                reverse('upload-session-commit', args=[session_id]),
+                {'chunk_count': 1, 'sha256': hashlib.sha256(self.second).hexdigest()},
+                content_type='application/json', headers=self.headers,
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    # Delta sync
+
+    def test_delta_compare(self):
+        self._with_backup()
+        with self.assertWithinBudget('backup-delta-compare'):
+            response = self.client.post(
+                reverse('backup-delta-compare'), {'page_size': 4096, 'hashes': page_hashes(self.second)},
+                content_type='application/json', headers=self.headers,
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_delta_pages(self):
+        self._with_backup()
+        base = hashlib.sha256(self.first).hexdigest()
+        with self.assertWithinBudget('backup-delta-pages'):
+            response = self.client.post(
+                reverse('backup-delta-pages'), {'base': base, 'pages': list(range(0, 256, 4))},
+                content_type='application/json', headers=self.headers,
+            )
+            frames = b''.join(response.streaming_content)
+        self.assertEqual(len(frames), 64 * (4096 + delta.FRAME_HEADER.size))
+
+    def test_delta_apply(self):
+        self._with_backup()
+        changed = delta.changed_pages(page_hashes(self.first), page_hashes(self.second))
+        frames = b''.join(
+            delta.encode_frame(index, self.second[index * 4096:(index + 1) * 4096]) for index in changed
+        )
+        query = (f"?base={hashlib.sha256(self.first).hexdigest()}&page_size=4096&size={len(self.second)}"
+                 f"&sha256={hashlib.sha256(self.second).hexdigest()}")
+        with self.assertWithinBudget('backup-delta-apply'):
+            response = self.client.post(
+                reverse('backup-delta-apply') + query, frames,
+                content_type='application/octet-stream', headers=self.headers,
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    # Versions
+
+    def test_backup_versions(self):
+        self._with_backup(self.first, self.second)
+        with self.assertWithinBudget('backup-versions'):
+            response = self.client.get(reverse('backup-versions'), headers=self.headers)
+        self.assertEqual(len(response.data['versions']), 1)
+
+    def test_backup_version_restore(self):
+        self._with_backup(self.first, self.second)
+        with self.assertWithinBudget('backup-version-restore'):
+            response = self.client.post(reverse('backup-version-restore', args=[1]), headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(BackupVersion.objects.filter(user=self.user).count(), 2)
+
+    # Backup index
+
+    def _indexed(self):
+        self._with_backup()
+        index_backup(self.user.pk)
+
+    def test_backup_index(self):
+        self._indexed()
+        with self.assertWithinBudget('backup-index'):
+            response = self.client.get(reverse('backup-index'), headers=self.headers)
+        self.assertTrue(response.data['up_to_date'])
+
+    def test_backup_index_routes(self):
+        self._indexed()
+        with self.assertWithinBudget('backup-index-routes'):
+            response = self.client.get(reverse('backup-index-routes'), headers=self.headers)
+        self.assertEqual(len(response.data['results']), 50)
+
+    def test_backup_index_pitches(self):
+        self._indexed()
+        with self.assertWithinBudget('backup-index-pitches'):
+            response = self.client.get(reverse('backup-index-pitches', args=[1]), headers=self.headers)
+        self.assertGreater(len(response.data), 0)
+
+    def test_backup_index_climbs(self):
+        self._indexed()
+        with self.assertWithinBudget('backup-index-climbs'):
+            response = self.client.get(reverse('backup-index-climbs'), headers=self.headers)
+        self.assertEqual(len(response.data['results']), 50)
+
+    def test_backup_index_logs(self):
+        self._indexed()
+        with self.assertWithinBudget('backup-index-logs'):
+            response = self.client.get(reverse('backup-index-logs'), {'climb': 1}, headers=self.headers)
+        self.assertGreater(len(response.data['results']), 0)
+
+    # Changeset sync
+
+    def _changes(self, count, offset=0):
+        timestamp = int(time.time() * 1000)
+        return [
+            {'table': 'logs', 'id': str(offset + i), 'op': 'upsert', 'timestamp': timestamp,
+             'data': {'id': offset + i, 'event': 'pitch_end', 'note': 'belay at the pine'}}
+            for i in range(count)
+        ]
+
+    def test_sync_pull(self):
+        push_changes(self.user, 'phone', [{**change, 'deleted': False} for change in self._changes(500)])
+        with self.assertWithinBudget('sync-changes'):
+            response = self.client.get(reverse('sync-changes'), {'cursor': 0, 'limit': 200}, headers=self.headers)
+        self.assertEqual(len(response.data['changes']), 200)
+
+    def test_sync_push(self):
+        push_changes(self.user, 'phone', [{**change, 'deleted': False} for change in self._changes(100)])
+        with self.assertWithinBudget('sync-changes:post'):
+            response = self.client.post(reverse('sync-changes'), {
+                'device': 'tablet', 'changes': self._changes(200, offset=50),
+            }, content_type='application/json', headers=self.headers)
+        self.assertEqual(response.data['applied'], 200)
+
+    # Operations
+
+    @override_settings(METRICS={'MULTIPROCESS_DIR': None, 'FLUSH_INTERVAL': 5, 'AUTH_TOKEN': 'scrape'})
+    def test_metrics(self):
+        with self.assertWithinBudget('metrics'):
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    # Async views, driven from sync tests so queries run on the test's connection
+
+    def _async(self, method, *args, **kwargs):
+        return async_to_sync(getattr(self.async_client, method))(*args, **kwargs)
+
+    def _async_upload(self, blob):
+        return self._async(
+            'post', reverse('async-backup-upload'), blob,
+            content_type='application/octet-stream', headers=self.headers,
+        )
+
+    def test_async_login(self):
+        with self.assertWithinBudget('async-login'):
+            response = self._async('post', reverse('async-login'), {
+                'email': 'budget@example.com', 'password': 'StrongPass123!',
+            }, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_async_me(self):
+        with self.assertWithinBudget('async-me'):
+            response = self._async('get', reverse('async-me'), headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_async_backup_upload(self):
+        self._async_upload(self.first)
+        with self.assertWithinBudget('async-backup-upload'):
+            response = self._async_upload(self.second)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_async_backup_download(self):
+        self._async_upload(self.first)
+        with self.assertWithinBudget('async-backup-download'):
+            response = self._async('get', reverse('async-backup-download'), headers=self.headers)
+        self.assertEqual(base64.b64decode(response.json()['sqlite_blob']), self.first)
+
+    def test_async_backup_download_raw(self):
+        self._async_upload(self.first)
+        with self.assertWithinBudget('async-backup-download-raw'):
+            response = self._async('get', reverse('async-backup-download-raw'), headers=self.headers)
+            size = len(async_to_sync(read_streaming)(response))
+        self.assertEqual(size, len(self.first))
+
+    def test_async_backup_changes(self):
+        self._async_upload(self.first)
+        with self.assertWithinBudget('async-backup-changes'):
+            response = self._async('get', reverse('async-backup-changes'), headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
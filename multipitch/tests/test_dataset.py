@@ -0,0 +1,89 @@
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase
+from multipitch import dataset, delta
+from multipitch.models import BackupVersion, UserBackup
+from multipitch.services.backup_service import read_backup
+from multipitch.services.version_service import reconstruct
+
+User = get_user_model()
+
+
+def changed_fraction(old, new, page_size=4096):
+    old_hashes = [delta.page_hash(page) for page in delta.iter_pages([old], page_size)]
+    new_hashes = [delta.page_hash(page) for page in delta.iter_pages([new], page_size)]
+    return len(delta.changed_pages(old_hashes, new_hashes)) / len(new_hashes)
+
+
+class DatasetTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_generates_valid_database_of_target_size(self):
+        path = os.path.join(self.directory, 'device.sqlite3')
+        dataset.generate(path, 300_000, seed=1)
+
+        self.assertGreaterEqual(os.path.getsize(path), 300_000)
+        self.assertLess(os.path.getsize(path), 400_000)
+        conn = sqlite3.connect(path)
+        self.addCleanup(conn.close)
+        self.assertEqual(conn.execute("PRAGMA integrity_check").fetchone()[0], 'ok')
+        for table in ('routes', 'pitches', 'climbs', 'logs'):
+            self.assertGreater(conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0], 0, table)
+
+    def test_generation_is_deterministic(self):
+        self.assertEqual(dataset.generate_bytes(100_000, seed=3), dataset.generate_bytes(100_000, seed=3))
+        self.assertNotEqual(dataset.generate_bytes(100_000, seed=3), dataset.generate_bytes(100_000, seed=4))
+
+    def test_compresses_like_a_real_database(self):
+        data = dataset.generate_bytes(300_000)
+        ratio = len(gzip.compress(data)) / len(data)
+        self.assertGreater(ratio, 0.2)
+        self.assertLess(ratio, 0.6)
+
+    def test_churn_changes_about_the_requested_fraction(self):
+        first, second = dataset.generate_versions(2_000_000, 2, fraction=0.05, seed=1)
+
+        self.assertGreater(len(second), len(first))
+        self.assertGreater(changed_fraction(first, second), 0.02)
+        self.assertLess(changed_fraction(first, second), 0.2)
+
+
+class GenerateBackupsCommandTests(TestCase):
+    def test_seeds_users_with_backups_and_versions(self):
+        call_command('generate_backups', users=3, size='100KB', versions=3, batch_size=2, stdout=StringIO())
+
+        users = User.objects.filter(username__startswith='seed-user-')
+        self.assertEqual(users.count(), 3)
+        self.assertTrue(users.first().check_password('SeedPass123!'))
+        for user in users:
+            backup = UserBackup.objects.get(user=user)
+            self.assertEqual(backup.version, 3)
+            self.assertEqual(backup.codec, 'gzip')
+            self.assertEqual(read_backup(backup)[:16], delta.SQLITE_MAGIC)
+            self.assertEqual(BackupVersion.objects.filter(user=user, is_delta=True).count(), 2)
+
+    def test_writes_the_same_databases_it_seeds(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        call_command('generate_backups', users=1, size='100KB', versions=2, stdout=StringIO())
+        call_command('generate_backups', users=1, size='100KB', versions=2,
+                     output_dir=directory, stdout=StringIO())
+
+        user = User.objects.get(username='seed-user-0')
+        with open(os.path.join(directory, 'device-0-v2.sqlite3'), 'rb') as f:
+            self.assertEqual(read_backup(UserBackup.objects.get(user=user)), f.read())
+        with open(os.path.join(directory, 'device-0-v1.sqlite3'), 'rb') as f, reconstruct(user, 1) as content:
+            self.assertEqual(content.read(), f.read())
+
+    def test_refuses_existing_prefix(self):
+        User.objects.create_user(username='seed-user-0', email='seed@example.com', password='x')
+        with self.assertRaises(CommandError):
+            call_command('generate_backups', users=1, size='100KB', stdout=StringIO())
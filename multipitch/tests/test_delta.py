@@ -0,0 +1,164 @@
+import hashlib
+import os
+import sqlite3
+import tempfile
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.contrib.auth import get_user_model
+from multipitch import delta
+from multipitch.models import UserBackup
+from multipitch.services.backup_service import read_backup
+
+User = get_user_model()
+
+
+def make_sqlite(rows, page_size=1024):
+    fd, path = tempfile.mkstemp(suffix='.sqlite3')
+    os.close(fd)
+    try:
+        conn = sqlite3.connect(path)
+        conn.execute(f"PRAGMA page_size={page_size}")
+        conn.execute("CREATE TABLE logs (id INTEGER PRIMARY KEY, note TEXT)")
+        conn.executemany("INSERT INTO logs (id, note) VALUES (?, ?)", [(i, note) for i, note in rows])
+        conn.commit()
+        conn.close()
+        with open(path, 'rb') as db:
+            return db.read()
+    finally:
+        os.unlink(path)
+
+
+def hashes_of(blob, page_size):
+    return [delta.page_hash(page) for page in delta.iter_pages([blob], page_size)]
+
+
+def frames_of(blob, page_size, indices):
+    pages = list(delta.iter_pages([blob], page_size))
+    return b''.join(delta.encode_frame(i, pages[i]) for i in indices if i < len(pages))
+
+
+def apply_frames(blob, page_size, frames, size):
+    pages = list(delta.iter_pages([blob], page_size))
+    stream = tempfile.TemporaryFile()
+    stream.write(frames)
+    stream.seek(0)
+    for index, page in delta.iter_frames(stream, page_size):
+        while len(pages) <= index:
+            pages.append(b'')
+        pages[index] = page
+    return b''.join(pages)[:size]
+
+
+class DeltaHelperTests(SimpleTestCase):
+    def test_read_page_size_from_header(self):
+        blob = make_sqlite([(1, 'a')], page_size=2048)
+        self.assertEqual(delta.read_page_size(blob[:100]), 2048)
+
+    def test_read_page_size_falls_back_for_non_sqlite(self):
+        self.assertEqual(delta.read_page_size(b'not a database' * 10), delta.DEFAULT_PAGE_SIZE)
+
+
+class DeltaSyncTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='deltauser',
+            email='delta@example.com',
+            password='StrongPass123!'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.rows = [(i, f'pitch {i} ' * 20) for i in range(200)]
+        self.old = make_sqlite(self.rows)
+        self.new = make_sqlite(self.rows[:-1] + [(199, 'changed')])
+        self.page_size = 1024
+
+    def _compare(self, blob):
+        return self.client.post(reverse('backup-delta-compare'), {
+            'page_size': self.page_size,
+            'hashes': hashes_of(blob, self.page_size),
+        }, format='json')
+
+    def _apply(self, base, blob, indices, sha256=None):
+        query = (
+            f"?base={base or ''}&page_size={self.page_size}&size={len(blob)}"
+            f"&sha256={sha256 or hashlib.sha256(blob).hexdigest()}"
+        )
+        return self.client.post(
+            reverse('backup-delta-apply') + query,
+            frames_of(blob, self.page_size, indices),
+            content_type='application/octet-stream'
+        )
+
+    def test_compare_without_backup_marks_all_pages(self):
+        response = self._compare(self.old)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data['base'])
+        self.assertEqual(len(response.data['changed_pages']), len(self.old) // self.page_size)
+
+    @override_settings(BACKUP_MAX_SIZE=4096)
+    def test_compare_rejects_more_pages_than_a_backup_can_have(self):
+        hashes = ['0' * 64] * 5
+        response = self.client.post(reverse('backup-delta-compare'), {'page_size': 1024, 'hashes': hashes}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('hashes', response.data)
+        response = self.client.post(
+            reverse('backup-delta-compare'), {'page_size': 512, 'hashes': hashes * 2}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(
+            reverse('backup-delta-compare'), {'page_size': 512, 'hashes': hashes}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_initial_upload_through_apply(self):
+        changed = self._compare(self.old).data['changed_pages']
+        response = self._apply(None, self.old, changed)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(read_backup(UserBackup.objects.get(user=self.user)), self.old)
+
+    def test_delta_upload_sends_only_changed_pages(self):
+        UserBackup.objects.create(user=self.user, sqlite_blob=self.old)
+        result = self._compare(self.new).data
+        self.assertLess(len(result['changed_pages']), len(self.new) // self.page_size)
+        self.assertEqual(result['base'], hashlib.sha256(self.old).hexdigest())
+
+        response = self._apply(result['base'], self.new, result['changed_pages'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(read_backup(UserBackup.objects.get(user=self.user)), self.new)
+
+    def test_delta_download_reconstructs_server_copy(self):
+        UserBackup.objects.create(user=self.user, sqlite_blob=self.new)
+        result = self._compare(self.old).data
+        response = self.client.post(reverse('backup-delta-pages'), {
+            'base': result['base'],
+            'pages': result['changed_pages'],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        size = int(response['X-Backup-Size'])
+        rebuilt = apply_frames(self.old, self.page_size, b''.join(response.streaming_content), size)
+        self.assertEqual(rebuilt, self.new)
+
+    def test_apply_with_stale_base_conflicts(self):
+        UserBackup.objects.create(user=self.user, sqlite_blob=self.old)
+        response = self._apply('0' * 64, self.new, range(len(self.new) // self.page_size))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_pages_with_stale_base_conflicts(self):
+        UserBackup.objects.create(user=self.user, sqlite_blob=self.old)
+        response = self.client.post(reverse('backup-delta-pages'), {
+            'base': '0' * 64,
+            'pages': [0],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_apply_with_wrong_checksum_keeps_backup(self):
+        UserBackup.objects.create(user=self.user, sqlite_blob=self.old)
+        result = self._compare(self.new).data
+        response = self._apply(result['base'], self.new, result['changed_pages'], sha256='0' * 64)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(read_backup(UserBackup.objects.get(user=self.user)), self.old)
+
+    def test_apply_with_missing_page_rejected(self):
+        response = self._apply(None, self.old, [0])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
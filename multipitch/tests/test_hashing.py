@@ -0,0 +1,80 @@
+import threading
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from multipitch.hashing import HashingBusy, HashingPool, get_hashing_pool
+
+User = get_user_model()
+
+
+class HashingPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.pool = HashingPool(workers=1, max_queue=1)
+        self.addCleanup(self.pool.shutdown)
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def test_rejects_beyond_queue_limit(self):
+        running = self.pool.submit(self.release.wait)
+        queued = self.pool.submit(lambda: 'queued')
+        with self.assertRaises(HashingBusy):
+            self.pool.submit(lambda: 'rejected')
+        self.assertEqual(self.pool.stats()['in_flight'], 2)
+
+        self.release.set()
+        running.result()
+        self.assertEqual(queued.result(), 'queued')
+        self.assertEqual(self.pool.run(lambda: 'again'), 'again')
+
+        stats = self.pool.stats()
+        self.assertEqual((stats['completed'], stats['rejected'], stats['in_flight']), (3, 1, 0))
+        self.assertGreater(stats['wait_seconds_max'], 0)
+        self.assertGreaterEqual(stats['hash_seconds_total'], stats['hash_seconds_max'])
+
+    def test_failed_job_frees_its_slot(self):
+        with self.assertRaises(ZeroDivisionError):
+            self.pool.run(lambda: 1 / 0)
+        self.assertEqual(self.pool.stats()['in_flight'], 0)
+
+
+@override_settings(PASSWORD_HASHING={'WORKERS': 1, 'MAX_QUEUE': 0, 'RETRY_AFTER': 5})
+class HashingAdmissionTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='hashuser',
+            email='hash@example.com',
+            password='StrongPass123!'
+        )
+
+    def _saturate(self):
+        release = threading.Event()
+        job = get_hashing_pool().submit(release.wait)
+        # Cleanups run last-in first-out: release, then wait for the slot.
+        self.addCleanup(job.result)
+        self.addCleanup(release.set)
+
+    def test_login_uses_pool(self):
+        completed = get_hashing_pool().stats()['completed']
+        response = self.client.post(
+            reverse('login'), {'email': 'hash@example.com', 'password': 'StrongPass123!'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(get_hashing_pool().stats()['completed'], completed + 1)
+
+    def test_login_rejected_when_saturated(self):
+        self._saturate()
+        response = self.client.post(
+            reverse('login'), {'email': 'hash@example.com', 'password': 'StrongPass123!'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '5')
+
+    def test_signup_rejected_when_saturated(self):
+        self._saturate()
+        response = self.client.post(reverse('signup'), {
+            'username': 'new', 'email': 'new@example.com', 'password': 'StrongPass123!'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(User.objects.filter(email='new@example.com').exists())
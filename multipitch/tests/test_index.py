@@ -0,0 +1,190 @@
+import io
+import sqlite3
+from functools import lru_cache
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from multipitch import dataset
+from multipitch.models import BackupIndex, IndexedClimb, IndexedLog, IndexedPitch, IndexedRoute, UserBackup
+from multipitch.services.backup_service import save_backup
+from multipitch.services.index_service import index_backup
+from multipitch.tests.test_delta import make_sqlite
+
+User = get_user_model()
+
+
+@lru_cache
+def device_versions():
+    return list(dataset.generate_versions(300_000, 2, fraction=0.05, seed='index'))
+
+
+def device_rows(blob, table):
+    conn = sqlite3.connect(':memory:')
+    conn.deserialize(blob)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        conn.close()
+
+
+class IndexServiceTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='indexuser', email='index@example.com', password='x')
+        self.first, self.second = device_versions()
+
+    def _save(self, blob):
+        save_backup(self.user, io.BytesIO(blob))
+        return index_backup(self.user.pk)
+
+    def test_indexes_every_table(self):
+        results = self._save(self.first)
+
+        for table, model in (('routes', IndexedRoute), ('pitches', IndexedPitch),
+                             ('climbs', IndexedClimb), ('logs', IndexedLog)):
+            self.assertEqual(model.objects.filter(user=self.user).count(), device_rows(self.first, table))
+            self.assertEqual(results[table].created, device_rows(self.first, table))
+        index = BackupIndex.objects.get(user=self.user)
+        self.assertEqual(index.version, 1)
+        self.assertEqual(index.error, '')
+        climb = IndexedClimb.objects.filter(user=self.user).first()
+        self.assertIsNotNone(climb.started_at.tzinfo)
+
+    def test_reindex_only_writes_changed_rows(self):
+        self._save(self.first)
+        results = self._save(self.second)
+
+        logs = results['logs']
+        self.assertGreater(logs.updated, 0)
+        self.assertGreater(logs.deleted, 0)
+        self.assertLess(logs.created + logs.updated + logs.deleted, device_rows(self.second, 'logs') / 4)
+        self.assertEqual(IndexedLog.objects.filter(user=self.user).count(), device_rows(self.second, 'logs'))
+        self.assertEqual(BackupIndex.objects.get(user=self.user).version, 2)
+
+    def test_same_backup_is_not_indexed_twice(self):
+        self._save(self.first)
+        self.assertIsNone(index_backup(self.user.pk))
+
+    def test_missing_tables_and_columns_are_tolerated(self):
+        results = self._save(make_sqlite([(1, 'first'), (2, 'second')]))
+
+        self.assertEqual(results['logs'].created, 2)
+        self.assertEqual(results['routes'].created, 0)
+        log = IndexedLog.objects.get(user=self.user, source_id=2)
+        self.assertEqual(log.note, 'second')
+        self.assertIsNone(log.recorded_at)
+
+    def test_non_sqlite_backup_keeps_previous_index(self):
+        self._save(self.first)
+        with self.assertLogs('multipitch.services.index_service', 'WARNING'):
+            self.assertIsNone(self._save(b'some binary data'))
+
+        index = BackupIndex.objects.get(user=self.user)
+        self.assertEqual(index.version, 1)
+        self.assertIn('not a SQLite database', index.error)
+        self.assertEqual(IndexedRoute.objects.filter(user=self.user).count(), device_rows(self.first, 'routes'))
+
+    def test_command_indexes_only_healthy_backups(self):
+        other = User.objects.create_user(username='corrupt', email='corrupt@example.com', password='x')
+        save_backup(self.user, io.BytesIO(self.first))
+        save_backup(other, io.BytesIO(b'some binary data'))
+
+        out = io.StringIO()
+        call_command('index_backups', stdout=out)
+
+        self.assertIn("Indexed 1 backups", out.getvalue())
+        self.assertIn("1 left unindexed", out.getvalue())
+        self.assertEqual(BackupIndex.objects.get(user=self.user).version, 1)
+        self.assertFalse(BackupIndex.objects.filter(user=other).exists())
+        self.assertEqual(UserBackup.objects.get(user=other).integrity, 'not_sqlite')
+
+    def test_upload_indexes_after_commit(self):
+        self.client.force_authenticate(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('backup-upload'), self.first, content_type='application/octet-stream'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(BackupIndex.objects.get(user=self.user).version, 1)
+
+
+class IndexViewTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='indexuser', email='index@example.com', password='x')
+        self.client.force_authenticate(user=self.user)
+        self.blob = device_versions()[0]
+        save_backup(self.user, io.BytesIO(self.blob))
+        index_backup(self.user.pk)
+
+    def test_status(self):
+        response = self.client.get(reverse('backup-index'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['version'], 1)
+        self.assertTrue(response.data['up_to_date'])
+
+        save_backup(self.user, io.BytesIO(device_versions()[1]))
+        self.assertFalse(self.client.get(reverse('backup-index')).data['up_to_date'])
+
+    def test_status_without_index(self):
+        BackupIndex.objects.all().delete()
+        response = self.client.get(reverse('backup-index'))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_routes_are_paginated_by_cursor(self):
+        seen = []
+        url = reverse('backup-index-routes') + '?page_size=7'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 7)
+            seen.extend(route['id'] for route in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(len(seen), device_rows(self.blob, 'routes'))
+        self.assertEqual(len(set(seen)), len(seen))
+
+    def test_route_search(self):
+        route = IndexedRoute.objects.filter(user=self.user).first()
+        response = self.client.get(reverse('backup-index-routes'), {'search': route.name.upper()})
+        self.assertIn(route.source_id, [result['id'] for result in response.data['results']])
+
+    def test_pitches_of_route(self):
+        route = IndexedRoute.objects.filter(user=self.user).first()
+        response = self.client.get(reverse('backup-index-pitches', args=[route.source_id]))
+        numbers = [pitch['number'] for pitch in response.data]
+        self.assertEqual(numbers, sorted(numbers))
+        self.assertEqual(len(numbers), IndexedPitch.objects.filter(user=self.user, route_id=route.source_id).count())
+
+    def test_recent_climbs(self):
+        response = self.client.get(reverse('backup-index-climbs'), {'page_size': 5})
+        started = [climb['started_at'] for climb in response.data['results']]
+        self.assertEqual(len(started), 5)
+        self.assertEqual(started, sorted(started, reverse=True))
+
+        since = started[2]
+        response = self.client.get(reverse('backup-index-climbs'), {'since': since, 'page_size': 500})
+        self.assertTrue(all(climb['started_at'] >= since for climb in response.data['results']))
+
+    def test_logs_of_climb(self):
+        climb = IndexedClimb.objects.filter(user=self.user).first()
+        response = self.client.get(reverse('backup-index-logs'), {'climb': climb.source_id, 'page_size': 500})
+        self.assertEqual(
+            len(response.data['results']),
+            IndexedLog.objects.filter(user=self.user, climb_id=climb.source_id).count(),
+        )
+
+    def test_invalid_filters(self):
+        self.assertEqual(self.client.get(reverse('backup-index-logs'), {'climb': 'x'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(reverse('backup-index-climbs'), {'since': 'soon'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    def test_other_users_rows_are_hidden(self):
+        other = User.objects.create_user(username='other', email='other@example.com', password='x')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(reverse('backup-index-routes')).data['results'], [])
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get(reverse('backup-index-routes')).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
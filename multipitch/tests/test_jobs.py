@@ -0,0 +1,197 @@
+import io
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, transaction
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from multipitch.models import Job, UserBackup
+from multipitch.services import job_service
+from multipitch.services.backup_service import save_backup
+from multipitch.tests.test_maintenance import make_bloated
+
+User = get_user_model()
+
+calls = []
+
+
+def record(**payload):
+    calls.append(payload)
+
+
+def explode(**payload):
+    raise RuntimeError("boom")
+
+
+@override_settings(
+    JOB_MAX_ATTEMPTS=3,
+    JOB_RETRY_BACKOFF=timedelta(seconds=10),
+    JOB_MAX_RETRY_BACKOFF=timedelta(seconds=15),
+    JOB_CONCURRENCY={'record': 2},
+)
+class JobQueueTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(job_service._kinds)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        job_service.register('record')(record)
+        job_service.register('explode')(explode)
+        calls.clear()
+
+    def test_job_runs_once_claimed(self):
+        job_service.enqueue('record', {'user_id': 1})
+
+        [job] = job_service.claim('w1')
+        self.assertEqual(job.attempts, 1)
+        self.assertTrue(job_service.run(job))
+
+        self.assertEqual(calls, [{'user_id': 1}])
+        job.refresh_from_db()
+        self.assertEqual(job.state, 'done')
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(job_service.claim('w1'), [])
+
+    def test_queued_jobs_with_the_same_key_are_merged(self):
+        first = job_service.enqueue('record', {'user_id': 1}, key='1')
+        self.assertIsNone(job_service.enqueue('record', {'user_id': 1}, key='1'))
+        self.assertIsNotNone(job_service.enqueue('record', {'user_id': 2}, key='2'))
+
+        [job] = job_service.claim('w1')
+        self.assertEqual(job.pk, first.pk)
+        # A job for a key that is running is queued again, but not started
+        # until the running one finishes.
+        self.assertIsNotNone(job_service.enqueue('record', {'user_id': 1}, key='1'))
+        self.assertEqual([claimed.key for claimed in job_service.claim('w2', limit=5)], ['2'])
+
+    def test_concurrent_enqueues_with_the_same_key_are_merged(self):
+        first = job_service.enqueue('record', {'user_id': 1}, key='1')
+        # Both callers saw no queued job; the constraint lets one of them in.
+        with mock.patch.object(QuerySet, 'exists', return_value=False):
+            self.assertIsNone(job_service.enqueue('record', {'user_id': 1}, key='1'))
+            self.assertIsNotNone(job_service.enqueue('record', {'user_id': 1}))
+            self.assertIsNotNone(job_service.enqueue('record', {'user_id': 1}))
+        self.assertEqual(Job.objects.filter(key='1').count(), 1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Job.objects.create(kind='record', key='1')
+        first.refresh_from_db()
+        self.assertEqual(first.state, 'queued')
+
+    def test_retry_gives_way_to_a_job_queued_meanwhile(self):
+        job_service.enqueue('explode', key='1')
+        [claimed] = job_service.claim('w1')
+        queued = job_service.enqueue('explode', key='1')
+
+        with self.assertLogs('multipitch.services.job_service', 'ERROR'):
+            self.assertFalse(job_service.run(claimed))
+
+        claimed.refresh_from_db()
+        self.assertEqual(claimed.state, 'failed')
+        self.assertIn("RuntimeError: boom", claimed.last_error)
+        queued.refresh_from_db()
+        self.assertEqual((queued.state, queued.attempts), ('queued', 0))
+
+    def test_unknown_kind_is_rejected(self):
+        with self.assertRaises(KeyError):
+            job_service.enqueue('missing')
+
+    def test_failed_job_is_retried_with_backoff_then_fails(self):
+        job = job_service.enqueue('explode')
+
+        for attempt, backoff in ((1, 10), (2, 15)):
+            [claimed] = job_service.claim('w1')
+            with self.assertLogs('multipitch.services.job_service', 'ERROR'):
+                self.assertFalse(job_service.run(claimed))
+            job.refresh_from_db()
+            self.assertEqual((job.state, job.attempts), ('queued', attempt))
+            self.assertIn("RuntimeError: boom", job.last_error)
+            self.assertAlmostEqual((job.run_after - timezone.now()).total_seconds(), backoff, delta=2)
+            self.assertEqual(job_service.claim('w1'), [])
+            Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+
+        [claimed] = job_service.claim('w1')
+        with self.assertLogs('multipitch.services.job_service', 'ERROR'):
+            job_service.run(claimed)
+        job.refresh_from_db()
+        self.assertEqual((job.state, job.attempts), ('failed', 3))
+
+    def test_concurrency_is_limited_per_kind(self):
+        for _ in range(3):
+            job_service.enqueue('record')
+            job_service.enqueue('explode')
+
+        claimed = job_service.claim('w1', limit=10)
+        self.assertEqual(sorted(job.kind for job in claimed), ['explode', 'record', 'record'])
+        self.assertEqual(job_service.claim('w2', limit=10), [])
+        self.assertEqual(job_service.claim('w2', kinds=['record']), [])
+
+        job_service.run(next(job for job in claimed if job.kind == 'record'))
+        self.assertEqual([job.kind for job in job_service.claim('w2', limit=10)], ['record'])
+
+    def test_job_past_its_visibility_timeout_is_claimed_again(self):
+        job_service.enqueue('record', {'user_id': 1})
+        [lost] = job_service.claim('w1')
+        Job.objects.filter(pk=lost.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+
+        [reclaimed] = job_service.claim('w2')
+        self.assertEqual((reclaimed.pk, reclaimed.attempts), (lost.pk, 2))
+        # The first worker finishing late does not overwrite the new claim.
+        job_service.run(lost)
+        reclaimed.refresh_from_db()
+        self.assertEqual((reclaimed.state, reclaimed.worker), ('running', 'w2'))
+
+    def test_job_lost_on_its_last_attempt_fails(self):
+        job = job_service.enqueue('record')
+        Job.objects.filter(pk=job.pk).update(
+            state='running', attempts=3, worker='w1', locked_until=timezone.now() - timedelta(seconds=1)
+        )
+
+        self.assertEqual(job_service.claim('w2'), [])
+        job.refresh_from_db()
+        self.assertEqual(job.state, 'failed')
+        self.assertIn('w1', job.last_error)
+
+    @override_settings(JOB_RETENTION=timedelta(days=1))
+    def test_prune_deletes_old_finished_jobs(self):
+        old = job_service.enqueue('record')
+        recent = job_service.enqueue('record')
+        failed = job_service.enqueue('record')
+        Job.objects.filter(pk=old.pk).update(state='done', finished_at=timezone.now() - timedelta(days=2))
+        Job.objects.filter(pk=recent.pk).update(state='done', finished_at=timezone.now())
+        Job.objects.filter(pk=failed.pk).update(state='failed', finished_at=timezone.now() - timedelta(days=2))
+
+        self.assertEqual(job_service.prune(), 1)
+        self.assertEqual(set(Job.objects.values_list('pk', flat=True)), {recent.pk, failed.pk})
+
+    def test_burst_worker_drains_the_queue(self):
+        for user_id in range(3):
+            job_service.enqueue('record', {'user_id': user_id})
+        job_service.enqueue('explode', delay=timedelta(hours=1))
+
+        stats = job_service.Worker(name='w1', burst=True).work()
+
+        self.assertEqual(stats, job_service.WorkerStats(3, 0))
+        self.assertEqual(sorted(call['user_id'] for call in calls), [0, 1, 2])
+
+
+@override_settings(BACKUP_PROCESS_IN_BACKGROUND=True)
+class ProcessBackupJobTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='jobuser', email='job@example.com', password='x')
+
+    def test_upload_queues_processing_for_the_worker(self):
+        save_backup(self.user, io.BytesIO(make_bloated(100, 100)))
+        save_backup(self.user, io.BytesIO(make_bloated(100, 90)))
+        self.assertEqual(Job.objects.filter(kind='process_backup', key=str(self.user.pk)).count(), 1)
+        self.assertEqual(UserBackup.objects.get(user=self.user).integrity, 'unchecked')
+
+        out = io.StringIO()
+        call_command('run_jobs', '--burst', stdout=out)
+
+        self.assertIn("Ran 1 jobs, 0 failed", out.getvalue())
+        self.assertEqual(UserBackup.objects.get(user=self.user).integrity, 'ok')
+
+    def test_unknown_kind_is_an_error(self):
+        with self.assertRaises(CommandError):
+            call_command('run_jobs', '--burst', '--kind', 'missing')
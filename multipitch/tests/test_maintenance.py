@@ -0,0 +1,197 @@
+import hashlib
+import io
+import os
+import sqlite3
+import tempfile
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from multipitch.models import BackupIndex, BackupVersion, IndexedRoute, UserBackup
+from multipitch.services import version_service
+from multipitch.services.backup_service import read_backup, save_backup
+from multipitch.services.maintenance_service import process_backup
+from multipitch.tests.test_delta import frames_of, hashes_of, make_sqlite
+
+User = get_user_model()
+
+
+def make_bloated(rows, kept):
+    """A database that held `rows` routes and had all but the first `kept` deleted."""
+    fd, path = tempfile.mkstemp(suffix='.sqlite3')
+    os.close(fd)
+    try:
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA page_size=1024")
+        conn.execute("CREATE TABLE routes (id INTEGER PRIMARY KEY, name TEXT)")
+        conn.executemany("INSERT INTO routes (id, name) VALUES (?, ?)", [(i, f'route {i} ' * 20) for i in range(rows)])
+        conn.execute("DELETE FROM routes WHERE id >= ?", (kept,))
+        conn.commit()
+        conn.close()
+        with open(path, 'rb') as db:
+            return db.read()
+    finally:
+        os.unlink(path)
+
+
+def route_rows(blob):
+    conn = sqlite3.connect(':memory:')
+    conn.deserialize(blob)
+    try:
+        return conn.execute("SELECT id, name FROM routes ORDER BY id").fetchall()
+    finally:
+        conn.close()
+
+
+def with_route(blob, route_id, name):
+    """`blob` after a device added a route to it in place."""
+    conn = sqlite3.connect(':memory:')
+    conn.deserialize(blob)
+    try:
+        conn.execute("INSERT INTO routes (id, name) VALUES (?, ?)", (route_id, name))
+        conn.commit()
+        return conn.serialize()
+    finally:
+        conn.close()
+
+
+class ProcessBackupTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='maintenanceuser', email='maintenance@example.com', password='x')
+        self.client.force_authenticate(user=self.user)
+
+    def _save(self, blob):
+        backup, _, _ = save_backup(self.user, io.BytesIO(blob))
+        return backup
+
+    def test_healthy_backup_is_checked_and_indexed(self):
+        blob = make_bloated(100, 100)
+        self._save(blob)
+
+        result = process_backup(self.user.pk)
+
+        self.assertEqual(result.integrity, 'ok')
+        self.assertEqual(result.saved_bytes, 0)
+        backup = UserBackup.objects.get(user=self.user)
+        self.assertEqual(backup.integrity, 'ok')
+        self.assertEqual(backup.sha256, hashlib.sha256(blob).hexdigest())
+        self.assertEqual(IndexedRoute.objects.filter(user=self.user).count(), 100)
+        self.assertIsNone(process_backup(self.user.pk))
+
+    def test_backup_with_free_pages_is_compacted(self):
+        blob = make_bloated(2000, 50)
+        self._save(blob)
+
+        result = process_backup(self.user.pk)
+
+        backup = UserBackup.objects.get(user=self.user)
+        self.assertEqual(backup.integrity, 'ok')
+        self.assertEqual(backup.compacted_from, hashlib.sha256(blob).hexdigest())
+        self.assertLess(backup.original_size, len(blob) / 4)
+        self.assertEqual(result.saved_bytes, len(blob) - backup.original_size)
+        compacted = read_backup(backup)
+        self.assertEqual(backup.sha256, hashlib.sha256(compacted).hexdigest())
+        self.assertEqual(route_rows(compacted), route_rows(blob))
+        self.assertEqual(BackupIndex.objects.get(user=self.user).sha256, backup.sha256)
+
+    def test_compaction_moves_the_etag(self):
+        blob = make_bloated(2000, 50)
+        uploaded = self._save(blob)
+        uploaded_etag = f'"{hashlib.sha256(blob).hexdigest()}"'
+        process_backup(self.user.pk)
+
+        response = self.client.get(reverse('backup-download-raw'), HTTP_IF_NONE_MATCH=uploaded_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], UserBackup.objects.get(user=self.user).etag)
+        self.assertGreater(UserBackup.objects.get(user=self.user).last_sync, uploaded.last_sync)
+
+        # A device still holding the upload has lost nothing, so If-Match lets it through.
+        backup, created, changed = save_backup(self.user, io.BytesIO(blob), if_match=uploaded_etag)
+        self.assertFalse(changed)
+
+        backup, created, changed = save_backup(self.user, io.BytesIO(make_sqlite([(1, 'a')])), if_match=uploaded_etag)
+        self.assertTrue(changed)
+        self.assertEqual(backup.compacted_from, '')
+        self.assertEqual(backup.integrity, 'unchecked')
+
+    def test_delta_upload_after_compaction(self):
+        self._save(make_bloated(2000, 50))
+        process_backup(self.user.pk)
+
+        # The device sees the ETag move and takes the compacted copy.
+        response = self.client.get(reverse('backup-download-raw'))
+        local = with_route(b''.join(response.streaming_content), 9999, 'new route')
+        compared = self.client.post(reverse('backup-delta-compare'), {
+            'page_size': 1024, 'hashes': hashes_of(local, 1024),
+        }, format='json').data
+        self.assertLessEqual(len(compared['changed_pages']), 3)
+
+        sha256 = hashlib.sha256(local).hexdigest()
+        response = self.client.post(
+            reverse('backup-delta-apply') + f"?base={compared['base']}&page_size=1024&size={len(local)}&sha256={sha256}",
+            frames_of(local, 1024, compared['changed_pages']),
+            content_type='application/octet-stream'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(read_backup(UserBackup.objects.get(user=self.user)), local)
+
+    @override_settings(BACKUP_VERSION_RETENTION=3)
+    def test_delta_version_is_rebased_on_the_compacted_copy(self):
+        first = make_bloated(2000, 60)
+        second = make_bloated(2000, 50)
+        self._save(first)
+        self._save(second)
+        self.assertTrue(BackupVersion.objects.get(user=self.user, number=1).is_delta)
+
+        process_backup(self.user.pk)
+
+        self.assertNotEqual(UserBackup.objects.get(user=self.user).compacted_from, '')
+        with version_service.reconstruct(self.user, 1) as content:
+            self.assertEqual(content.read(), first)
+
+    def test_corrupt_backup_is_marked_and_not_indexed(self):
+        blob = bytearray(make_bloated(300, 300))
+        blob[2048:4096] = b'\xff' * 2048
+        self._save(bytes(blob))
+
+        result = process_backup(self.user.pk)
+
+        self.assertEqual(result.integrity, 'corrupt')
+        backup = UserBackup.objects.get(user=self.user)
+        self.assertEqual(backup.integrity, 'corrupt')
+        self.assertNotEqual(backup.integrity_detail, '')
+        self.assertFalse(BackupIndex.objects.filter(user=self.user).exists())
+
+    def test_truncated_backup_is_corrupt(self):
+        blob = make_bloated(300, 300)
+        self._save(blob[:len(blob) // 2])
+
+        self.assertEqual(process_backup(self.user.pk).integrity, 'corrupt')
+        self.assertIn('pages', UserBackup.objects.get(user=self.user).integrity_detail)
+
+    def test_non_sqlite_backup_is_marked(self):
+        self._save(b'not a database' * 100)
+
+        self.assertEqual(process_backup(self.user.pk).integrity, 'not_sqlite')
+        self.assertEqual(UserBackup.objects.get(user=self.user).integrity, 'not_sqlite')
+        self.assertFalse(BackupIndex.objects.filter(user=self.user).exists())
+
+    @override_settings(BACKUP_PROCESS_MAX_TEMP_BYTES=1024)
+    def test_backup_over_the_temp_budget_is_skipped(self):
+        blob = make_bloated(2000, 50)
+        self._save(blob)
+
+        self.assertEqual(process_backup(self.user.pk).integrity, 'skipped')
+        backup = UserBackup.objects.get(user=self.user)
+        self.assertEqual(backup.integrity, 'skipped')
+        self.assertEqual(backup.sha256, hashlib.sha256(blob).hexdigest())
+
+    def test_upload_reports_integrity(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('backup-upload'), make_bloated(100, 100), content_type='application/x-sqlite3')
+
+        response = self.client.get(reverse('backup-download-raw'))
+        self.assertEqual(response['X-Backup-Integrity'], 'ok')
+        response = self.client.get(reverse('backup-versions'))
+        self.assertEqual(response.data['current']['integrity'], 'ok')
@@ -0,0 +1,150 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from multipitch import metrics
+
+User = get_user_model()
+
+
+def sample(name, **labels):
+    metric = metrics.REGISTRY[name]
+    key = (name, '', tuple(str(labels[n]) for n in metric.labelnames))
+    return metrics.collect().get(key, 0)
+
+
+class RenderTests(SimpleTestCase):
+    def test_prometheus_text_format(self):
+        counter = metrics.http_requests
+        histogram = metrics.http_latency
+        samples = {
+            (counter.name, '', ('me', 'GET', '200')): 3,
+            (histogram.name, '_bucket', ('me', '0.01')): 2,
+            (histogram.name, '_bucket', ('me', '+Inf')): 1,
+            (histogram.name, '_sum', ('me',)): 40.5,
+            (histogram.name, '_count', ('me',)): 3,
+        }
+        text = metrics.render(samples)
+        self.assertIn('# TYPE multipitch_http_requests_total counter\n', text)
+        self.assertIn('multipitch_http_requests_total{view="me",method="GET",status="200"} 3\n', text)
+        self.assertIn('multipitch_http_request_duration_seconds_bucket{view="me",le="0.005"} 0\n', text)
+        self.assertIn('multipitch_http_request_duration_seconds_bucket{view="me",le="0.01"} 2\n', text)
+        self.assertIn('multipitch_http_request_duration_seconds_bucket{view="me",le="30"} 2\n', text)
+        self.assertIn('multipitch_http_request_duration_seconds_bucket{view="me",le="+Inf"} 3\n', text)
+        self.assertIn('multipitch_http_request_duration_seconds_sum{view="me"} 40.5\n', text)
+
+    def test_escapes_label_values(self):
+        samples = {(metrics.http_requests.name, '', ('a"b\\', 'GET', '200')): 1}
+        self.assertIn('view="a\\"b\\\\"', metrics.render(samples))
+
+
+SCRAPE = {'MULTIPROCESS_DIR': None, 'FLUSH_INTERVAL': 5, 'AUTH_TOKEN': 'secret'}
+
+
+@override_settings(METRICS=SCRAPE)
+class MetricsMiddlewareTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='metricsuser',
+            email='metrics@example.com',
+            password='StrongPass123!'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_records_requests_queries_and_sizes(self):
+        before = {
+            'requests': sample('multipitch_http_requests_total', view='backup-upload', method='POST', status=200),
+            'queries': sample('multipitch_db_queries_total', view='backup-upload'),
+            'bytes': sample('multipitch_http_request_bytes_total', view='backup-upload'),
+        }
+        response = self.client.post(reverse('backup-upload'), b'x' * 5000, content_type='application/octet-stream')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(
+            sample('multipitch_http_requests_total', view='backup-upload', method='POST', status=200),
+            before['requests'] + 1)
+        self.assertGreater(sample('multipitch_db_queries_total', view='backup-upload'), before['queries'])
+        self.assertEqual(sample('multipitch_http_request_bytes_total', view='backup-upload'), before['bytes'] + 5000)
+
+        text = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret').content.decode()
+        self.assertIn('multipitch_backup_blob_bytes_bucket{kind="original",le="16384"}', text)
+
+    def test_unmatched_paths_share_a_label(self):
+        self.client.get('/no-such-page/')
+        self.assertGreater(sample('multipitch_http_requests_total', view='unmatched', method='GET', status=404), 0)
+
+    def test_metrics_view(self):
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+    def test_metrics_view_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(METRICS={**SCRAPE, 'AUTH_TOKEN': None})
+    def test_metrics_view_without_token_is_closed_unless_debug(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_403_FORBIDDEN)
+        with self.settings(DEBUG=True):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_200_OK)
+
+
+class ShardTests(SimpleTestCase):
+    def test_shards_of_exited_threads_are_folded(self):
+        key = (metrics.http_requests.name, '', ('thread-view', 'GET', '200'))
+        before = metrics.local_samples()[key]
+
+        for _ in range(50):
+            thread = threading.Thread(
+                target=metrics.http_requests.inc, kwargs={'view': 'thread-view', 'method': 'GET', 'status': 200}
+            )
+            thread.start()
+            thread.join()
+
+        self.assertEqual(metrics.local_samples()[key], before + 50)
+        self.assertLessEqual(len(metrics._shards), threading.active_count())
+
+
+class MultiprocessTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_collect_sums_process_files(self):
+        name = metrics.http_requests.name
+        other = [[name, '', ['other-view', 'GET', '200'], 4]]
+        with open(f"{self.directory}/99999999.json", 'w') as f:
+            json.dump(other, f)
+
+        config = {'MULTIPROCESS_DIR': self.directory, 'FLUSH_INTERVAL': 5, 'AUTH_TOKEN': None}
+        with override_settings(METRICS=config):
+            metrics.http_requests.inc(view='other-view', method='GET', status=200)
+            local = metrics.local_samples()[(name, '', ('other-view', 'GET', '200'))]
+            self.assertEqual(metrics.collect()[(name, '', ('other-view', 'GET', '200'))], local + 4)
+
+    def test_files_of_exited_processes_are_archived(self):
+        exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+        exited.wait()
+        name = metrics.http_requests.name
+        key = (name, '', ('archived-view', 'GET', '200'))
+        for pid, count in ((exited.pid, 2), (os.getppid(), 3)):
+            with open(f"{self.directory}/{pid}.json", 'w') as f:
+                json.dump([[name, '', list(key[2]), count]], f)
+        with open(f"{self.directory}/{metrics.ARCHIVE_FILE}", 'w') as f:
+            json.dump([[name, '', list(key[2]), 1]], f)
+
+        config = {'MULTIPROCESS_DIR': self.directory, 'FLUSH_INTERVAL': 5, 'AUTH_TOKEN': None}
+        with override_settings(METRICS=config):
+            self.assertEqual(metrics.collect()[key], 6)
+            self.assertFalse(os.path.exists(f"{self.directory}/{exited.pid}.json"))
+            self.assertTrue(os.path.exists(f"{self.directory}/{os.getppid()}.json"))
+            self.assertEqual(metrics.collect()[key], 6)
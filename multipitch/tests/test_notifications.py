@@ -0,0 +1,146 @@
+import asyncio
+import io
+import json
+import threading
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from multipitch.models import UserBackup
+from multipitch.notifications import get_hub
+from multipitch.services.backup_service import save_backup
+from multipitch.tokens import VersionedRefreshToken
+
+User = get_user_model()
+
+
+class HubTests(TestCase):
+    async def test_deliver_from_another_thread_wakes_subscriber(self):
+        hub = get_hub()
+        with hub.subscribe(1) as subscription, hub.subscribe(2) as other:
+            thread = threading.Thread(target=hub.deliver, args=(1,))
+            thread.start()
+            self.assertTrue(await subscription.wait(5))
+            thread.join()
+            self.assertFalse(await other.wait(0.01))
+            self.assertFalse(await subscription.wait(0.01))
+        self.assertEqual(hub.subscribed_users(), set())
+        self.assertFalse(hub.has_subscribers(asyncio.get_running_loop()))
+
+    def test_saved_backup_is_published_on_commit(self):
+        user = User.objects.create_user(username='hubuser', email='hub@example.com', password='x')
+        with mock.patch.object(get_hub(), 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                save_backup(user, io.BytesIO(b'backup'))
+        publish.assert_called_once_with(user.pk)
+
+
+class BackupChangesViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='changes', email='changes@example.com', password='x')
+        access = VersionedRefreshToken.for_user(self.user).access_token
+        self.headers = {'Authorization': f'Bearer {access}'}
+
+    async def _save(self, blob, publish=True):
+        backup, _, _ = await sync_to_async(save_backup)(self.user, io.BytesIO(blob))
+        if publish:
+            # TestCase never commits, so stand in for the on_commit hook.
+            get_hub().publish(self.user.pk)
+        return backup
+
+    def _wait(self, etag=None, timeout=5):
+        headers = dict(self.headers)
+        if etag is not None:
+            headers['If-None-Match'] = etag
+        return self.async_client.get(reverse('async-backup-changes'), {'timeout': timeout}, headers=headers)
+
+    async def test_returns_at_once_when_backup_differs(self):
+        backup = await self._save(b'first')
+
+        response = await self._wait()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], backup.etag)
+        self.assertEqual(response.json()['sha256'], backup.sha256)
+        self.assertEqual(response.json()['version'], 1)
+
+    async def test_times_out_with_304_while_unchanged(self):
+        backup = await self._save(b'first')
+
+        response = await self._wait(backup.etag, timeout=0.05)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], backup.etag)
+
+    async def test_wakes_when_another_device_uploads(self):
+        first = await self._save(b'first')
+        waiting = asyncio.create_task(self._wait(first.etag))
+        await asyncio.sleep(0.05)
+        self.assertFalse(waiting.done())
+
+        second = await self._save(b'second')
+        response = await asyncio.wait_for(waiting, 5)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], second.etag)
+        self.assertEqual(response.json()['version'], 2)
+
+    async def test_compaction_counts_as_a_change(self):
+        backup = await self._save(b'first')
+        await UserBackup.objects.filter(pk=backup.pk).aupdate(sha256='0' * 64, compacted_from=backup.sha256)
+        get_hub().publish(self.user.pk)
+
+        response = await self._wait(backup.etag, timeout=0.05)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], f'"{"0" * 64}"')
+
+    @override_settings(BACKUP_CHANGE_BROKER={
+        'BACKEND': 'multipitch.notifications.DatabasePollingBroker',
+        'OPTIONS': {'interval': 0.02},
+    })
+    async def test_polling_broker_sees_saves_it_was_not_told_about(self):
+        first = await self._save(b'first', publish=False)
+        waiting = asyncio.create_task(self._wait(first.etag))
+        await asyncio.sleep(0.05)
+
+        second = await self._save(b'second', publish=False)
+        response = await asyncio.wait_for(waiting, 5)
+
+        self.assertEqual(response['ETag'], second.etag)
+
+    async def test_invalid_timeout_is_rejected(self):
+        response = await self._wait(timeout='soon')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(BACKUP_CHANGES_KEEPALIVE=0.05)
+    async def test_event_stream(self):
+        first = await self._save(b'first')
+        response = await self.async_client.get(
+            reverse('async-backup-changes'), headers={**self.headers, 'Accept': 'text/event-stream'}
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+
+        event = (await anext(events)).decode()
+        self.assertIn(f'id: {first.etag}\nevent: backup\n', event)
+        self.assertEqual(json.loads(event.split('data: ')[1])['version'], 1)
+        self.assertEqual(await anext(events), b': keepalive\n\n')
+
+        second = await self._save(b'second')
+        self.assertIn(f'id: {second.etag}\n', (await anext(events)).decode())
+
+    async def test_event_stream_resumes_from_last_event_id(self):
+        first = await self._save(b'first')
+        response = await self.async_client.get(reverse('async-backup-changes'), headers={
+            **self.headers, 'Accept': 'text/event-stream', 'Last-Event-ID': first.etag,
+        })
+        events = aiter(response.streaming_content)
+        next_event = asyncio.ensure_future(anext(events))
+        await asyncio.sleep(0.05)
+        self.assertFalse(next_event.done())
+
+        second = await self._save(b'second')
+        self.assertIn(f'id: {second.etag}\n', (await asyncio.wait_for(next_event, 5)).decode())
@@ -0,0 +1,60 @@
+import base64
+import io
+import json
+import os
+from django.test import SimpleTestCase, override_settings
+from rest_framework.exceptions import ParseError, ValidationError
+from multipitch.parsers import Base64JSONParser
+
+
+@override_settings(BACKUP_UPLOAD_CHUNK_SIZE=7)
+class Base64JSONParserTests(SimpleTestCase):
+    def parse(self, body):
+        if isinstance(body, str):
+            body = body.encode()
+        with Base64JSONParser().parse(io.BytesIO(body)) as upload:
+            return upload.read()
+
+    def assertFieldError(self, body, message):
+        with self.assertRaises(ValidationError) as ctx:
+            self.parse(body)
+        self.assertEqual(ctx.exception.detail, {'sqlite_blob': [message]})
+
+    def test_decodes_across_chunk_boundaries(self):
+        blob = os.urandom(1000)
+        body = json.dumps({'sqlite_blob': base64.b64encode(blob).decode()})
+        self.assertEqual(self.parse(body), blob)
+
+    def test_skips_other_members(self):
+        body = ('{"meta": {"app": "1.2", "tags": ["a", {"b": null}], "n": -1.5e3}, '
+                '"sqlite_blob": "c29tZSBkYXRh", "flag": true}')
+        self.assertEqual(self.parse(body), b'some data')
+
+    def test_handles_escapes_and_whitespace(self):
+        blob = b'\xfb\xff\xbf' * 20
+        encoded = base64.b64encode(blob).decode()
+        wrapped = encoded[:40] + '\\n' + encoded[40:]
+        body = '{"sqlite_blob": "%s"}' % wrapped.replace('/', '\\/')
+        self.assertIn('\\/', body)
+        self.assertEqual(self.parse(body), blob)
+
+    def test_matches_b64decode_on_padding(self):
+        self.assertEqual(self.parse('{"sqlite_blob": "QQ==QUJD"}'), base64.b64decode('QQ==QUJD'))
+
+    def test_last_duplicate_key_wins(self):
+        self.assertEqual(self.parse('{"sqlite_blob": "!!!", "sqlite_blob": "QUJD"}'), b'ABC')
+
+    def test_empty_string_gives_empty_file(self):
+        self.assertEqual(self.parse('{"sqlite_blob": ""}'), b'')
+
+    def test_field_errors(self):
+        self.assertFieldError('{}', 'This field is required.')
+        self.assertFieldError('{"sqlite_blob": null}', 'This field may not be null.')
+        self.assertFieldError('{"sqlite_blob": [1]}', 'Not a valid string.')
+        self.assertFieldError('{"sqlite_blob": "QUJDR"}', 'Invalid Base64 data.')
+
+    def test_syntax_errors(self):
+        for body in ('', '[]', '{"sqlite_blob": "QUJD"', '{"sqlite_blob" "QUJD"}',
+                     '{"sqlite_blob": "QUJD"} x', '{"a": nope}'):
+            with self.subTest(body=body), self.assertRaises(ParseError):
+                self.parse(body)
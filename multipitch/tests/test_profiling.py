@@ -0,0 +1,116 @@
+import shutil
+import tempfile
+import threading
+from io import StringIO
+from unittest import mock
+from django.http import HttpResponse
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from multipitch.middleware import ProfilerMiddleware
+from multipitch import profiling
+from multipitch.profiling import list_profiles
+from multipitch.tokens import VersionedRefreshToken
+
+User = get_user_model()
+
+
+class ProfilerDisabledTests(SimpleTestCase):
+    def test_not_used_when_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilerMiddleware(lambda request: None)
+
+
+class ProfilerMiddlewareTests(APITestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.config = {'ENABLED': True, 'SAMPLE_RATE': 0.0, 'HEADER': 'X-Profile',
+                       'DIR': directory, 'MAX_PROFILES': 2}
+        self.enterContext(override_settings(PROFILER=self.config))
+        self.staff = User.objects.create_user(
+            username='staff', email='staff@example.com', password='StrongPass123!', is_staff=True
+        )
+        self.user = User.objects.create_user(
+            username='plain', email='plain@example.com', password='StrongPass123!'
+        )
+
+    def _get_me(self, user, **headers):
+        access = VersionedRefreshToken.for_user(user).access_token
+        return self.client.get(reverse('me'), HTTP_AUTHORIZATION=f'Bearer {access}', **headers)
+
+    def test_staff_header_profiles_request(self):
+        self._get_me(self.staff, HTTP_X_PROFILE='1')
+        [profile] = list_profiles()
+        self.assertEqual(profile['view'], 'me')
+        self.assertEqual(profile['status'], 200)
+        self.assertEqual(profile['user_id'], self.staff.pk)
+        self.assertTrue(profile['functions'])
+
+    def test_header_ignored_for_other_users(self):
+        self._get_me(self.user, HTTP_X_PROFILE='1')
+        self.assertEqual(list_profiles(), [])
+
+    def test_sampling_records_sql_and_keeps_newest(self):
+        self.config['SAMPLE_RATE'] = 1.0
+        for _ in range(3):
+            self.client.post(reverse('login'), {'email': 'plain@example.com', 'password': 'x'}, format='json')
+        profiles = list_profiles()
+        self.assertEqual(len(profiles), 2)
+        self.assertTrue(any('multipitch_userauth' in q['sql'] for q in profiles[0]['queries']))
+        self.assertFalse(any('params' in q for q in profiles[0]['queries']))
+
+        out = StringIO()
+        call_command('profiles', stdout=out)
+        self.assertIn('/login/', out.getvalue())
+        out = StringIO()
+        call_command('profiles', 'show', profiles[0]['id'], '--limit', '5', stdout=out)
+        self.assertIn('queries', out.getvalue())
+        self.assertIn('function calls', out.getvalue())
+        call_command('profiles', 'clear', stdout=StringIO())
+        self.assertEqual(list_profiles(), [])
+
+
+class OverlappingProfileTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.enterContext(override_settings(PROFILER={
+            'ENABLED': True, 'SAMPLE_RATE': 1.0, 'HEADER': 'X-Profile', 'DIR': directory, 'MAX_PROFILES': 10,
+        }))
+
+    def _request(self):
+        request = RequestFactory().get('/overlap/')
+        request.resolver_match = None
+        return request
+
+    def test_overlapping_requests_are_served(self):
+        entered, release = threading.Event(), threading.Event()
+        responses = []
+
+        def slow(request):
+            entered.set()
+            release.wait(5)
+            return HttpResponse('slow')
+
+        thread = threading.Thread(target=lambda: responses.append(profiling.profile_request(self._request(), slow)))
+        thread.start()
+        self.assertTrue(entered.wait(5))
+        try:
+            response = profiling.profile_request(self._request(), lambda request: HttpResponse('fast'))
+        finally:
+            release.set()
+            thread.join()
+
+        self.assertEqual(response.content, b'fast')
+        self.assertEqual(responses[0].content, b'slow')
+        self.assertEqual(len(list_profiles()), 1)
+
+    def test_served_unprofiled_when_another_tool_is_active(self):
+        with mock.patch('cProfile.Profile.enable', side_effect=ValueError("Another profiling tool is already active")):
+            response = profiling.profile_request(self._request(), lambda request: HttpResponse('ok'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list_profiles(), [])
@@ -0,0 +1,79 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import skipUnless
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from multipitch.models import Job
+from multipitch.services import job_service
+from multipitch.services.token_prune_service import expired_ids, prune_expired_tokens
+
+User = get_user_model()
+
+
+class PruneTokensTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='pruneuser',
+            email='prune@example.com',
+            password='StrongPass123!'
+        )
+        now = timezone.now()
+        self.expired = [self._token(f'expired-{i}', now - timedelta(days=1)) for i in range(5)]
+        self.live = [self._token(f'live-{i}', now + timedelta(days=1)) for i in range(2)]
+        BlacklistedToken.objects.create(token=self.expired[0])
+        BlacklistedToken.objects.create(token=self.live[0])
+
+    def _token(self, jti, expires_at):
+        return OutstandingToken.objects.create(user=self.user, jti=jti, token=jti, expires_at=expires_at)
+
+    def test_deletes_only_expired_tokens(self):
+        result = prune_expired_tokens(batch_size=2)
+        self.assertEqual((result.outstanding, result.blacklisted, result.batches), (5, 1, 3))
+        self.assertQuerySetEqual(
+            OutstandingToken.objects.order_by('pk'), [t.pk for t in self.live], transform=lambda t: t.pk
+        )
+        self.assertEqual(BlacklistedToken.objects.get().token_id, self.live[0].pk)
+
+    @skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN is SQLite syntax")
+    def test_batch_query_walks_the_expires_at_index(self):
+        sql, params = expired_ids(timezone.now(), 2).query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('USING COVERING INDEX multipitch_outstandingtoken_expires_at (expires_at<?)', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_command_stops_after_max_batches(self):
+        out = StringIO()
+        call_command('prune_tokens', '--batch-size', '2', '--max-batches', '1', stdout=out)
+        self.assertIn('Stopped after 1 batches; run again to resume', out.getvalue())
+        self.assertIn('Deleted 2 outstanding and 1 blacklisted tokens in 1 batches', out.getvalue())
+
+        out = StringIO()
+        call_command('prune_tokens', stdout=out)
+        self.assertIn('Deleted 3 outstanding and 0 blacklisted tokens', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
+        self.assertEqual(OutstandingToken.objects.count(), 2)
+
+    @override_settings(TOKEN_PRUNE_INTERVAL=600)
+    def test_workers_prune_on_a_single_schedule(self):
+        call_command('run_jobs', '--burst', stdout=StringIO())
+        call_command('run_jobs', '--burst', stdout=StringIO())
+        [job] = Job.objects.filter(kind='prune_tokens')
+        self.assertAlmostEqual((job.run_after - timezone.now()).total_seconds(), 600, delta=5)
+        self.assertEqual(OutstandingToken.objects.count(), 7)
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        [claimed] = job_service.claim('w1', kinds=['prune_tokens'])
+        self.assertTrue(job_service.run(claimed))
+
+        self.assertEqual(OutstandingToken.objects.count(), 2)
+        self.assertEqual(Job.objects.filter(kind='prune_tokens', state='queued').count(), 1)
+
+    def test_no_schedule_without_an_interval(self):
+        call_command('run_jobs', '--burst', stdout=StringIO())
+        self.assertFalse(Job.objects.filter(kind='prune_tokens').exists())
@@ -0,0 +1,68 @@
+import io
+import shutil
+import tempfile
+from django.test import SimpleTestCase, TestCase, override_settings
+from multipitch.models import UserAuth, UserBackup
+from multipitch.services.backup_service import save_backup
+from multipitch.storage import BlobNotFound, get_blob_store
+from multipitch.storage.filesystem import FileSystemBlobStore
+
+
+class FileSystemBlobStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.store = FileSystemBlobStore(self.root)
+
+    def test_save_and_open(self):
+        self.store.save('a/b/blob', io.BytesIO(b'payload'))
+        self.assertTrue(self.store.exists('a/b/blob'))
+        with self.store.open('a/b/blob') as blob:
+            self.assertEqual(blob.read(), b'payload')
+
+    def test_iter_range(self):
+        self.store.save('blob', io.BytesIO(bytes(range(100))))
+        chunks = list(self.store.iter_range('blob', 10, 29, 7))
+        self.assertEqual([len(chunk) for chunk in chunks], [7, 7, 6])
+        self.assertEqual(b''.join(chunks), bytes(range(10, 30)))
+        self.assertEqual(b''.join(self.store.iter_range('blob', 95, None, 7)), bytes(range(95, 100)))
+
+    def test_delete(self):
+        self.store.save('blob', io.BytesIO(b'payload'))
+        self.store.delete('blob')
+        self.store.delete('blob')
+        self.assertFalse(self.store.exists('blob'))
+        with self.assertRaises(BlobNotFound):
+            self.store.open('blob')
+
+    def test_rejects_keys_outside_root(self):
+        with self.assertRaises(ValueError):
+            self.store.save('../escape', io.BytesIO(b'payload'))
+
+
+class UserBackupBlobTests(TestCase):
+    def setUp(self):
+        self.user = UserAuth.objects.create_user(username='bloboner', password='123')
+        self.store = get_blob_store()
+
+    def test_blob_is_kept_out_of_the_row(self):
+        backup = UserBackup.objects.create(user=self.user, sqlite_blob=b'dummy sqlite')
+        self.assertTrue(self.store.exists(backup.blob_key))
+        self.assertEqual(backup.stored_size, len(b'dummy sqlite'))
+        self.assertNotIn('sqlite_blob', [field.name for field in UserBackup._meta.get_fields()])
+
+    @override_settings(BACKUP_VERSION_RETENTION=0)
+    def test_replacing_backup_deletes_previous_blob(self):
+        backup = UserBackup.objects.create(user=self.user, sqlite_blob=b'first')
+        old_key = backup.blob_key
+        with self.captureOnCommitCallbacks(execute=True):
+            backup, created, changed = save_backup(self.user, io.BytesIO(b'second'))
+        self.assertNotEqual(backup.blob_key, old_key)
+        self.assertFalse(self.store.exists(old_key))
+        self.assertEqual(backup.sqlite_blob, b'second')
+
+    def test_deleting_backup_deletes_blob(self):
+        backup = UserBackup.objects.create(user=self.user, sqlite_blob=b'dummy sqlite')
+        with self.captureOnCommitCallbacks(execute=True):
+            backup.delete()
+        self.assertFalse(self.store.exists(backup.blob_key))
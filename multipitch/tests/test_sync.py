@@ -0,0 +1,186 @@
+import time
+from datetime import timedelta
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from multipitch.models import SyncChange, SyncState, UserBackup
+
+User = get_user_model()
+
+
+def now_ms(offset=0):
+    return int(time.time() * 1000) + offset
+
+
+def upsert(row_id, timestamp, table='climbs', **data):
+    return {'table': table, 'id': str(row_id), 'op': 'upsert', 'timestamp': timestamp,
+            'data': {'id': row_id, **data}}
+
+
+def delete(row_id, timestamp, table='climbs'):
+    return {'table': table, 'id': str(row_id), 'op': 'delete', 'timestamp': timestamp}
+
+
+class SyncTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='syncuser', email='sync@example.com', password='x')
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('sync-changes')
+
+    def _push(self, device, *changes):
+        return self.client.post(self.url, {'device': device, 'changes': list(changes)}, format='json')
+
+    def _pull(self, cursor=0, **params):
+        return self.client.get(self.url, {'cursor': cursor, **params})
+
+    def test_push_then_pull(self):
+        response = self._push('phone', upsert(1, now_ms(), status='planned'), upsert(2, now_ms(), status='finished'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'applied': 2, 'conflicts': []})
+
+        response = self._pull(device='tablet')
+        self.assertEqual([change['id'] for change in response.data['changes']], ['1', '2'])
+        self.assertEqual(response.data['changes'][0]['data'], {'id': 1, 'status': 'planned'})
+        self.assertEqual(response.data['changes'][0]['device'], 'phone')
+        self.assertFalse(response.data['has_more'])
+
+        response = self._pull(response.data['cursor'], device='tablet')
+        self.assertEqual(response.data['changes'], [])
+
+    def test_pull_skips_own_changes_but_advances(self):
+        self._push('phone', upsert(1, now_ms()))
+        response = self._pull(device='phone')
+        self.assertEqual(response.data['changes'], [])
+        self.assertEqual(response.data['cursor'], SyncChange.objects.get().id)
+
+    def test_pull_pages(self):
+        self._push('phone', *[upsert(i, now_ms()) for i in range(5)])
+        first = self._pull(limit=3)
+        self.assertEqual(len(first.data['changes']), 3)
+        self.assertTrue(first.data['has_more'])
+        second = self._pull(first.data['cursor'], limit=3)
+        self.assertEqual([change['id'] for change in second.data['changes']], ['3', '4'])
+        self.assertFalse(second.data['has_more'])
+
+    def test_last_writer_wins(self):
+        timestamp = now_ms(-60_000)
+        self._push('phone', upsert(1, timestamp, notes='phone'))
+
+        response = self._push('tablet', upsert(1, timestamp - 1, notes='stale'))
+        self.assertEqual(response.data['applied'], 0)
+        conflict = response.data['conflicts'][0]
+        self.assertEqual((conflict['table'], conflict['id']), ('climbs', '1'))
+        self.assertEqual(conflict['server']['data']['notes'], 'phone')
+
+        # Equal clocks: the greater device id wins.
+        self.assertEqual(self._push('tablet', upsert(1, timestamp, notes='tablet')).data['applied'], 1)
+        self.assertEqual(self._push('laptop', upsert(1, timestamp, notes='laptop')).data['applied'], 0)
+
+        self.assertEqual(self._push('laptop', upsert(1, timestamp + 1, notes='laptop')).data['applied'], 1)
+        latest = self._pull().data['changes'][-1]
+        self.assertEqual(latest['data']['notes'], 'laptop')
+
+    def test_changes_in_one_push_apply_in_order(self):
+        response = self._push('phone', upsert(1, now_ms(-2), notes='a'), upsert(1, now_ms(-1), notes='b'),
+                              delete(1, now_ms()))
+        self.assertEqual(response.data['applied'], 3)
+        self.assertEqual(self._pull().data['changes'][-1]['op'], 'delete')
+
+    def test_tables_are_separate(self):
+        self._push('phone', upsert(1, now_ms(), table='routes'))
+        self.assertEqual(self._push('phone', upsert(1, now_ms(-1000), table='climbs')).data['applied'], 1)
+
+    def test_invalid_pushes(self):
+        cases = [
+            upsert(1, now_ms(), table='users'),
+            {'table': 'climbs', 'id': '1', 'op': 'upsert', 'timestamp': now_ms()},
+            {**upsert(1, now_ms()), 'data': {'id': 2}},
+            upsert(1, now_ms(3_600_000)),
+        ]
+        for change in cases:
+            with self.subTest(change=change):
+                self.assertEqual(self._push('phone', change).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post(self.url, {'device': 'phone', 'changes': []}, format='json').status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(SyncChange.objects.exists())
+
+    def test_users_are_isolated(self):
+        self._push('phone', upsert(1, now_ms()))
+        other = User.objects.create_user(username='other', email='other@example.com', password='x')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self._pull().data['changes'], [])
+        self.assertEqual(self._push('phone', upsert(1, now_ms(-1000))).data['applied'], 1)
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self._pull().status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class SyncCheckpointTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='syncuser', email='sync@example.com', password='x')
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('sync-changes')
+
+    def _push(self, *changes):
+        return self.client.post(self.url, {'device': 'phone', 'changes': list(changes)}, format='json')
+
+    def _upload(self, blob, cursor):
+        return self.client.post(reverse('backup-upload'), blob, content_type='application/octet-stream',
+                                headers={'X-Sync-Cursor': str(cursor)})
+
+    def _age_changes(self):
+        SyncChange.objects.update(created_at=SyncChange.objects.first().created_at - timedelta(days=60))
+
+    def test_upload_records_sync_cursor(self):
+        self.assertEqual(self._upload(b'snapshot', 42).status_code, status.HTTP_200_OK)
+        self.assertEqual(UserBackup.objects.get(user=self.user).sync_cursor, 42)
+        self.assertEqual(self.client.get(reverse('backup-download-raw'))['X-Sync-Cursor'], '42')
+        self.assertEqual(self.client.get(reverse('backup-download'))['X-Sync-Cursor'], '42')
+
+        # The same snapshot taken later only moves the cursor.
+        self._upload(b'snapshot', 50)
+        backup = UserBackup.objects.get(user=self.user)
+        self.assertEqual((backup.version, backup.sync_cursor), (1, 50))
+
+    def test_invalid_sync_cursor_header(self):
+        response = self._upload(b'snapshot', 'soon')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(UserBackup.objects.exists())
+
+    def test_compaction_drops_superseded_changes(self):
+        self._push(upsert(1, now_ms(-3), notes='a'), upsert(1, now_ms(-2), notes='b'), upsert(2, now_ms(-1)))
+        stdout = StringIO()
+        call_command('compact_sync', stdout=stdout)
+        self.assertIn('Dropped 1 superseded changes and 0 deletions', stdout.getvalue())
+
+        changes = self.client.get(self.url, {'cursor': 0}).data['changes']
+        self.assertEqual([(change['id'], change['data'].get('notes')) for change in changes],
+                         [('1', 'b'), ('2', None)])
+
+    def test_deletions_are_kept_until_checkpointed(self):
+        self._push(upsert(1, now_ms(-2)), delete(1, now_ms(-1)))
+        self._age_changes()
+        call_command('compact_sync', stdout=StringIO())
+        self.assertEqual(SyncChange.objects.filter(deleted=True).count(), 1)
+
+        cursor = SyncChange.objects.get(deleted=True).id
+        self._upload(b'snapshot', cursor)
+        call_command('compact_sync', stdout=StringIO())
+        self.assertFalse(SyncChange.objects.exists())
+        self.assertEqual(SyncState.objects.get(user=self.user).pruned_through, cursor)
+
+        response = self.client.get(self.url, {'cursor': cursor - 1})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertEqual(response.data['sync_cursor'], cursor)
+        self.assertEqual(self.client.get(self.url, {'cursor': cursor}).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(self.url, {'cursor': 0}).status_code, status.HTTP_200_OK)
+
+    def test_recent_deletions_are_kept(self):
+        self._push(delete(1, now_ms()))
+        self._upload(b'snapshot', SyncChange.objects.get().id)
+        call_command('compact_sync', stdout=StringIO())
+        self.assertTrue(SyncChange.objects.exists())
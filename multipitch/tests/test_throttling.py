@@ -0,0 +1,110 @@
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.settings import api_settings
+from rest_framework.test import APITestCase
+from multipitch.throttling import CacheBucketStore, LocalBucketStore, get_bucket_store, parse_rate
+
+User = get_user_model()
+
+
+class BucketStoreTests(SimpleTestCase):
+    def assertBucketBehaviour(self, store, clock):
+        with mock.patch(clock, return_value=1000.0):
+            self.assertEqual([store.consume('k', 2, 0.5) for _ in range(3)], [0, 0, 2.0])
+            self.assertEqual(store.consume('other', 2, 0.5), 0)
+        with mock.patch(clock, return_value=1001.0):
+            self.assertEqual(store.consume('k', 2, 0.5), 1.0)
+        with mock.patch(clock, return_value=1002.0):
+            self.assertEqual(store.consume('k', 2, 0.5), 0)
+        with mock.patch(clock, return_value=5000.0):
+            self.assertEqual([store.consume('k', 2, 0.5) for _ in range(3)], [0, 0, 2.0])
+
+    def test_local_store(self):
+        self.assertBucketBehaviour(LocalBucketStore(), 'multipitch.throttling.time.monotonic')
+
+    def test_cache_store(self):
+        store = CacheBucketStore()
+        self.addCleanup(store.clear)
+        self.assertBucketBehaviour(store, 'multipitch.throttling.time.time')
+
+    def test_cache_store_clear_keeps_other_entries(self):
+        store = CacheBucketStore()
+        self.addCleanup(store.clear)
+        store.cache.set('unrelated', 'kept')
+        self.addCleanup(store.cache.delete, 'unrelated')
+        with mock.patch('multipitch.throttling.time.time', return_value=1000.0):
+            self.assertEqual([store.consume('k', 1, 0.5) for _ in range(2)], [0, 2.0])
+            store.clear()
+            self.assertEqual(store.consume('k', 1, 0.5), 0)
+        self.assertEqual(store.cache.get('unrelated'), 'kept')
+
+    def test_local_store_is_bounded(self):
+        store = LocalBucketStore(max_entries=2)
+        for key in 'abc':
+            store.consume(key, 1, 1)
+        self.assertEqual(list(store._buckets), ['b', 'c'])
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('10/min'), (10, 60))
+        self.assertEqual(parse_rate('60/hour'), (60, 3600))
+
+
+RATES = {**api_settings.DEFAULT_THROTTLE_RATES, 'login': '2/min', 'backup_download': '1/hour'}
+
+
+@override_settings(
+    REST_FRAMEWORK={**api_settings.user_settings, 'DEFAULT_THROTTLE_RATES': RATES},
+    THROTTLE_STORE={'BACKEND': 'multipitch.throttling.LocalBucketStore'},
+)
+class ThrottledViewTests(APITestCase):
+    def setUp(self):
+        get_bucket_store().clear()
+        self.user = User.objects.create_user(
+            username='throttleuser',
+            email='throttle@example.com',
+            password='StrongPass123!'
+        )
+
+    def test_login_is_throttled_per_ip(self):
+        payload = {'email': 'throttle@example.com', 'password': 'wrong'}
+        for _ in range(2):
+            response = self.client.post(reverse('login'), payload, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(reverse('login'), payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn(int(response['Retry-After']), range(1, 31))  # refills 2 tokens/min
+
+        response = self.client.post(reverse('login'), payload, format='json', REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_backup_downloads_are_throttled_per_user(self):
+        other = User.objects.create_user(username='other', email='other@example.com', password='StrongPass123!')
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get(reverse('backup-download')).status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse('backup-download-raw'))
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(reverse('backup-download')).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_throttled_upload_body_is_not_parsed(self):
+        self.client.force_authenticate(user=self.user)
+        with mock.patch('multipitch.throttling.LocalBucketStore.consume', return_value=12.5), \
+                mock.patch('multipitch.parsers.OctetStreamParser.parse') as parse:
+            response = self.client.post(reverse('backup-upload'), b'x' * 1000, content_type='application/octet-stream')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '13')
+        parse.assert_not_called()
+
+    async def test_async_views_are_throttled(self):
+        payload = {'email': 'throttle@example.com', 'password': 'wrong'}
+        for _ in range(2):
+            await self.async_client.post(reverse('async-login'), payload, content_type='application/json')
+        response = await self.async_client.post(reverse('async-login'), payload, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn(int(response['Retry-After']), range(1, 31))  # refills 2 tokens/min
@@ -0,0 +1,183 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.contrib.auth import get_user_model
+from multipitch.models import UserBackup, BackupUploadSession, Job
+from multipitch.services.backup_service import read_backup
+
+User = get_user_model()
+
+
+class UploadSessionTests(APITestCase):
+    def setUp(self):
+        self.staging_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.staging_dir, ignore_errors=True)
+        settings_override = override_settings(
+            BACKUP_STAGING_DIR=self.staging_dir,
+            BACKUP_SESSION_CHUNK_SIZE=1024,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user(
+            username='sessionuser',
+            email='session@example.com',
+            password='StrongPass123!'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.blob = bytes(range(256)) * 10
+        self.chunks = [self.blob[i:i + 1024] for i in range(0, len(self.blob), 1024)]
+
+    def _create(self):
+        response = self.client.post(reverse('upload-session-create'))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['session_id']
+
+    def _put(self, session_id, index, data):
+        url = reverse('upload-session-chunk', args=[session_id, index])
+        return self.client.put(url, data, content_type='application/octet-stream')
+
+    def _commit(self, session_id, chunk_count, sha256):
+        url = reverse('upload-session-commit', args=[session_id])
+        return self.client.post(url, {'chunk_count': chunk_count, 'sha256': sha256}, format='json')
+
+    def test_full_upload_flow(self):
+        session_id = self._create()
+        for index, chunk in enumerate(self.chunks):
+            self.assertEqual(self._put(session_id, index, chunk).status_code, status.HTTP_200_OK)
+
+        response = self._commit(session_id, len(self.chunks), hashlib.sha256(self.blob).hexdigest())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(read_backup(UserBackup.objects.get(user=self.user)), self.blob)
+        self.assertFalse(BackupUploadSession.objects.exists())
+
+    def test_resume_reports_received_chunks(self):
+        session_id = self._create()
+        self._put(session_id, 0, self.chunks[0])
+        self._put(session_id, 2, self.chunks[2])
+        response = self.client.get(reverse('upload-session-detail', args=[session_id]))
+        self.assertEqual(response.data['received_chunks'], [0, 2])
+
+    def test_retried_chunk_replaces_previous_attempt(self):
+        session_id = self._create()
+        self._put(session_id, 0, b'x' * 1024)
+        for index, chunk in enumerate(self.chunks):
+            self._put(session_id, index, chunk)
+        response = self._commit(session_id, len(self.chunks), hashlib.sha256(self.blob).hexdigest())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(read_backup(UserBackup.objects.get(user=self.user)), self.blob)
+
+    def test_commit_with_missing_chunk(self):
+        session_id = self._create()
+        self._put(session_id, 0, self.chunks[0])
+        response = self._commit(session_id, len(self.chunks), hashlib.sha256(self.blob).hexdigest())
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['missing_chunks'], [1, 2])
+        self.assertEqual(response.data['missing_count'], 2)
+
+    @override_settings(BACKUP_MAX_SIZE=3000)
+    def test_commit_past_the_maximum_chunk_count_rejected(self):
+        session_id = self._create()
+        response = self._commit(session_id, 2_000_000, hashlib.sha256(self.blob).hexdigest())
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._commit(session_id, 3, '0' * 64).data['missing_count'], 3)
+
+    @override_settings(BACKUP_MAX_SIZE=1024 * 1024)
+    def test_missing_chunks_are_summarised(self):
+        session_id = self._create()
+        response = self._commit(session_id, 1024, hashlib.sha256(self.blob).hexdigest())
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['missing_count'], 1024)
+        self.assertEqual(response.data['missing_chunks'], list(range(100)))
+
+    def test_commit_with_wrong_checksum(self):
+        session_id = self._create()
+        for index, chunk in enumerate(self.chunks):
+            self._put(session_id, index, chunk)
+        response = self._commit(session_id, len(self.chunks), '0' * 64)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('sha256', response.data)
+        self.assertFalse(UserBackup.objects.filter(user=self.user).exists())
+
+    def test_oversized_chunk_rejected(self):
+        session_id = self._create()
+        response = self._put(session_id, 0, b'x' * 1025)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(BACKUP_MAX_SIZE=3000)
+    def test_chunk_index_past_the_maximum_rejected(self):
+        session_id = self._create()
+        self.assertEqual(self._put(session_id, 2, self.chunks[2]).status_code, status.HTTP_200_OK)
+        response = self._put(session_id, 3, self.chunks[0])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(BACKUP_MAX_SIZE=2500)
+    def test_session_size_is_capped(self):
+        session_id = self._create()
+        self._put(session_id, 0, self.chunks[0])
+        self._put(session_id, 1, self.chunks[1])
+        response = self._put(session_id, 2, b'x' * 1024)
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertEqual(self._put(session_id, 2, b'x' * 452).status_code, status.HTTP_200_OK)
+        # Replacing a received chunk does not count it twice.
+        self.assertEqual(self._put(session_id, 0, self.chunks[0]).status_code, status.HTTP_200_OK)
+        response = self.client.get(reverse('upload-session-detail', args=[session_id]))
+        self.assertEqual(response.data['received_chunks'], [0, 1, 2])
+
+    def test_expired_session_not_found(self):
+        session_id = self._create()
+        BackupUploadSession.objects.filter(id=session_id).update(expires_at=timezone.now() - timedelta(seconds=1))
+        response = self._put(session_id, 0, self.chunks[0])
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(BACKUP_MAX_OPEN_SESSIONS=2)
+    def test_open_sessions_per_user_are_capped(self):
+        first = self._create()
+        self._create()
+        response = self.client.post(reverse('upload-session-create'))
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        # An expired session no longer counts, and its chunks are discarded.
+        self._put(first, 0, self.chunks[0])
+        BackupUploadSession.objects.filter(id=first).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self._create()
+        self.assertFalse(BackupUploadSession.objects.filter(id=first).exists())
+        self.assertFalse(os.path.exists(os.path.join(self.staging_dir, first)))
+
+    def test_expired_sessions_are_purged_by_a_job(self):
+        session_id = self._create()
+        self._put(session_id, 0, self.chunks[0])
+        BackupUploadSession.objects.filter(id=session_id).update(expires_at=timezone.now() - timedelta(seconds=1))
+        live = self._create()
+
+        call_command('run_jobs', '--burst', '--kind', 'purge_upload_sessions', stdout=StringIO())
+        [job] = Job.objects.filter(kind='purge_upload_sessions')
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        call_command('run_jobs', '--burst', '--kind', 'purge_upload_sessions', stdout=StringIO())
+
+        self.assertEqual([str(pk) for pk in BackupUploadSession.objects.values_list('id', flat=True)], [live])
+        self.assertFalse(os.path.exists(os.path.join(self.staging_dir, session_id)))
+        self.assertEqual(Job.objects.filter(kind='purge_upload_sessions', state='queued').count(), 1)
+
+    def test_other_users_session_not_found(self):
+        session_id = self._create()
+        other = User.objects.create_user(username='other', email='other@example.com', password='StrongPass123!')
+        self.client.force_authenticate(user=other)
+        response = self._put(session_id, 0, self.chunks[0])
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_abort_session(self):
+        session_id = self._create()
+        self._put(session_id, 0, self.chunks[0])
+        response = self.client.delete(reverse('upload-session-detail', args=[session_id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(BackupUploadSession.objects.exists())
@@ -0,0 +1,128 @@
+import hashlib
+import io
+from unittest import mock
+from django.db import connection
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.contrib.auth import get_user_model
+from multipitch.models import BackupVersion, UserBackup
+from multipitch.services import backup_service, version_service
+from multipitch.services.backup_service import read_backup, save_backup
+from multipitch.storage import get_blob_store
+from multipitch.tests.test_delta import make_sqlite
+
+User = get_user_model()
+
+
+@override_settings(BACKUP_VERSION_RETENTION=3)
+class BackupVersionTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='versionuser',
+            email='version@example.com',
+            password='StrongPass123!'
+        )
+        self.client.force_authenticate(user=self.user)
+        rows = [(i, f'route {i} ' * 30) for i in range(300)]
+        self.snapshots = [make_sqlite(rows[:250 + 10 * n]) for n in range(5)]
+
+    def _upload_all(self, snapshots):
+        for blob in snapshots:
+            save_backup(self.user, io.BytesIO(blob))
+
+    def test_upload_keeps_previous_backup_as_version(self):
+        self._upload_all(self.snapshots[:2])
+        backup = UserBackup.objects.get(user=self.user)
+        self.assertEqual(backup.version, 2)
+        version = BackupVersion.objects.get(user=self.user)
+        self.assertEqual(version.number, 1)
+        self.assertEqual(version.sha256, hashlib.sha256(self.snapshots[0]).hexdigest())
+
+    def test_versions_are_stored_as_small_deltas(self):
+        self._upload_all(self.snapshots[:2])
+        version = BackupVersion.objects.get(user=self.user)
+        self.assertTrue(version.is_delta)
+        self.assertLess(version.stored_size, len(self.snapshots[0]) // 4)
+
+    def test_reconstruct_every_version(self):
+        self._upload_all(self.snapshots)
+        for number in (2, 3, 4):
+            with version_service.reconstruct(self.user, number) as content:
+                self.assertEqual(content.read(), self.snapshots[number - 1])
+
+    def test_retention_prunes_oldest_versions(self):
+        self._upload_all(self.snapshots)
+        numbers = list(BackupVersion.objects.filter(user=self.user).values_list('number', flat=True))
+        self.assertEqual(numbers, [4, 3, 2])
+
+    def test_full_version_when_delta_does_not_help(self):
+        save_backup(self.user, io.BytesIO(b'a' * 1000))
+        old_key = UserBackup.objects.get(user=self.user).blob_key
+        save_backup(self.user, io.BytesIO(b'b' * 1000))
+        version = BackupVersion.objects.get(user=self.user)
+        self.assertFalse(version.is_delta)
+        self.assertEqual(version.blob_key, old_key)
+        self.assertTrue(get_blob_store().exists(old_key))
+        with version_service.reconstruct(self.user, 1) as content:
+            self.assertEqual(content.read(), b'a' * 1000)
+
+    def test_blobs_are_prepared_outside_the_lock_and_redone_when_replaced(self):
+        self._upload_all(self.snapshots[:1])
+        real_prepare = backup_service._prepare
+        outer_blocks = len(connection.atomic_blocks)
+        prepared_keys = []
+
+        def prepare(user, current, blob, upload, written):
+            self.assertEqual(len(connection.atomic_blocks), outer_blocks)
+            result = real_prepare(user, current, blob, upload, written)
+            prepared_keys.extend(written)
+            if len(prepared_keys) == len(written):
+                # Another device uploads before this save takes the lock.
+                with mock.patch.object(backup_service, '_prepare', real_prepare):
+                    save_backup(self.user, io.BytesIO(self.snapshots[1]))
+            return result
+
+        with mock.patch.object(backup_service, '_prepare', prepare):
+            backup, created, changed = save_backup(self.user, io.BytesIO(self.snapshots[2]))
+
+        self.assertTrue(changed)
+        self.assertEqual(backup.version, 3)
+        with version_service.reconstruct(self.user, 2) as content:
+            self.assertEqual(content.read(), self.snapshots[1])
+        with version_service.reconstruct(self.user, 1) as content:
+            self.assertEqual(content.read(), self.snapshots[0])
+        # The blobs prepared against the first backup were discarded.
+        stale = [key for key in prepared_keys if key != backup.blob_key
+                 and not BackupVersion.objects.filter(blob_key=key).exists()]
+        self.assertTrue(stale)
+        self.assertFalse(any(get_blob_store().exists(key) for key in stale))
+
+    def test_list_versions(self):
+        self._upload_all(self.snapshots[:3])
+        response = self.client.get(reverse('backup-versions'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['current']['version'], 3)
+        self.assertEqual([v['version'] for v in response.data['versions']], [2, 1])
+        self.assertEqual(response.data['versions'][0]['size'], len(self.snapshots[1]))
+
+    def test_restore_version(self):
+        self._upload_all(self.snapshots[:3])
+        response = self.client.post(reverse('backup-version-restore', args=[1]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        backup = UserBackup.objects.get(user=self.user)
+        self.assertEqual(read_backup(backup), self.snapshots[0])
+        self.assertEqual(backup.version, 4)
+        with version_service.reconstruct(self.user, 3) as content:
+            self.assertEqual(content.read(), self.snapshots[2])
+
+    def test_restore_unknown_version(self):
+        self._upload_all(self.snapshots[:1])
+        response = self.client.post(reverse('backup-version-restore', args=[7]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_restore_with_stale_if_match(self):
+        self._upload_all(self.snapshots[:2])
+        response = self.client.post(reverse('backup-version-restore', args=[1]), HTTP_IF_MATCH='"stale"')
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
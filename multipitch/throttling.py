@@ -0,0 +1,150 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.utils.module_loading import import_string
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """Parse a DRF-style rate such as '10/min' into (capacity, seconds)."""
+    num, period = rate.split('/')
+    return int(num), PERIODS[period[0]]
+
+
+def refill(state, capacity, refill_rate, now):
+    """Return the bucket's token count at `now`; a missing bucket is full."""
+    if state is None:
+        return capacity
+    tokens, updated = state
+    return min(capacity, tokens + max(now - updated, 0) * refill_rate)
+
+
+class BucketStore:
+    """
+    Interface for token-bucket storage. consume() takes one token from the
+    bucket `key` and returns 0, or the seconds until a token is available
+    if the bucket is empty.
+    """
+
+    def consume(self, key, capacity, refill_rate):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class LocalBucketStore(BucketStore):
+    """
+    In-process buckets, limited to `max_entries` with least recently used
+    eviction. An evicted bucket comes back full, which only errs on the
+    side of allowing requests. Each process enforces its own budget.
+    """
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_rate):
+        now = time.monotonic()
+        with self._lock:
+            tokens = refill(self._buckets.get(key), capacity, refill_rate, now)
+            wait = 0 if tokens >= 1 else (1 - tokens) / refill_rate
+            self._buckets[key] = (tokens - 1 if wait == 0 else tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBucketStore(BucketStore):
+    """
+    Buckets kept in a Django cache shared by every process. The
+    read-modify-write is not atomic, so concurrent requests on one bucket
+    can occasionally both get the last token; entries expire once the
+    bucket would be full again. Bucket keys live under `key_prefix` and a
+    generation number kept in the cache, so clear() drops this store's
+    buckets without touching anything else in a shared cache.
+    """
+
+    def __init__(self, cache='default', key_prefix='throttle'):
+        self.cache = caches[cache]
+        self.key_prefix = key_prefix
+        self.generation_key = f"{key_prefix}:generation"
+
+    def _generation(self):
+        return self.cache.get(self.generation_key, 1)
+
+    def consume(self, key, capacity, refill_rate):
+        now = time.time()
+        cache_key = f"{self.key_prefix}:{key}"
+        generation = self._generation()
+        tokens = refill(self.cache.get(cache_key, version=generation), capacity, refill_rate, now)
+        wait = 0 if tokens >= 1 else (1 - tokens) / refill_rate
+        if wait == 0:
+            tokens -= 1
+        timeout = int((capacity - tokens) / refill_rate) + 1
+        self.cache.set(cache_key, (tokens, now), timeout, version=generation)
+        return wait
+
+    def clear(self):
+        """Move to a new generation; the old buckets expire on their own."""
+        try:
+            self.cache.incr(self.generation_key)
+        except ValueError:
+            self.cache.add(self.generation_key, 2, None)
+
+
+@lru_cache(maxsize=None)
+def get_bucket_store():
+    config = settings.THROTTLE_STORE
+    return import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+
+
+def _reset_bucket_store(setting, **kwargs):
+    if setting == 'THROTTLE_STORE':
+        get_bucket_store.cache_clear()
+
+
+setting_changed.connect(_reset_bucket_store)
+
+
+class ScopedTokenBucketThrottle(BaseThrottle):
+    """
+    Token-bucket throttle for views that set `throttle_scope`. A rate of
+    'N/period' in DEFAULT_THROTTLE_RATES allows bursts of N requests and
+    refills N tokens per period. Buckets are kept per user, or per client
+    IP for anonymous requests. DRF runs throttles before the handler, so a
+    throttled request's body is never read.
+    """
+
+    def allow_request(self, request, view):
+        self._wait = 0
+        scope = getattr(view, 'throttle_scope', None)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope) if scope else None
+        if rate is None:
+            return True
+
+        capacity, period = parse_rate(rate)
+        self._wait = get_bucket_store().consume(self.get_bucket_key(request, scope), capacity, capacity / period)
+        return self._wait == 0
+
+    def get_bucket_key(self, request, scope):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f"{scope}:user:{user.pk}"
+        return f"{scope}:ip:{self.get_ident(request)}"
+
+    def wait(self):
+        return self._wait
@@ -0,0 +1,37 @@
+from django.conf import settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from rest_framework_simplejwt.utils import aware_utcnow, datetime_from_epoch
+
+# Claim carrying UserAuth.token_version. Tokens issued before the claim
+# existed are treated as version 0.
+TOKEN_VERSION_CLAIM = 'ver'
+
+
+class TokenVersionMixin:
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[TOKEN_VERSION_CLAIM] = user.token_version
+        return token
+
+
+class VersionedRefreshToken(TokenVersionMixin, RefreshToken):
+    pass
+
+
+class VersionedAccessToken(TokenVersionMixin, AccessToken):
+    pass
+
+
+def renew_access_token(user, token):
+    """
+    Sliding renewal: return a new encoded access token for `user` when the
+    validated `token` is within ACCESS_TOKEN_RENEWAL_THRESHOLD of expiring,
+    otherwise `token` as it was sent. Access tokens are not tracked by the
+    blacklist app, so renewing does not write to the database.
+    """
+    expires_at = datetime_from_epoch(token['exp'])
+    if expires_at - aware_utcnow() > settings.ACCESS_TOKEN_RENEWAL_THRESHOLD:
+        raw = token.token
+        return raw.decode() if isinstance(raw, bytes) else raw
+    return str(VersionedAccessToken.for_user(user))
@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from django.conf import settings
+from django.core.signals import setting_changed
+
+
+class UserCache:
+    """
+    Bounded, thread-safe LRU cache of authenticated users with a TTL.
+
+    Entries are keyed by user id and remember the token version they were
+    loaded for, so a token minted for another version always misses.
+    Invalidation is per process; the TTL bounds how long another worker can
+    keep serving a user that was changed elsewhere.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, token_version):
+        key = str(user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            version, user, expires_at = entry
+            if version != token_version or expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return user
+
+    def set(self, user_id, token_version, user):
+        if self.max_size <= 0:
+            return
+        key = str(user_id)
+        with self._lock:
+            self._entries[key] = (token_version, user, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(str(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+@lru_cache(maxsize=None)
+def get_user_cache():
+    config = settings.JWT_USER_CACHE
+    return UserCache(max_size=config['MAX_SIZE'], ttl=config['TTL'])
+
+
+def _reset_user_cache(setting, **kwargs):
+    if setting == 'JWT_USER_CACHE':
+        get_user_cache.cache_clear()
+
+
+setting_changed.connect(_reset_user_cache)
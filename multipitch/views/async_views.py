@@ -0,0 +1,297 @@
+"""
+Async versions of the login, /me and backup upload/download endpoints, and
+the backup change notifications, for ASGI deployments. Under ASGI, Django
+receives request bodies without holding a thread, and these views only
+hand blocking work to threads: CPU-bound steps (password hashing, Base64,
+copying and decoding blobs) run on bounded executors, database work goes
+through the async ORM or sync_to_async.
+"""
+import asyncio
+import json
+import math
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import APIException, AuthenticationFailed, ParseError, Throttled, ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+from multipitch.authentication import CachedJWTAuthentication, authenticate_async
+from multipitch.executor import aiter_cpu, run_cpu
+from multipitch.hashing import HashingBusy, acheck_user_password
+from multipitch.models import UserAuth, UserBackup
+from multipitch.notifications import get_hub
+from multipitch.parsers import Base64JSONParser, OctetStreamParser
+from multipitch.serializers.auth_serializers import CredentialsSerializer, MeSerializer, user_with_tokens
+from multipitch.serializers.backup_serializers import UserBackupSerializer
+from multipitch.services.backup_service import PreconditionFailed, save_backup
+from multipitch.throttling import ScopedTokenBucketThrottle
+from multipitch.tokens import renew_access_token
+from multipitch.views.auth_views import hashing_busy_response
+from multipitch.views.backup_views import (
+    backup_metadata, backup_saved_data, download_encoding, plan_download, set_backup_headers,
+    sync_cursor_header
+)
+
+RAW_MEDIA_TYPES = ('application/octet-stream', 'application/x-sqlite3')
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    # DRF's encoder, so payloads match the sync views byte for byte.
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+def _read_json(request):
+    try:
+        return json.loads(request.body or b'{}')
+    except ValueError as exc:
+        raise ParseError(f"JSON parse error - {exc}")
+
+
+def _is_empty(upload):
+    empty = not upload.read(1)
+    upload.seek(0)
+    return empty
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncAPIView(View):
+    """
+    Base for async endpoints. Like APIView, it is CSRF-exempt and
+    authenticates bearer tokens, setting request.user and request.auth,
+    and applies ScopedTokenBucketThrottle to views with a `throttle_scope`.
+    """
+    authenticate_requests = True
+    require_authentication = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user, request.auth = AnonymousUser(), None
+        if self.authenticate_requests:
+            try:
+                result = await authenticate_async(request)
+            except AuthenticationFailed as exc:
+                detail = exc.detail if isinstance(exc.detail, dict) else {"detail": exc.detail}
+                return self._unauthorized(request, detail)
+            if result is not None:
+                request.user, request.auth = result
+
+        if self.require_authentication and request.auth is None:
+            return self._unauthorized(request, {"detail": "Authentication credentials were not provided."})
+        throttle = ScopedTokenBucketThrottle()
+        # The bucket store may be a shared cache, so keep its I/O off the loop.
+        if not await sync_to_async(throttle.allow_request)(request, self):
+            exc = Throttled(throttle.wait())
+            response = json_response({"detail": exc.detail}, status=exc.status_code)
+            response['Retry-After'] = str(math.ceil(exc.wait))
+            return response
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except APIException as exc:
+            detail = exc.detail if isinstance(exc.detail, (dict, list)) else {"detail": exc.detail}
+            return json_response(detail, status=exc.status_code)
+
+    def _unauthorized(self, request, detail):
+        response = json_response(detail, status=status.HTTP_401_UNAUTHORIZED)
+        response['WWW-Authenticate'] = CachedJWTAuthentication().authenticate_header(request)
+        return response
+
+
+class AsyncLoginView(AsyncAPIView):
+    throttle_scope = 'login'
+    authenticate_requests = False
+    require_authentication = False
+
+    async def post(self, request):
+        serializer = CredentialsSerializer(data=_read_json(request))
+        if not serializer.is_valid():
+            return json_response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        email = serializer.validated_data['email']
+        password = serializer.validated_data['password']
+        user = await UserAuth.objects.filter(email=email).afirst()
+        try:
+            valid = user is not None and await acheck_user_password(user, password)
+        except HashingBusy:
+            return hashing_busy_response(json_response)
+        if not valid:
+            return json_response(
+                {"non_field_errors": ["Invalid email or password."]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return json_response(await sync_to_async(user_with_tokens)(user))
+
+
+class AsyncMeView(AsyncAPIView):
+    require_authentication = False
+
+    async def get(self, request):
+        if request.auth is None:
+            return json_response({"user": None})
+        return json_response({
+            "user": MeSerializer(request.user).data,
+            "access": renew_access_token(request.user, request.auth),
+        })
+
+
+class AsyncBackupUploadView(AsyncAPIView):
+    throttle_scope = 'backup_upload'
+
+    async def post(self, request):
+        """
+        Save or replace the current user's backup; same contract as
+        BackupUploadView.
+        """
+        if request.content_type in RAW_MEDIA_TYPES:
+            upload = await run_cpu(OctetStreamParser().parse, request)
+        elif request.content_type == 'application/json':
+            upload = await run_cpu(Base64JSONParser().parse, request)
+        else:
+            return json_response(
+                {"detail": f'Unsupported media type "{request.content_type}" in request.'},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
+
+        # The upload may be spooled to disk, so even probing it is file I/O.
+        try:
+            if await run_cpu(_is_empty, upload):
+                return json_response(
+                    {"sqlite_blob": ["Backup file cannot be empty."]},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            try:
+                backup, created, changed = await sync_to_async(save_backup)(
+                    request.user, upload, if_match=request.headers.get('If-Match'),
+                    sync_cursor=sync_cursor_header(request)
+                )
+            except PreconditionFailed:
+                return json_response(
+                    {"detail": "Backup was changed by another device."},
+                    status=status.HTTP_412_PRECONDITION_FAILED
+                )
+        finally:
+            await run_cpu(upload.close)
+
+        response = json_response(backup_saved_data(backup, changed))
+        response['ETag'] = backup.etag
+        return response
+
+
+async def _current_backup(request, raw=False):
+    """
+    The user's backup, or (None, response) when there is none or it matches
+    If-None-Match. `raw` gives the 304 the ETag of the raw download.
+    """
+    backup = await UserBackup.objects.filter(user=request.user).afirst()
+    if backup is None:
+        return None, json_response({"detail": "No backup found."}, status=status.HTTP_404_NOT_FOUND)
+    if backup.etag_matches(request.headers.get('If-None-Match')):
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        response['ETag'] = backup.encoded_etag(download_encoding(request.headers, backup) if raw else None)
+        return None, response
+    return backup, None
+
+
+class AsyncBackupRetrieveView(AsyncAPIView):
+    throttle_scope = 'backup_download'
+
+    async def get(self, request):
+        backup, response = await _current_backup(request)
+        if backup is None:
+            return response
+        data = await run_cpu(lambda: UserBackupSerializer(backup).data)
+        response = json_response(data)
+        response['ETag'] = backup.etag
+        set_backup_headers(response, backup)
+        return response
+
+
+class AsyncBackupStreamView(AsyncAPIView):
+    throttle_scope = 'backup_download'
+
+    async def get(self, request):
+        """
+        Stream the current user's backup as raw bytes; same contract as
+        BackupStreamView. Blob reads and decoding run on the CPU executor
+        one chunk at a time, so a slow client holds no thread.
+        """
+        backup, response = await _current_backup(request, raw=True)
+        if backup is None:
+            return response
+
+        plan = plan_download(request.headers, backup)
+        if plan.status == status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE:
+            response = HttpResponse(status=plan.status)
+        else:
+            chunks = aiter_cpu(plan.read(backup, plan.start, plan.end))
+            response = StreamingHttpResponse(chunks, status=plan.status)
+        for header, value in plan.headers.items():
+            response[header] = value
+        return response
+
+
+class AsyncBackupChangesView(AsyncAPIView):
+    throttle_scope = 'backup_changes'
+
+    async def get(self, request):
+        """
+        Wait until the current user's backup no longer matches the ETag in
+        `If-None-Match`, then return its metadata, so other devices learn
+        about an upload without polling the download endpoints. Answers 304
+        after `timeout` seconds (at most BACKUP_CHANGES_TIMEOUT) without a
+        change. With `Accept: text/event-stream` the response is an event
+        stream instead, sending a `backup` event, with the ETag as its id,
+        for every change; `Last-Event-ID` then takes over from If-None-Match.
+        Waiting holds no thread; see multipitch.notifications.
+        """
+        if 'text/event-stream' in request.headers.get('Accept', ''):
+            known = request.headers.get('Last-Event-ID') or request.headers.get('If-None-Match')
+            response = StreamingHttpResponse(self._events(request.user, known), content_type='text/event-stream')
+            response['Cache-Control'] = 'no-cache'
+            # Keep nginx from buffering events.
+            response['X-Accel-Buffering'] = 'no'
+            return response
+
+        timeout = self._timeout(request)
+        known = request.headers.get('If-None-Match')
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        with get_hub().subscribe(request.user.pk) as subscription:
+            while True:
+                backup = await UserBackup.objects.filter(user=request.user).afirst()
+                if backup is not None and not backup.etag_matches(known):
+                    response = json_response(backup_metadata(backup))
+                    response['ETag'] = backup.etag
+                    set_backup_headers(response, backup)
+                    return response
+                remaining = deadline - loop.time()
+                if remaining <= 0 or not await subscription.wait(remaining):
+                    response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+                    if backup is not None:
+                        response['ETag'] = backup.etag
+                    return response
+
+    def _timeout(self, request):
+        value = request.GET.get('timeout')
+        if value is None:
+            return settings.BACKUP_CHANGES_TIMEOUT
+        try:
+            timeout = float(value)
+        except ValueError:
+            timeout = math.nan
+        if not 0 <= timeout <= settings.BACKUP_CHANGES_TIMEOUT:
+            raise ValidationError({"detail": f"timeout must be between 0 and {settings.BACKUP_CHANGES_TIMEOUT}."})
+        return timeout
+
+    async def _events(self, user, known):
+        with get_hub().subscribe(user.pk) as subscription:
+            while True:
+                backup = await UserBackup.objects.filter(user=user).afirst()
+                if backup is not None and not backup.etag_matches(known):
+                    known = backup.etag
+                    data = json.dumps(backup_metadata(backup), cls=JSONEncoder)
+                    yield f"id: {backup.etag}\nevent: backup\ndata: {data}\n\n".encode()
+                if not await subscription.wait(settings.BACKUP_CHANGES_KEEPALIVE):
+                    yield b": keepalive\n\n"
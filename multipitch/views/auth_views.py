@@ -2,19 +2,33 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny
-from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from django.conf import settings
+from multipitch.hashing import HashingBusy
+from multipitch.tokens import renew_access_token
 from ..serializers.auth_serializers import SignupSerializer, LoginSerializer, MeSerializer
 
 
+def hashing_busy_response(response_class=Response):
+    response = response_class(
+        {"detail": "Too many sign-ins in progress. Please try again shortly."},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE
+    )
+    response['Retry-After'] = str(settings.PASSWORD_HASHING['RETRY_AFTER'])
+    return response
+
+
 class SignupView(APIView):
     authentication_classes = []
     permission_classes = [AllowAny]
+    throttle_scope = 'signup'
 
     def post(self, request):
         serializer = SignupSerializer(data=request.data)
         if serializer.is_valid():
-            user = serializer.save()
+            try:
+                user = serializer.save()
+            except HashingBusy:
+                return hashing_busy_response()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -22,31 +36,30 @@ class SignupView(APIView):
 class LoginView(APIView):
     authentication_classes = []
     permission_classes = [AllowAny]
+    throttle_scope = 'login'
 
     def post(self, request):
         serializer = LoginSerializer(data=request.data)
-        if serializer.is_valid():
+        try:
+            valid = serializer.is_valid()
+        except HashingBusy:
+            return hashing_busy_response()
+        if valid:
             return Response(serializer.validated_data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     
 class MeView(APIView):
-    authentication_classes = [JWTAuthentication]
 
     def get(self, request):
-        auth = JWTAuthentication()
-        user_auth_tuple = auth.authenticate(request)
-        if user_auth_tuple is None:
+        user = request.user
+        if not user.is_authenticated:
             return Response({"user": None}, status=status.HTTP_200_OK)
 
-        user, token = user_auth_tuple
-
-        refresh = RefreshToken.for_user(user)
-        new_access_token = str(refresh.access_token)
+        access_token = renew_access_token(user, request.auth)
 
         serializer = MeSerializer(user)
         return Response({
             "user": serializer.data,
-            "access": new_access_token
+            "access": access_token
         }, status=status.HTTP_200_OK)
-
@@ -1,43 +1,248 @@
+from django.http import StreamingHttpResponse
+from django.utils.http import http_date
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.permissions import IsAuthenticated
+from multipitch.codecs import accepts_encoding, get_codec
 from multipitch.models import UserBackup
+from multipitch.parsers import Base64JSONParser, OctetStreamParser, SQLiteParser
 from multipitch.serializers.backup_serializers import UserBackupSerializer
-import base64
+from multipitch.ranges import RangeNotSatisfiable, parse_range
+from multipitch.services.backup_service import (
+    PreconditionFailed, save_backup, get_backup_metadata, iter_backup, iter_stored
+)
+import io
+from collections import namedtuple
+
+
+def backup_saved_data(backup, changed=True):
+    return {
+        "success": True,
+        "message": "Backup saved successfully." if changed else "Backup unchanged.",
+        "changed": changed,
+        "last_sync": backup.last_sync
+    }
+
+
+def backup_saved_response(backup, changed=True):
+    response = Response(backup_saved_data(backup, changed), status=status.HTTP_200_OK)
+    response['ETag'] = backup.etag
+    return response
+
+
+def backup_metadata(backup):
+    return {
+        "version": backup.version,
+        "size": backup.original_size,
+        "sha256": backup.sha256,
+        "integrity": backup.integrity,
+        "last_sync": backup.last_sync,
+    }
+
+
+def sync_cursor_header(request):
+    """
+    The X-Sync-Cursor header of an upload: the last sync change the
+    uploaded snapshot includes, or None.
+    """
+    value = request.headers.get('X-Sync-Cursor')
+    if value is None:
+        return None
+    if not value.isdigit():
+        raise ValidationError({"detail": "Invalid X-Sync-Cursor header."})
+    return int(value)
+
+
+def backup_headers(backup):
+    """
+    X-Sync-Cursor: the last sync change the backup includes.
+    X-Backup-Integrity: the result of the server's integrity check.
+    """
+    headers = {'X-Backup-Integrity': backup.integrity}
+    if backup.sync_cursor is not None:
+        headers['X-Sync-Cursor'] = backup.sync_cursor
+    return headers
+
+
+def set_backup_headers(response, backup):
+    for header, value in backup_headers(backup).items():
+        response[header] = value
+
+
+def precondition_failed_response():
+    return Response(
+        {"detail": "Backup was changed by another device."},
+        status=status.HTTP_412_PRECONDITION_FAILED
+    )
+
+
+def not_modified_response(backup, content_encoding=None):
+    response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    response['ETag'] = backup.encoded_etag(content_encoding)
+    return response
+
+
+def download_encoding(request_headers, backup):
+    """
+    The Content-Encoding a raw download of `backup` is sent with: the
+    stored codec's when the client accepts it, None to decode on the fly.
+    """
+    codec = get_codec(backup.codec)
+    if codec.content_encoding is not None and accepts_encoding(
+        request_headers.get('Accept-Encoding'), codec.content_encoding
+    ):
+        return codec.content_encoding
+    return None
+
+
+DownloadPlan = namedtuple('DownloadPlan', 'status read start end headers')
+
+
+def plan_download(request_headers, backup):
+    """
+    Negotiate a raw download of `backup`: Content-Encoding passthrough,
+    `Range` / `If-Range`, and the response headers. `read(backup, start, end)`
+    yields the body. A 416 plan only carries its Content-Range header.
+    """
+    content_encoding = download_encoding(request_headers, backup)
+    if content_encoding is not None:
+        size, read = backup.stored_size, iter_stored
+    else:
+        size, read = backup.original_size, iter_backup
+
+    last_modified = http_date(backup.last_sync.timestamp())
+    etag = backup.encoded_etag(content_encoding)
+    if_range = request_headers.get('If-Range')
+    byte_range = None
+    # If-Range needs a strong match with this representation's ETag: a range
+    # of the gzip body must not be resumed from the decoded one, or back.
+    if if_range is None or if_range == last_modified or if_range.strip() == etag:
+        try:
+            byte_range = parse_range(request_headers.get('Range'), size)
+        except RangeNotSatisfiable:
+            return DownloadPlan(
+                status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, None, None, None,
+                {'Content-Range': f"bytes */{size}"}
+            )
+
+    headers = {}
+    if byte_range is None:
+        start, end = 0, size - 1
+        plan_status = status.HTTP_200_OK
+    else:
+        start, end = byte_range
+        plan_status = status.HTTP_206_PARTIAL_CONTENT
+        headers['Content-Range'] = f"bytes {start}-{end}/{size}"
+
+    if content_encoding is not None:
+        headers['Content-Encoding'] = content_encoding
+    headers.update({
+        'Content-Type': 'application/x-sqlite3',
+        'Content-Length': end - start + 1,
+        'Content-Disposition': 'attachment; filename="backup.sqlite3"',
+        'Accept-Ranges': 'bytes',
+        'Last-Modified': last_modified,
+        'ETag': etag,
+        'Vary': 'Accept-Encoding',
+    })
+    headers.update(backup_headers(backup))
+    return DownloadPlan(plan_status, read, start, end, headers)
+
 
 class BackupUploadView(APIView):
     permission_classes = [IsAuthenticated]
+    parser_classes = [Base64JSONParser, FormParser, MultiPartParser, OctetStreamParser, SQLiteParser]
+    throttle_scope = 'backup_upload'
 
     def post(self, request):
         """
         Save or replace the current user's backup.
-        Expects Base64-encoded string in 'sqlite_blob'.
+        Expects Base64-encoded string in 'sqlite_blob', or the raw database
+        as an 'application/octet-stream' / 'application/x-sqlite3' body.
+        JSON bodies are decoded to a temporary file while they are read, so
+        they take the raw path too.
+        An `If-Match` header makes the save conditional on the stored ETag.
+        `X-Sync-Cursor` records the last sync change the snapshot includes.
         """
+        if hasattr(request.data, 'read'):
+            return self._save_raw(request, request.data)
+
         serializer = UserBackupSerializer(data=request.data)
         if serializer.is_valid():
-            backup, created = UserBackup.objects.update_or_create(
-                user=request.user,
-                defaults={'sqlite_blob': serializer.validated_data['sqlite_blob']}
-            )
-            return Response({
-                "success": True,
-                "message": "Backup saved successfully.",
-                "last_sync": backup.last_sync
-            }, status=status.HTTP_200_OK)
+            blob = io.BytesIO(serializer.validated_data['sqlite_blob'])
+            return self._save(request, blob)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def _save_raw(self, request, upload):
+        with upload:
+            if not upload.read(1):
+                return Response(
+                    {"sqlite_blob": ["Backup file cannot be empty."]},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            upload.seek(0)
+            return self._save(request, upload)
+
+    def _save(self, request, upload):
+        try:
+            backup, created, changed = save_backup(
+                request.user, upload, if_match=request.headers.get('If-Match'),
+                sync_cursor=sync_cursor_header(request)
+            )
+        except PreconditionFailed:
+            return precondition_failed_response()
+        return backup_saved_response(backup, changed)
+
 
 class BackupRetrieveView(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'backup_download'
 
     def get(self, request):
         try:
-            backup = request.user.data
+            backup = get_backup_metadata(request.user)
         except UserBackup.DoesNotExist:
             return Response({"detail": "No backup found."}, status=status.HTTP_404_NOT_FOUND)
 
+        if backup.etag_matches(request.headers.get('If-None-Match')):
+            return not_modified_response(backup)
+
         serializer = UserBackupSerializer(backup)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        response = Response(serializer.data, status=status.HTTP_200_OK)
+        response['ETag'] = backup.etag
+        set_backup_headers(response, backup)
+        return response
+
+
+class BackupStreamView(APIView):
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'backup_download'
+
+    def get(self, request):
+        """
+        Stream the current user's backup as raw bytes.
+        Compressed backups are sent as-is with Content-Encoding when the
+        client accepts that encoding, and decoded on the fly otherwise.
+        Supports single `Range` requests so interrupted downloads can resume,
+        and `If-None-Match` so unchanged backups are not sent again.
+        """
+        try:
+            backup = get_backup_metadata(request.user)
+        except UserBackup.DoesNotExist:
+            return Response({"detail": "No backup found."}, status=status.HTTP_404_NOT_FOUND)
+
+        if backup.etag_matches(request.headers.get('If-None-Match')):
+            return not_modified_response(backup, download_encoding(request.headers, backup))
 
+        plan = plan_download(request.headers, backup)
+        if plan.status == status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE:
+            response = Response(status=plan.status)
+        else:
+            response = StreamingHttpResponse(plan.read(backup, plan.start, plan.end), status=plan.status)
+        for header, value in plan.headers.items():
+            response[header] = value
+        return response
@@ -0,0 +1,96 @@
+from django.http import StreamingHttpResponse
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from multipitch.delta import DeltaError
+from multipitch.serializers.backup_serializers import (
+    DeltaCompareSerializer, DeltaPagesSerializer, DeltaApplySerializer
+)
+from multipitch.services import delta_service
+from multipitch.views.backup_views import backup_saved_response
+
+
+def _base_mismatch():
+    return Response(
+        {"detail": "Backup changed since comparison. Compare again."},
+        status=status.HTTP_409_CONFLICT
+    )
+
+
+class DeltaCompareView(APIView):
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'backup_download'
+
+    def post(self, request):
+        """
+        Compare the client's per-page SHA-256 hashes with the stored backup.
+        Returns the indices of differing pages and a `base` token that the
+        pages and apply calls must echo back.
+        """
+        serializer = DeltaCompareSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        result = delta_service.compare(
+            request.user,
+            serializer.validated_data['page_size'],
+            serializer.validated_data['hashes'],
+        )
+        return Response(result, status=status.HTTP_200_OK)
+
+
+class DeltaPagesView(APIView):
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'backup_download'
+
+    def post(self, request):
+        """Stream the requested pages of the stored backup as delta frames."""
+        serializer = DeltaPagesSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            backup, page_size, frames = delta_service.iter_page_frames(
+                request.user,
+                serializer.validated_data['base'].lower(),
+                serializer.validated_data['pages'],
+            )
+        except delta_service.BaseMismatch:
+            return _base_mismatch()
+
+        response = StreamingHttpResponse(frames, content_type='application/octet-stream')
+        response['X-Page-Size'] = page_size
+        response['X-Backup-Size'] = backup.original_size
+        return response
+
+
+class DeltaApplyView(APIView):
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'backup_upload'
+
+    def post(self, request):
+        """
+        Apply uploaded delta frames on top of the stored backup.
+        `base`, `page_size`, `size` and `sha256` of the resulting file are
+        passed as query parameters; the body is the raw frame stream.
+        """
+        serializer = DeltaApplySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            backup, created, changed = delta_service.apply(
+                request.user,
+                serializer.validated_data['base'].lower(),
+                serializer.validated_data['page_size'],
+                serializer.validated_data['size'],
+                serializer.validated_data['sha256'],
+                request.stream,
+            )
+        except delta_service.BaseMismatch:
+            return _base_mismatch()
+        except DeltaError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return backup_saved_response(backup, changed)
@@ -0,0 +1,108 @@
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework import generics, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from multipitch.models import BackupIndex, IndexedClimb, IndexedLog, IndexedPitch, IndexedRoute, UserBackup
+from multipitch.pagination import IndexCursorPagination
+from multipitch.serializers.index_serializers import (
+    BackupIndexSerializer, IndexedClimbSerializer, IndexedLogSerializer,
+    IndexedPitchSerializer, IndexedRouteSerializer
+)
+
+
+def _int_param(request, name):
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({name: ["A valid integer is required."]})
+
+
+class BackupIndexStatusView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """Report which backup the index was built from and whether it is current."""
+        try:
+            index = BackupIndex.objects.get(user=request.user)
+        except BackupIndex.DoesNotExist:
+            return Response({"detail": "Backup not indexed."}, status=status.HTTP_404_NOT_FOUND)
+        current = UserBackup.objects.filter(user=request.user).values_list('sha256', flat=True).first()
+        data = BackupIndexSerializer(index).data
+        data['up_to_date'] = current is not None and current == index.sha256
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class IndexedListView(generics.ListAPIView):
+    permission_classes = [IsAuthenticated]
+    pagination_class = IndexCursorPagination
+    model = None
+
+    def get_queryset(self):
+        return self.model.objects.filter(user=self.request.user)
+
+
+class IndexedRouteListView(IndexedListView):
+    """Routes from the indexed backup, by name. Filters: `search`, `grade`."""
+    model = IndexedRoute
+    serializer_class = IndexedRouteSerializer
+    cursor_ordering = ('name', 'source_id')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if search := self.request.query_params.get('search'):
+            queryset = queryset.filter(Q(name__icontains=search) | Q(crag__icontains=search))
+        if grade := self.request.query_params.get('grade'):
+            queryset = queryset.filter(grade=grade)
+        return queryset
+
+
+class IndexedPitchListView(IndexedListView):
+    """Pitches of one route, in order."""
+    model = IndexedPitch
+    serializer_class = IndexedPitchSerializer
+    pagination_class = None
+
+    def get_queryset(self):
+        return super().get_queryset().filter(route_id=self.kwargs['route_id']).order_by('number', 'source_id')
+
+
+class IndexedClimbListView(IndexedListView):
+    """Climbs from the indexed backup, most recent first. Filters: `route`, `since`."""
+    model = IndexedClimb
+    serializer_class = IndexedClimbSerializer
+    cursor_ordering = ('-started_at', '-source_id')
+
+    def get_queryset(self):
+        queryset = super().get_queryset().filter(started_at__isnull=False)
+        route = _int_param(self.request, 'route')
+        if route is not None:
+            queryset = queryset.filter(route_id=route)
+        if since := self.request.query_params.get('since'):
+            try:
+                since = parse_datetime(since)
+            except ValueError:
+                since = None
+            if since is None:
+                raise ValidationError({"since": ["A valid ISO 8601 datetime is required."]})
+            queryset = queryset.filter(started_at__gte=since)
+        return queryset
+
+
+class IndexedLogListView(IndexedListView):
+    """Log entries from the indexed backup, in recording order. Filter: `climb`."""
+    model = IndexedLog
+    serializer_class = IndexedLogSerializer
+    cursor_ordering = ('source_id',)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        climb = _int_param(self.request, 'climb')
+        if climb is not None:
+            queryset = queryset.filter(climb_id=climb)
+        return queryset
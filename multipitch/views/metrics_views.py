@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from multipitch import metrics
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def metrics_view(request):
+    """
+    Expose request metrics in the Prometheus text format. Scrapes must send
+    METRICS['AUTH_TOKEN'] as a bearer token; with no token configured, the
+    endpoint only answers when DEBUG is on.
+    """
+    token = settings.METRICS['AUTH_TOKEN']
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponse(status=403)
+    elif not constant_time_compare(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        return HttpResponse(status=401)
+    return HttpResponse(metrics.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,61 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from django.conf import settings
+from multipitch.models import UserBackup
+from multipitch.serializers.sync_serializers import SyncPullSerializer, SyncPushSerializer, change_data
+from multipitch.services import sync_service
+
+
+class SyncChangesView(APIView):
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'sync'
+
+    def get(self, request):
+        """
+        Pull the changes made after `cursor`, oldest first, leaving out the
+        calling `device`'s own. Keep pulling from the returned cursor while
+        `has_more` is true. A 410 means the device must restore the latest
+        backup and pull from its `sync_cursor`.
+        """
+        serializer = SyncPullSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        try:
+            result = sync_service.pull_changes(
+                request.user, data['cursor'], data.get('limit', settings.SYNC_MAX_CHANGES), data.get('device')
+            )
+        except sync_service.CursorExpired:
+            checkpoint = UserBackup.objects.filter(user=request.user).values_list('sync_cursor', flat=True).first()
+            return Response(
+                {"detail": "Cursor expired. Restore the latest backup.", "sync_cursor": checkpoint},
+                status=status.HTTP_410_GONE
+            )
+        return Response({
+            "changes": [change_data(change) for change in result.changes],
+            "cursor": result.cursor,
+            "has_more": result.has_more,
+        }, status=status.HTTP_200_OK)
+
+    def post(self, request):
+        """
+        Push a device's row changes, in the order they were made. Changes
+        older than the server's copy of a row (last writer wins on
+        `timestamp`, then `device`) are returned as conflicts together with
+        the server's copy, which the device should apply instead.
+        """
+        serializer = SyncPushSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        result = sync_service.push_changes(
+            request.user, serializer.validated_data['device'], serializer.validated_data['changes']
+        )
+        return Response({
+            "applied": len(result.applied),
+            "conflicts": [
+                {"table": change['table'], "id": change['id'], "server": change_data(current)}
+                for change, current in result.conflicts
+            ],
+        }, status=status.HTTP_200_OK)
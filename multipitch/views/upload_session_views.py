@@ -0,0 +1,118 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from multipitch.models import BackupUploadSession
+from multipitch.serializers.backup_serializers import UploadSessionCommitSerializer
+from multipitch.services import upload_session_service as sessions
+from multipitch.services.backup_service import PreconditionFailed
+from multipitch.views.backup_views import (
+    backup_saved_response, precondition_failed_response, sync_cursor_header
+)
+
+
+def _session_not_found():
+    return Response({"detail": "Upload session not found."}, status=status.HTTP_404_NOT_FOUND)
+
+
+def _session_data(session):
+    return {
+        "session_id": str(session.id),
+        "chunk_size": session.chunk_size,
+        "expires_at": session.expires_at,
+        "received_chunks": sessions.received_chunks(session),
+    }
+
+
+class UploadSessionCreateView(APIView):
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'backup_upload'
+
+    def post(self, request):
+        """
+        Start a resumable upload. Chunks are then PUT one by one and the
+        session is committed with the total chunk count and SHA-256.
+        """
+        try:
+            session = sessions.create_session(request.user)
+        except sessions.TooManySessions as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+        return Response(_session_data(session), status=status.HTTP_201_CREATED)
+
+
+class UploadSessionDetailView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, session_id):
+        """Report which chunks have been received, so a client can resume."""
+        try:
+            session = sessions.get_active_session(request.user, session_id)
+        except BackupUploadSession.DoesNotExist:
+            return _session_not_found()
+        return Response(_session_data(session), status=status.HTTP_200_OK)
+
+    def delete(self, request, session_id):
+        try:
+            session = sessions.get_active_session(request.user, session_id)
+        except BackupUploadSession.DoesNotExist:
+            return _session_not_found()
+        sessions.abort_session(session)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class UploadSessionChunkView(APIView):
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'backup_upload_chunk'
+
+    def put(self, request, session_id, index):
+        """Store one raw chunk. Re-sending a chunk replaces it."""
+        try:
+            session = sessions.get_active_session(request.user, session_id)
+        except BackupUploadSession.DoesNotExist:
+            return _session_not_found()
+
+        try:
+            size = sessions.write_chunk(session, index, request.stream)
+        except sessions.ChunkRejected as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        except sessions.SessionTooLarge as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        return Response({"index": index, "size": size}, status=status.HTTP_200_OK)
+
+
+class UploadSessionCommitView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, session_id):
+        """Assemble the staged chunks, verify the checksum and save the backup."""
+        try:
+            session = sessions.get_active_session(request.user, session_id)
+        except BackupUploadSession.DoesNotExist:
+            return _session_not_found()
+
+        serializer = UploadSessionCommitSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            backup, created, changed = sessions.commit_session(
+                session,
+                if_match=request.headers.get('If-Match'),
+                sync_cursor=sync_cursor_header(request),
+                **serializer.validated_data
+            )
+        except sessions.IncompleteUpload as exc:
+            missing_count, first_missing = exc.args
+            return Response(
+                {"detail": "Missing chunks.", "missing_count": missing_count, "missing_chunks": first_missing},
+                status=status.HTTP_409_CONFLICT
+            )
+        except sessions.ChunkRejected as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        except sessions.ChecksumMismatch:
+            return Response({"sha256": ["Checksum mismatch."]}, status=status.HTTP_400_BAD_REQUEST)
+        except PreconditionFailed:
+            return precondition_failed_response()
+
+        return backup_saved_response(backup, changed)
@@ -0,0 +1,52 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from multipitch.models import BackupVersion, UserBackup
+from multipitch.serializers.backup_serializers import BackupVersionSerializer
+from multipitch.services import version_service
+from multipitch.services.backup_service import PreconditionFailed, get_backup_metadata
+from multipitch.views.backup_views import backup_metadata, backup_saved_response, precondition_failed_response
+
+
+class BackupVersionListView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """List the current backup and the previous versions kept for the user."""
+        try:
+            backup = get_backup_metadata(request.user)
+        except UserBackup.DoesNotExist:
+            return Response({"detail": "No backup found."}, status=status.HTTP_404_NOT_FOUND)
+
+        versions = version_service.list_versions(request.user)
+        return Response({
+            "current": backup_metadata(backup),
+            "versions": BackupVersionSerializer(versions, many=True).data,
+        }, status=status.HTTP_200_OK)
+
+
+class BackupVersionRestoreView(APIView):
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'backup_upload'
+
+    def post(self, request, number):
+        """
+        Make a previous version the current backup. The backup it replaces
+        is kept as a new version. Honours `If-Match` like uploads do.
+        """
+        try:
+            backup, created, changed = version_service.restore(
+                request.user, number, if_match=request.headers.get('If-Match')
+            )
+        except BackupVersion.DoesNotExist:
+            return Response({"detail": "Version not found."}, status=status.HTTP_404_NOT_FOUND)
+        except version_service.CorruptVersion:
+            return Response(
+                {"detail": "Version could not be restored."},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        except PreconditionFailed:
+            return precondition_failed_response()
+
+        return backup_saved_response(backup, changed)